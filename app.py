@@ -3,127 +3,107 @@ import streamlit as st
 import pandas as pd
 import json
 import os
+import copy
+import tempfile
+import time
 from utils.annotation import AnnotationManager
 from utils.mapping import VocabularyMapper
-import streamlit.components.v1 as components
+from utils.labels import DEFAULT_ENTITY_LABELS, DEFAULT_LABEL_CATEGORY_MAP
+from utils.storage import atomic_write_json
+from utils.vocab_compiler import add_vocab_term, compile_vocab, compile_vocab_file
+from utils.export import EXPORT_FORMATS, export_to_file
+from utils.stats import STATUS_INCOMPLETE, STATUS_NOT_STARTED, STATUS_NAMES, is_mapped
+from utils.project import list_projects, read_dataset, read_json
+from utils.service import ProjectHandle
+from utils.scheduler import LeaseScheduler, row_priorities
+from utils.render import (RowMemo, annotated_html, counter_html, mapping_options, progress_html, span_key, span_title,
+                          spans_table, status_badge_html)
+from utils import metrics
+# utils.importer / preannotate / sqlite_store / search_index / cluster / lint / agreement 只在用到的功能里导入，
+# 没打开 SQLite 项目、没检索、没聚类/质检/比较一致性的页面不为它们付出导入开销
 
 st.set_page_config(page_title="NER数据标注工具", page_icon="📝", layout="wide")
 
 PROJECT_DIR = "data/projects"
-os.makedirs(PROJECT_DIR, exist_ok=True)
+# 编译后的词表产物（按内容哈希命名）
+VOCAB_CACHE_DIR = f"{PROJECT_DIR}/.vocab_cache"
+# 映射下拉框中展示的候选词数量上限（按相关度排序）
+MAPPING_TOP_K = 20
+# 任务分配：每个批次的行数、租约有效期（秒）
+TASK_BATCH_SIZE = 100
+TASK_LEASE_SECONDS = 30 * 60
 
 def init_session_state():
     if 'annotation_manager' not in st.session_state:
-        st.session_state.annotation_manager = AnnotationManager()
+        # NER_COLUMNAR_STORE=1 时使用列式存储，适合百万行级别的项目
+        st.session_state.annotation_manager = AnnotationManager(columnar=os.environ.get("NER_COLUMNAR_STORE") == "1")
     if 'vocab_mapper' not in st.session_state:
         st.session_state.vocab_mapper = VocabularyMapper()
     if 'current_index' not in st.session_state:
         st.session_state.current_index = 0
     if 'entity_labels' not in st.session_state:
-        st.session_state.entity_labels = ["品类", "品牌", "型号", "年份", "价格", "cpu", "gpu", "内存", "存储", "重量", "颜色", "屏幕尺寸", "屏幕分辨率", "其他", "ai"]
+        st.session_state.entity_labels = list(DEFAULT_ENTITY_LABELS)
     if 'label_category_map' not in st.session_state:
-        st.session_state.label_category_map = {
-            "品类": ["category"],
-            "品牌": ["brand"],
-            "型号": ["model"],
-            "年份": ["release_year"],
-            "价格": ["price"],
-            "cpu": ['cpu_brand', 'cpu_series', 'cpu_family', 'cpu_model', 'cpu_gen'],
-            "gpu": ['gpu_type', 'gpu_brand', 'gpu_series', 'gpu_model'],
-            "内存": ['memory_capacity_gb'],
-            "存储": ['storage_capacity_gb'],
-            "屏幕尺寸": ['screen_size_inch'],
-            "屏幕分辨率": ['screen_resolution'],
-            "其他": ['other'],
-            "颜色": ['color'],
-            "ai": ['ai']
-        }
+        st.session_state.label_category_map = copy.deepcopy(DEFAULT_LABEL_CATEGORY_MAP)
+    if 'row_memo' not in st.session_state:
+        st.session_state.row_memo = RowMemo()
 
 def main():
-    st.title("📝 NER数据标注工具")
-    init_session_state()
-    sidebar()
-    main_content()
+    # NER_METRICS=1 时记录本次重跑各段耗时，结果在侧边栏调试面板中展示并导出到 data/metrics
+    with metrics.rerun(st.session_state.get("selected_project")) as record:
+        try:
+            st.title("📝 NER数据标注工具")
+            init_session_state()
+            sidebar()
+            main_content()
+        finally:
+            if record is not None:
+                st.session_state.last_rerun_metrics = record
 
+@metrics.timed()
 def sidebar():
     with st.sidebar:
         st.header("项目管理")
-        os.makedirs(PROJECT_DIR, exist_ok=True)
-        project_list = [
-            f.replace(".csv", "").replace(".json", "")
-            for f in os.listdir(PROJECT_DIR)
-            if (
-                (f.endswith(".csv") or f.endswith(".json"))
-                and not f.endswith("_annotations.json")
-                and not f.endswith("_vocab.json")
-                and not f.endswith("_label_map.json")
-            )
-        ]
+        project_list = cached_project_list(PROJECT_DIR, project_dir_mtime())
         selected_project = st.selectbox("选择项目", ["新建项目"] + project_list, key="project_select")
         if selected_project == "新建项目":
             st.markdown("#### 新建项目")
             new_project_name = st.text_input("项目名称", key="new_project_name")
-            uploaded_file = st.file_uploader("上传数据集文件", type=['csv', 'xlsx', 'json'], key="project_file")
+            uploaded_file = st.file_uploader("上传数据集文件", type=['csv', 'xlsx', 'json', 'jsonl'], key="project_file")
             uploaded_vocab = st.file_uploader("（可选）上传项目词表", type=['json'], key="project_vocab")
             uploaded_label_map = st.file_uploader("（可选）上传标签-类别映射", type=['json'], key="project_label_map")
+            use_sqlite = st.checkbox("使用 SQLite 存储（适合大数据集）", key="project_use_sqlite")
             if st.button("创建项目", key="create_project_btn") and new_project_name and uploaded_file:
+                # 流式分块导入：校验 query 列、并行解析 annotations 列，直接写入项目存储
+                from utils.importer import FileProjectWriter, SQLiteProjectWriter, detect_format, import_stream
+                progress_bar = st.progress(0.0, text="正在导入数据...")
+                def report_progress(rows, position, total):
+                    fraction = min(position / total, 1.0) if position is not None and total else 0.0
+                    progress_bar.progress(fraction, text=f"已导入 {rows} 行")
                 try:
-                    # 只读取一次文件内容
-                    if uploaded_file.name.endswith('.json'):
-                        file_bytes = uploaded_file.read()
-                        data = json.loads(file_bytes.decode('utf-8'))
-                        df = pd.DataFrame(data)
-                        df.to_json(f"{PROJECT_DIR}/{new_project_name}.json", orient="records", force_ascii=False)
-                    elif uploaded_file.name.endswith('.csv'):
-                        df = pd.read_csv(uploaded_file)
-                        df.to_csv(f"{PROJECT_DIR}/{new_project_name}.csv", index=False, encoding="utf-8-sig")
-                    elif uploaded_file.name.endswith('.xlsx'):
-                        df = pd.read_excel(uploaded_file)
-                        df.to_csv(f"{PROJECT_DIR}/{new_project_name}.csv", index=False, encoding="utf-8-sig")
-                    else:
-                        st.error("不支持的文件类型")
-                        print("[ERROR] 不支持的文件类型")
-                        return
-                except Exception as e:
-                    print(f"[ERROR] 数据文件解析失败: {e}")
-                    st.error(f"数据文件解析失败: {e}")
-                    return
-
-                # 初始化标注
-                try:
-                    if 'annotations' in df.columns:
-                        annotations = {}
-                        for idx, row in df.iterrows():
-                            anns = row['annotations']
-                            if isinstance(anns, str):
-                                try:
-                                    anns = json.loads(anns)
-                                except Exception as e:
-                                    print(f"[WARN] 第{idx}行annotations字段解析失败: {e}")
-                                    anns = []
-                            elif isinstance(anns, (list, dict)):
-                                pass
-                            elif pd.isna(anns):
-                                anns = []
-                            else:
-                                anns = []
-                            annotations[str(idx)] = anns
-                        with open(f"{PROJECT_DIR}/{new_project_name}_annotations.json", "w", encoding="utf-8") as f:
-                            json.dump(annotations, f, ensure_ascii=False)
+                    fmt = detect_format(uploaded_file.name)
+                    if use_sqlite:
+                        writer = SQLiteProjectWriter(f"{PROJECT_DIR}/{new_project_name}.db")
                     else:
-                        with open(f"{PROJECT_DIR}/{new_project_name}_annotations.json", "w", encoding="utf-8") as f:
-                            json.dump({str(i): [] for i in range(len(df))}, f, ensure_ascii=False)
+                        writer = FileProjectWriter(PROJECT_DIR, new_project_name)
+                    report = import_stream(uploaded_file, fmt, writer, workers=os.cpu_count() or 1,
+                                           total_bytes=uploaded_file.size, progress=report_progress)
                 except Exception as e:
-                    print(f"[ERROR] 标注文件保存失败: {e}")
-                    st.error(f"标注文件保存失败: {e}")
+                    print(f"[ERROR] 数据文件导入失败: {e}")
+                    st.error(f"数据文件导入失败: {e}")
                     return
+                if report["annotation_errors"]:
+                    print(f"[WARN] {len(report['annotation_errors'])} 行annotations字段解析失败: {report['annotation_errors'][:20]}")
+                    st.warning(f"{len(report['annotation_errors'])} 行 annotations 字段解析失败，已置为空")
 
                 # 保存词表
                 if uploaded_vocab:
                     try:
                         vocab_data = json.load(uploaded_vocab)
-                        with open(f"{PROJECT_DIR}/{new_project_name}_vocab.json", "w", encoding="utf-8") as f:
-                            json.dump(vocab_data, f, ensure_ascii=False)
+                        if use_sqlite:
+                            writer.project.save_vocab(vocab_data)
+                        else:
+                            atomic_write_json(f"{PROJECT_DIR}/{new_project_name}_vocab.json", vocab_data)
                     except Exception as e:
                         print(f"[ERROR] 词表保存失败: {e}")
                         st.error(f"词表保存失败: {e}")
@@ -131,8 +111,10 @@ def sidebar():
                 if uploaded_label_map:
                     try:
                         label_map = json.load(uploaded_label_map)
-                        with open(f"{PROJECT_DIR}/{new_project_name}_label_map.json", "w", encoding="utf-8") as f:
-                            json.dump(label_map, f, ensure_ascii=False)
+                        if use_sqlite:
+                            writer.project.save_label_map(label_map)
+                        else:
+                            atomic_write_json(f"{PROJECT_DIR}/{new_project_name}_label_map.json", label_map)
                     except Exception as e:
                         print(f"[ERROR] 标签-类别映射保存失败: {e}")
                         st.error(f"标签-类别映射保存失败: {e}")
@@ -141,39 +123,11 @@ def sidebar():
                 st.rerun()
         else:
             st.markdown(f"#### 当前项目：**{selected_project}**")
-            # 加载项目数据和标注
+            # 加载项目数据和标注（仅在项目切换或文件变化时重新解析）
             try:
-                if os.path.exists(f"{PROJECT_DIR}/{selected_project}.csv"):
-                    df = pd.read_csv(f"{PROJECT_DIR}/{selected_project}.csv")
-                elif os.path.exists(f"{PROJECT_DIR}/{selected_project}.json"):
-                    with open(f"{PROJECT_DIR}/{selected_project}.json", "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                    df = pd.DataFrame(data)
-                else:
+                if not load_project(selected_project):
                     st.error("未找到项目数据文件")
                     return
-                st.session_state.df = df
-                # 加载标注
-                ann_path = f"{PROJECT_DIR}/{selected_project}_annotations.json"
-                if os.path.exists(ann_path):
-                    with open(ann_path, "r", encoding="utf-8") as f:
-                        annotations = json.load(f)
-                    st.session_state.annotation_manager.annotations = {int(k): v for k, v in annotations.items()}
-                else:
-                    st.session_state.annotation_manager.initialize_annotations(len(df))
-                st.session_state.selected_project = selected_project
-                # 加载项目词表
-                vocab_path = f"{PROJECT_DIR}/{selected_project}_vocab.json"
-                if os.path.exists(vocab_path):
-                    with open(vocab_path, "r", encoding="utf-8") as f:
-                        vocab_data = json.load(f)
-                    st.session_state.vocab_mapper.load_vocabulary(vocab_data)
-                # 加载项目标签-类别映射
-                label_map_path = f"{PROJECT_DIR}/{selected_project}_label_map.json"
-                if os.path.exists(label_map_path):
-                    with open(label_map_path, "r", encoding="utf-8") as f:
-                        label_map = json.load(f)
-                    st.session_state.label_category_map = label_map
                 st.success(f"已加载项目 {selected_project}")
             except Exception as e:
                 print(f"[ERROR] 项目加载失败: {e}")
@@ -184,9 +138,7 @@ def sidebar():
             if uploaded_vocab:
                 try:
                     vocab_data = json.load(uploaded_vocab)
-                    st.session_state.vocab_mapper.load_vocabulary(vocab_data)
-                    with open(f"{PROJECT_DIR}/{selected_project}_vocab.json", "w", encoding="utf-8") as f:
-                        json.dump(vocab_data, f, ensure_ascii=False)
+                    save_project_vocab(vocab=vocab_data)
                     st.success("词表已覆盖并保存到项目")
                     st.rerun()
                 except Exception as e:
@@ -198,38 +150,308 @@ def sidebar():
                 try:
                     label_map = json.load(uploaded_label_map)
                     st.session_state.label_category_map = label_map
-                    with open(f"{PROJECT_DIR}/{selected_project}_label_map.json", "w", encoding="utf-8") as f:
-                        json.dump(label_map, f, ensure_ascii=False)
+                    save_project_label_map()
                     st.success("标签-类别映射已覆盖并保存到项目")
                     st.rerun()
                 except Exception as e:
                     st.error(f"标签-类别映射加载失败: {e}")
 
+            st.markdown("#### 自动预标注")
+            if st.button("🤖 用词表预标注全部数据", key="preannotate_btn", disabled=not st.session_state.vocab_mapper.has_vocabulary()):
+                run_preannotation(selected_project)
+
+            st.markdown("#### 近重复聚类")
+            if st.button("🧩 聚类相似 query", key="cluster_btn"):
+                run_clustering(selected_project)
+
+            st.markdown("#### 标注质检")
+            if st.button("🩺 质检全部标注", key="lint_btn"):
+                run_quality_check(selected_project)
+
+            st.markdown("#### 标注一致性")
+            agreement_files = st.file_uploader("上传其他标注员的标注（{行号: [span]} JSON 或导出的 JSONL）",
+                                               type=['json', 'jsonl'], accept_multiple_files=True, key="agreement_files")
+            if st.button("📐 计算标注一致性", key="agreement_btn", disabled=not agreement_files):
+                run_agreement(agreement_files)
+
+            task_controls(selected_project)
+
         show_statistics()
+        debug_panel()
 
-def load_data(uploaded_file):
+def project_dir_mtime():
+    # 每次重跑只 stat 一次项目目录，目录内容变化（新建/删除项目）时 mtime 随之变化
     try:
-        if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
+        return os.stat(PROJECT_DIR).st_mtime_ns
+    except FileNotFoundError:
+        os.makedirs(PROJECT_DIR, exist_ok=True)
+        return os.stat(PROJECT_DIR).st_mtime_ns
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def cached_project_list(path, mtime_ns):
+    return list_projects(path)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def cached_dataset(path, mtime_ns):
+    # 以路径+mtime为键，多个会话共享同一份只读 DataFrame
+    return read_dataset(path)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def cached_json(path, mtime_ns):
+    # 词表/映射会被会话修改，cache_data 每次返回副本
+    return read_json(path)
+
+@st.cache_resource(show_spinner="正在建立检索索引...", max_entries=4)
+def cached_query_index(path, version, _df):
+    # query 文本只读，按数据文件版本在会话间共享同一份 n-gram 索引
+    from utils.search_index import QueryIndex
+
+    return QueryIndex(_df['query'])
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def cached_clusters(path, mtime_ns):
+    # 聚类结果只读，多个会话共享
+    from utils.cluster import QueryClusters
+
+    return QueryClusters.from_json(read_json(path))
+
+@st.cache_resource(show_spinner=False)
+def cached_sqlite_project(path):
+    # SQLite 连接在会话间共享，SQLiteProject 内部加锁
+    from utils.sqlite_store import SQLiteProject
+
+    return SQLiteProject(path)
+
+class SessionProject(ProjectHandle):
+    # 会话打开的项目：加载/刷新逻辑与服务层共用，数据集、SQLite 连接、聚类结果等只读文件走跨会话缓存
+    def _open_backend(self, path):
+        return cached_sqlite_project(path)
+
+    def _read_dataset(self, path, mtime_ns):
+        return cached_dataset(path, mtime_ns)
+
+    def _read_json(self, path, mtime_ns):
+        return cached_json(path, mtime_ns)
+
+    def _read_clusters(self, path, mtime_ns):
+        return cached_clusters(path, mtime_ns)
+
+@metrics.timed()
+def load_project(project_name):
+    handle = st.session_state.get("project")
+    if handle is None or handle.name != project_name:
+        try:
+            handle = SessionProject(PROJECT_DIR, project_name, VOCAB_CACHE_DIR)
+        except FileNotFoundError:
+            return False
+        st.session_state.project = handle
+        # 切换项目时丢弃上一个项目的任务批次（租约到期后自动回收）、一致性结果和按行缓存的渲染结果
+        set_lease(None)
+        st.session_state.pop("agreement", None)
+        st.session_state.row_memo = RowMemo()
+        changed = ["data"]
+    else:
+        changed = handle.refresh()
+    # 界面其余部分从会话状态读取，项目对象是唯一的来源
+    st.session_state.annotation_manager = handle.manager
+    st.session_state.vocab_mapper = handle.mapper
+    st.session_state.label_category_map = handle.label_map
+    st.session_state.df = handle.df
+    st.session_state.clusters = handle.clusters
+    st.session_state.lint_report = handle.lint
+    st.session_state.project_backend = handle.backend
+    st.session_state.query_index_key = handle.data_key()
+    st.session_state.selected_project = project_name
+    if changed:
+        metrics.count("project_reloads")
+    if {"data", "clusters", "lint"} & set(changed):
+        st.session_state.pop("search_view", None)
+    return True
+
+def save_project_vocab(category=None, term=None, vocab=None):
+    # 传入 category/term 时只追加一个词条；传入 vocab 时整体覆盖并重新编译加载
+    handle = st.session_state.project
+    if handle.backend is not None:
+        if term is not None:
+            revision = handle.backend.add_vocab_term(category, term)
         else:
-            df = pd.read_excel(uploaded_file)
-        if 'query' not in df.columns:
-            st.error("数据文件必须包含 'query' 列")
-            return
+            revision = handle.backend.save_vocab(vocab)
+            handle.mapper.load_vocabulary(compile_vocab(vocab, VOCAB_CACHE_DIR))
+        handle.mark_written("config", revision)
+    else:
+        if term is not None:
+            # 只在磁盘上的最新词表里追加这一个词条，不覆盖其他会话新增的词；编译产物同步增量更新
+            add_vocab_term(handle.paths["vocab"], category, term, VOCAB_CACHE_DIR)
+        else:
+            atomic_write_json(handle.paths["vocab"], vocab)
+            handle.mapper.load_vocabulary(compile_vocab_file(handle.paths["vocab"], VOCAB_CACHE_DIR))
+        handle.mark_written("vocab")
+
+def save_project_label_map():
+    handle = st.session_state.project
+    handle.label_map = st.session_state.label_category_map
+    if handle.backend is not None:
+        handle.mark_written("config", handle.backend.save_label_map(handle.label_map))
+    else:
+        atomic_write_json(handle.paths["label_map"], handle.label_map)
+        handle.mark_written("label_map")
+
+def get_scheduler(project_name):
+    # 每个会话按项目缓存调度器；批次优先级来自预标注建议（无词表命中、低置信度的行优先）
+    total = len(st.session_state.df)
+    key = (project_name, total)
+    if st.session_state.get("scheduler_key") != key:
+        priorities = row_priorities(total, st.session_state.annotation_manager.suggestions)
+        st.session_state.scheduler = LeaseScheduler(
+            f"{PROJECT_DIR}/{project_name}_leases.json", total,
+            batch_size=TASK_BATCH_SIZE, lease_seconds=TASK_LEASE_SECONDS, priorities=priorities)
+        st.session_state.scheduler_key = key
+    return st.session_state.scheduler
+
+def set_lease(lease):
+    st.session_state.lease = lease
+    if lease is None:
+        st.session_state.pop("batch_df", None)
+        return
+    # SQLite 项目只读取批次范围内的页；文件项目是共享缓存数据上的切片，不复制
+    st.session_state.batch_df = st.session_state.df.iloc[lease["start"]:lease["end"]]
+    manager = st.session_state.annotation_manager
+    target = manager.next_unfinished(lease["start"] - 1, lo=lease["start"], hi=lease["end"])
+    jump_to(lease["start"] if target is None else target)
+
+def task_controls(project_name):
+    st.markdown("#### 任务分配")
+    manager = st.session_state.annotation_manager
+    scheduler = get_scheduler(project_name)
+    lease = st.session_state.get("lease")
+    if lease is None:
+        annotator = st.text_input("标注员", key="annotator_name")
+        if st.button("📥 领取任务批次", key="acquire_lease_btn", disabled=not annotator):
+            lease = scheduler.acquire(annotator, manager)
+            if lease is None:
+                st.info("没有可领取的未完成批次")
+            else:
+                set_lease(lease)
+        return
+    # 租约过半自动续期，过期后被他人领走则退出批次
+    if lease["expires"] - time.time() < scheduler.lease_seconds / 2:
+        lease = scheduler.renew(lease)
+        if lease is None:
+            st.warning("任务批次租约已过期并被重新分配")
+            set_lease(None)
+            st.rerun()
+        st.session_state.lease = lease
+    remaining = manager.count_unfinished(lease["start"], lease["end"])
+    st.write(f"{lease['owner']} · 第{lease['start'] + 1}-{lease['end']}条，剩余未完成 {remaining} 条")
+    col_next, col_release = st.columns(2)
+    with col_next:
+        if st.button("下一批", key="next_lease_btn", use_container_width=True, disabled=remaining > 0):
+            save_annotations()
+            set_lease(scheduler.acquire(lease["owner"], manager))
+            st.rerun()
+    with col_release:
+        if st.button("释放批次", key="release_lease_btn", use_container_width=True):
+            scheduler.release(lease)
+            set_lease(None)
+            st.rerun()
+
+def mark_project_written(kind, revision=None):
+    # 本应用写入的文件内存中已是最新，只刷新签名，避免下次重跑时重新加载
+    handle = st.session_state.get("project")
+    if handle is not None and handle.name == st.session_state.get("selected_project"):
+        handle.mark_written(kind, revision)
+
+def run_preannotation(project_name):
+    from utils.preannotate import preannotate_queries
+
+    try:
+        with st.spinner("正在预标注..."):
+            suggestions = preannotate_queries(
+                st.session_state.df['query'].tolist(),
+                st.session_state.vocab_mapper.vocab,
+                st.session_state.label_category_map,
+                workers=os.cpu_count() or 1,
+            )
+            atomic_write_json(st.session_state.project.paths["suggestions"],
+                              {str(k): v for k, v in suggestions.items()})
+            st.session_state.annotation_manager.merge_suggestions(suggestions, replace=True)
+            mark_project_written("suggestions")
+        st.success(f"已为 {len(suggestions)} 条数据生成预标注建议")
+    except Exception as e:
+        print(f"[ERROR] 预标注失败: {e}")
+        st.error(f"预标注失败: {e}")
+
+def run_clustering(project_name):
+    # 大项目建议用 python -m utils.cluster 离线多进程运行，界面中单进程执行
+    from utils.cluster import QueryClusters, cluster_queries
+
+    try:
+        with st.spinner("正在聚类..."):
+            params = {"threshold": 0.7, "num_perm": 64, "bands": 16, "shingle": 2}
+            clusters = QueryClusters(cluster_queries(st.session_state.df['query'].tolist(), **params))
+            atomic_write_json(st.session_state.project.paths["clusters"], clusters.to_json(**params))
+            st.session_state.project.clusters = st.session_state.clusters = clusters
+            st.session_state.pop("search_view", None)
+            mark_project_written("clusters")
+        st.success(f"{len(clusters)} 条数据归为 {clusters.n_clusters} 个簇，可用检索式 cluster:代表 只浏览各簇代表")
+    except Exception as e:
+        print(f"[ERROR] 聚类失败: {e}")
+        st.error(f"聚类失败: {e}")
+
+def run_quality_check(project_name):
+    # 增量质检：只重查上次质检后变化的行；大项目建议用 python -m utils.lint 离线多进程运行
+    try:
+        with st.spinner("正在质检..."):
+            report = st.session_state.project.run_lint()
+            st.session_state.lint_report = report
+            st.session_state.pop("search_view", None)
+        counts = report.severity_counts()
+        st.success(f"重查 {report.checked} 行，{len(report.rows())} 行有问题（错误 {counts['error']}，警告 {counts['warning']}），"
+                   "可用检索式 issue:任意 逐条查看")
+    except Exception as e:
+        print(f"[ERROR] 质检失败: {e}")
+        st.error(f"质检失败: {e}")
+
+def run_agreement(uploaded_files):
+    # 当前项目的标注作为第一套，与上传的各套标注比较；大项目建议用 python -m utils.agreement 离线运行
+    from utils.agreement import compute_agreement, parse_annotation_set
+
+    try:
+        with st.spinner("正在计算一致性..."):
+            sets, names = [st.session_state.annotation_manager.annotations], ["当前项目"]
+            for uploaded in uploaded_files:
+                fmt = "jsonl" if uploaded.name.endswith(".jsonl") else "json"
+                sets.append(parse_annotation_set(uploaded.getvalue().decode("utf-8"), fmt))
+                names.append(os.path.splitext(uploaded.name)[0])
+            report = compute_agreement(sets, names, st.session_state.df['query'].tolist())
+            st.session_state.agreement = (report, sets)
+        st.success(f"比较 {report.n_rows} 行，{len(report.disagreement_rows())} 行存在分歧")
+    except Exception as e:
+        print(f"[ERROR] 一致性计算失败: {e}")
+        st.error(f"一致性计算失败: {e}")
+
+def load_data(uploaded_file):
+    from utils.importer import detect_format, iter_source_chunks, parse_annotation_values, validate_chunk
+
+    try:
+        frames, annotations = [], {}
+        offset = 0
+        for chunk in iter_source_chunks(uploaded_file, detect_format(uploaded_file.name)):
+            chunk = chunk.reset_index(drop=True)
+            validate_chunk(chunk, offset)
+            if 'annotations' in chunk.columns:
+                parsed, errors = parse_annotation_values(chunk['annotations'].tolist())
+                for e in errors:
+                    st.warning(f"第{offset + e}行实体解析失败")
+                annotations.update((offset + i, anns) for i, anns in enumerate(parsed) if anns)
+            frames.append(chunk)
+            offset += len(chunk)
+        df = pd.concat(frames, ignore_index=True)
         st.session_state.df = df
         # 初始化标注
         st.session_state.annotation_manager.initialize_annotations(len(df))
-        if 'annotations' in df.columns:
-            for idx, row in df.iterrows():
-                try:
-                    anns = row['annotations']
-                    if isinstance(anns, str):
-                        anns = json.loads(anns)
-                    elif pd.isna(anns):
-                        anns = []
-                    st.session_state.annotation_manager.annotations[idx] = anns
-                except Exception as e:
-                    st.warning(f"第{idx}行实体解析失败: {e}")
+        if annotations:
+            st.session_state.annotation_manager.import_annotations(annotations)
         st.success(f"成功加载 {len(df)} 条数据")
     except Exception as e:
         st.error(f"加载数据失败: {str(e)}")
@@ -257,7 +479,7 @@ def manage_entity_labels():
 def load_vocabulary(uploaded_file):
     try:
         vocab_data = json.load(uploaded_file)
-        st.session_state.vocab_mapper.load_vocabulary(vocab_data)
+        st.session_state.vocab_mapper.load_vocabulary(compile_vocab(vocab_data, VOCAB_CACHE_DIR))
         st.success("词表加载成功")
         vocab_stats = st.session_state.vocab_mapper.get_vocabulary_stats()
         for category, count in vocab_stats.items():
@@ -265,62 +487,113 @@ def load_vocabulary(uploaded_file):
     except Exception as e:
         st.error(f"加载词表失败: {str(e)}")
 
+@metrics.timed()
 def show_statistics():
     if hasattr(st.session_state, 'df'):
-        total = 0
-        mapped = 0
-        # 遍历所有数据条目
-        for idx in range(len(st.session_state.df)):
-            annotations = st.session_state.annotation_manager.get_annotations(idx)
-            total += len(annotations)
-            for ann in annotations:
-                # mapped_value 字典有内容即认为已完成映射
-                if isinstance(ann.get("mapped_value", None), dict) and any(ann["mapped_value"].values()):
-                    mapped += 1
-        progress = mapped / total if total > 0 else 0
+        # 统计由 AnnotationManager 增量维护，不再遍历全部数据
+        stats = st.session_state.annotation_manager.stats
+        progress = stats.progress()
         st.subheader("映射完成进度")
         st.progress(progress)
-        st.write(f"已完成映射: {mapped}/{total} ({progress:.1%})")
+        st.write(f"已完成映射: {stats.mapped}/{stats.total} ({progress:.1%})")
+        st.write(" / ".join(f"{name}: {stats.status_counts[status]}" for status, name in STATUS_NAMES.items()))
+        label_counts = {label: n for label, n in stats.label_counts.items() if n > 0}
+        if label_counts:
+            with st.expander("各标签实体数量", expanded=False):
+                st.bar_chart(pd.Series(label_counts, name="实体数"))
+
+def debug_panel():
+    # 上一次重跑的分段耗时与计数（本次重跑还未结束），只在 NER_METRICS=1 时显示
+    record = st.session_state.get("last_rerun_metrics")
+    if not metrics.ENABLED or record is None:
+        return
+    with st.expander("⏱️ 性能调试", expanded=False):
+        st.write(f"上次重跑耗时: {record['seconds'] * 1000:.1f} ms")
+        if record["sections"]:
+            st.dataframe(pd.DataFrame(
+                [{"段": name, "调用": entry["calls"], "耗时(ms)": round(entry["seconds"] * 1000, 2)}
+                 for name, entry in sorted(record["sections"].items(), key=lambda item: -item[1]["seconds"])]
+            ), hide_index=True, use_container_width=True)
+        if record["counters"]:
+            st.json(record["counters"], expanded=False)
+        st.caption(f"累计 {metrics.recorder.reruns} 次重跑，指标导出到 {metrics.METRICS_DIR}")
 
 def main_content():
     if not hasattr(st.session_state, 'df'):
         st.info("请先上传数据文件开始标注")
         return
+    agreement_report()
     navigation_controls()
     annotation_interface()
     export_controls()
 
+def agreement_report():
+    # 一致性指标汇总；逐行的分歧在标注界面中查看和跳转
+    agreement = st.session_state.get("agreement")
+    if agreement is None:
+        return
+    from utils.agreement import DISAGREEMENT_KINDS, DISAGREEMENT_NAMES
+
+    report = agreement[0]
+    with st.expander(f"📐 标注一致性（{'、'.join(report.names)}，比较 {report.n_rows} 行）"):
+        summary = report.summary()
+        columns = st.columns(5)
+        for column, (name, key) in zip(columns, [("span 精确 F1", "span_exact"), ("span 重叠 F1", "span_partial"),
+                                                   ("字符 F1", "token_f1"), ("Cohen's κ", "cohen_kappa"),
+                                                   ("Fleiss' κ", "fleiss_kappa")]):
+            column.metric(name, "-" if summary[key] is None else f"{summary[key]:.3f}")
+        st.dataframe(pd.DataFrame(report.label_table()), hide_index=True, use_container_width=True)
+        mapping = report.mapping_table()
+        if mapping:
+            st.write("映射一致率（在两套标注位置和标签都相同的 span 上，按类别比较取值）")
+            st.dataframe(pd.DataFrame(mapping), hide_index=True, use_container_width=True)
+        st.write("分歧行数：" + "，".join(f"{DISAGREEMENT_NAMES[kind]} {len(report.disagreement_rows(kind))}"
+                                      for kind in DISAGREEMENT_KINDS))
+
+@metrics.timed()
 def navigation_controls():
     # 重新设计的导航控件
-    total = len(st.session_state.df)
+    # 领取了任务批次时只在批次范围 [lo, hi) 内浏览；有检索条件时只在检索结果中浏览
+    lo, hi = row_bounds()
+    view = search_controls(lo, hi)
     current_idx = st.session_state.current_index
-    
-    # 计算进度百分比
-    progress_percent = (current_idx + 1) / total if total > 0 else 0
+    if view is None:
+        total, position = hi - lo, current_idx - lo
+        prev_target = current_idx - 1 if current_idx > lo else None
+        next_target = current_idx + 1 if current_idx < hi - 1 else None
+        row_at = lambda pos: lo + pos
+    else:
+        # 当前行不在结果中（如刚改完标注）时，位置显示为其后的第一条结果
+        total, position = len(view), min(view.position(current_idx), len(view) - 1)
+        prev_target = view.prev_before(current_idx, wrap=False)
+        next_target = view.next_after(current_idx, wrap=False)
+        row_at = view.at
     
     # 创建两行布局
     # 第一行：进度条和当前进度
-    st.markdown(
-        f"""
-        <div style="margin-bottom: 10px;">
-            <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
-                <span style="font-size: 14px; color: #666;">进度</span>
-                <span style="font-size: 14px; color: #666;">{current_idx + 1}/{total}</span>
-            </div>
-            <div style="width: 100%; background-color: #f0f2f6; border-radius: 10px; overflow: hidden;">
-                <div style="width: {progress_percent * 100}%; height: 8px; background: linear-gradient(90deg, #4ECDC4, #44A08D); transition: width 0.3s;"></div>
-            </div>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
+    st.markdown(progress_html(position + 1, total), unsafe_allow_html=True)
     
     # 第二行：导航按钮和状态
     col1, col2, col3 = st.columns([1, 2, 1])
     
     with col1:
-        # 留空或可以添加其他功能
-        pass
+        # 基于行状态索引的快速跳转
+        manager = st.session_state.annotation_manager
+        target, clicked = None, False
+        if st.button("⏭ 下一条未开始", key="next_not_started_btn", use_container_width=True):
+            target, clicked = manager.next_row(current_idx, STATUS_NOT_STARTED, lo=lo, hi=hi), True
+        if st.button("⏭ 下一条映射未完成", key="next_incomplete_btn", use_container_width=True):
+            target, clicked = manager.next_row(current_idx, STATUS_INCOMPLETE, lo=lo, hi=hi), True
+        if st.button("🎲 随机未完成", key="random_unfinished_btn", use_container_width=True):
+            picks = manager.sample_unfinished(1, lo=lo, hi=hi)
+            target, clicked = (picks[0] if picks else None), True
+        jump_label = st.selectbox("包含标签", [""] + st.session_state.entity_labels, key="jump_label_select")
+        if st.button("⏭ 下一条含该标签", key="next_label_btn", use_container_width=True, disabled=not jump_label):
+            target, clicked = manager.next_row(current_idx, label=jump_label, lo=lo, hi=hi), True
+        if target is not None and lo <= target < hi and target != current_idx:
+            jump_to(target)
+        elif clicked:
+            st.info("没有符合条件的数据")
     
     with col2:
         # 居中的导航按钮组
@@ -328,81 +601,104 @@ def navigation_controls():
         
         with col_prev:
             if st.button("◀", key="prev_btn", use_container_width=True, 
-                        disabled=current_idx <= 0,
-                        help="上一页") and current_idx > 0:
-                st.session_state.current_index -= 1
-                st.rerun()
+                        disabled=prev_target is None,
+                        help="上一页") and prev_target is not None:
+                jump_to(prev_target)
         
         with col_counter:
             # 美观计数器
-            st.markdown(
-                f"""
-                <div style="text-align: center; padding: 8px; background: #f0f2f6; border-radius: 8px;">
-                    <div style="font-size: 16px; font-weight: bold; color: #4ECDC4;">{current_idx + 1}</div>
-                    <div style="font-size: 12px; color: #666;">/ {total}</div>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
+            st.markdown(counter_html(position + 1, total), unsafe_allow_html=True)
             # 添加滑动条
-            slider_idx = st.slider(
-                "快速跳转", min_value=1, max_value=total, value=current_idx + 1, key="data_slider"
-            )
-            if slider_idx - 1 != current_idx:
-                st.session_state.current_index = slider_idx - 1
-                st.rerun()
+            if total > 1:
+                slider_idx = st.slider(
+                    "快速跳转", min_value=1, max_value=total, value=position + 1, key="data_slider"
+                )
+                if slider_idx - 1 != position:
+                    jump_to(row_at(slider_idx - 1))
         
         with col_next:
             if st.button("▶", key="next_btn", use_container_width=True,
-                        disabled=current_idx >= total-1,
-                        help="下一页") and current_idx < total-1:
-                st.session_state.current_index += 1
-                st.rerun()
+                        disabled=next_target is None,
+                        help="下一页") and next_target is not None:
+                jump_to(next_target)
     
     with col3:
         # 显示标注完成状态
         current_annotations = st.session_state.annotation_manager.get_annotations(current_idx)
         
-        # 判断是否完成标注：有实体且有映射关系
-        is_completed = False
-        if current_annotations:
-            # 检查每个标注的mapped_value是否都有值
-            has_valid_mappings = True
-            for ann in current_annotations:
-                mapped_value = ann.get("mapped_value", {})
-                # 如果mapped_value是空字典，或者所有值都是空列表，则认为没有有效映射
-                if not mapped_value or not any(mapped_value.values()):
-                    has_valid_mappings = False
-                    break
-            is_completed = has_valid_mappings
-        
-        # 根据完成状态设置颜色和文本
-        if is_completed:
-            status_color = "#4ECDC4"  # 绿色 - 已完成
-            status_text = "标注完成"
-        elif current_annotations:
-            status_color = "#FFA500"  # 橙色 - 有实体但映射未完成
-            status_text = "映射未完成"
-        else:
-            status_color = "#FF6B6B"  # 红色 - 未开始
-            status_text = "未开始标注"
-        
-        st.markdown(
-            f"""
-            <div style="text-align: center; padding: 8px; background: {status_color}20; border-radius: 8px; border: 1px solid {status_color}40;">
-                <div style="font-size: 14px; font-weight: bold; color: {status_color};">{status_text}</div>
-                <div style="font-size: 12px; color: #666;">{len(current_annotations)} 个实体</div>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
+        # 行状态由 AnnotationManager 增量维护
+        row_status = st.session_state.annotation_manager.get_row_status(current_idx)
+        st.markdown(status_badge_html(row_status, len(current_annotations)), unsafe_allow_html=True)
     
     # 添加一个小的分隔线
     st.markdown("<hr style='margin: 10px 0;'>", unsafe_allow_html=True)
 
+SEARCH_HELP = """空格分隔的条件同时满足，支持 OR、NOT / -条件 和括号：
+- `RTX 4060`、`"RTX 4060"`：query 中包含的文字（不区分大小写和全半角）
+- `label:品牌`：含该标签的标注；`text:华为`：标注文本为"华为"
+- `map:华为`、`map:brand=华为`、`品牌=华为`：映射到"华为"的标注
+- `status:未开始` / `status:未完成` / `status:完成`
+- `cluster:代表`：近重复簇的代表行（需先聚类）
+- `issue:任意` / `issue:错误` / `issue:overlap`：质检发现问题的行，可限定级别或检查项（需先质检）"""
+
+def search_controls(lo, hi):
+    # 检索框：返回当前批次内的过滤视图，无检索条件时返回 None
+    # 结果按 (检索式, 标注修订号) 缓存，标注变化后下一次重跑重新求值（倒排已增量更新，无需重建）
+    text = st.text_input("🔍 检索", key="search_query", placeholder="RTX 4060 / 品牌=华为 / label:型号 -status:完成",
+                         help=SEARCH_HELP).strip()
+    if not text:
+        st.session_state.pop("search_view", None)
+        return None
+    manager = st.session_state.annotation_manager
+    key = (text, manager.revision, lo, hi)
+    cached = st.session_state.get("search_view")
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    from utils.search_index import FilteredView, SearchIndex
+
+    index_path, index_version = st.session_state.query_index_key
+    search = SearchIndex(cached_query_index(index_path, index_version, st.session_state.df), manager,
+                         st.session_state.get("clusters"), st.session_state.get("lint_report"))
+    try:
+        with metrics.section("search"):
+            rows = search.search(text)
+    except ValueError as e:
+        st.error(f"检索式有误: {e}")
+        return None
+    view = FilteredView(rows, lo, hi)
+    st.session_state.search_view = (key, view)
+    if cached is None or cached[0][0] != text:
+        # 新的检索式：跳到第一条结果，清掉按旧范围保存的滑动条位置
+        st.session_state.pop("data_slider", None)
+        current_idx = st.session_state.current_index
+        if len(view) and current_idx not in view:
+            st.session_state.current_index = view.at(0)
+    st.caption(f"检索到 {len(view)} 条" if len(view) else "没有符合检索条件的数据")
+    return view
+
+def row_bounds():
+    lease = st.session_state.get("lease")
+    if lease is None:
+        return 0, len(st.session_state.df)
+    return lease["start"], lease["end"]
+
+def get_row(idx):
+    # 领取批次后只读取批次自己的数据切片
+    lease = st.session_state.get("lease")
+    if lease is not None and lease["start"] <= idx < lease["end"]:
+        return st.session_state.batch_df.iloc[idx - lease["start"]]
+    return st.session_state.df.iloc[idx]
+
+def jump_to(idx):
+    st.session_state.current_index = idx
+    # 清掉滑动条的状态，否则重跑后会按旧的滑动条值跳回去
+    st.session_state.pop("data_slider", None)
+    st.rerun()
+
+@metrics.timed()
 def annotation_interface():
     current_idx = st.session_state.current_index
-    current_data = st.session_state.df.iloc[current_idx]
+    current_data = get_row(current_idx)
     query = current_data['query']
     
     # 紧凑的标题布局
@@ -416,8 +712,14 @@ def annotation_interface():
         # if st.button("导出当前样本", key=f"export_single_{current_idx}"):
         #     # 这里可以添加导出当前样本的功能
         #     st.success("当前样本已导出")
+        history_controls()
     
     st.caption("选中上方文本后，Ctrl+C复制并粘贴到下方实体文本框，系统自动定位实体位置。")
+
+    conflicts = st.session_state.pop("merge_conflicts", None)
+    if conflicts:
+        details = "；".join(f"第{idx + 1}条: " + "、".join(s['text'] for s in spans) for idx, spans in conflicts.items())
+        st.warning(f"以下标注与其他标注员同时保存的标注重叠，已保留对方的版本：{details}")
     
     # 实体标注部分 - 上下布局
     st.markdown("---")
@@ -476,10 +778,148 @@ def annotation_interface():
             else:
                 st.error("标注重叠或无效")
     
+    display_lint_issues(current_idx)
+    display_disagreement(current_idx)
+    display_suggestions(current_idx)
+    display_cluster(query, current_idx)
+
     # 映射标注部分 - 直接调用显示当前标注
     st.markdown("---")
     display_current_annotations(query, current_idx)
 
+def display_lint_issues(current_idx):
+    # 上次质检时本行发现的问题；修改后需重新质检才会更新
+    report = st.session_state.get("lint_report")
+    issues = report.issues(current_idx) if report is not None else []
+    if not issues:
+        return
+    from utils.lint import LINT_CHECKS
+
+    st.markdown("---")
+    st.write("#### 质检问题")
+    annotations = st.session_state.annotation_manager.get_annotations(current_idx)
+    for issue in issues:
+        span = issue["span"]
+        where = f"第 {span + 1} 个标注「{annotations[span].get('text')}」" if span is not None and span < len(annotations) else "本行"
+        show = st.error if issue["severity"] == "error" else st.warning
+        show(f"{LINT_CHECKS[issue['check']][1]}：{where}，{issue['message']}")
+
+def display_disagreement(current_idx):
+    # 当前行各套标注的对照，供人工裁决；按分歧类型跳到下一条分歧
+    agreement = st.session_state.get("agreement")
+    if agreement is None:
+        return
+    from utils.agreement import DISAGREEMENT_KINDS, DISAGREEMENT_NAMES
+    from utils.search_index import FilteredView
+
+    report, sets = agreement
+    st.markdown("---")
+    col_title, col_kind, col_next = st.columns([2, 1, 1])
+    kinds = report.kinds(current_idx)
+    with col_title:
+        st.write("#### 标注分歧" + (f"：{'、'.join(DISAGREEMENT_NAMES[k] for k in kinds)}" if kinds else "：无"))
+    with col_kind:
+        kind = st.selectbox("分歧类型", [None, *DISAGREEMENT_KINDS], key="agreement_kind", label_visibility="collapsed",
+                            format_func=lambda k: "全部分歧" if k is None else DISAGREEMENT_NAMES[k])
+    with col_next:
+        lo, hi = row_bounds()
+        target = FilteredView(report.disagreement_rows(kind), lo, hi).next_after(current_idx)
+        if st.button("⏭ 下一条分歧", key="next_disagreement_btn", use_container_width=True, disabled=target is None):
+            jump_to(target)
+    if kinds:
+        for name, annotations in zip(report.names, sets):
+            spans = annotations.get(current_idx) or []
+            st.write(f"**{name}**" + ("" if spans else "：（无标注）"))
+            if spans:
+                st.markdown(spans_table(spans))
+
+def display_suggestions(current_idx):
+    manager = st.session_state.annotation_manager
+    suggestions = manager.get_suggestions(current_idx)
+    if not suggestions:
+        return
+    st.markdown("---")
+    col_title, col_all = st.columns([3, 1])
+    with col_title:
+        st.write("#### 预标注建议")
+    with col_all:
+        if st.button("✅ 全部采纳", key=f"accept_all_{current_idx}", use_container_width=True):
+            manager.accept_all_suggestions(current_idx)
+            save_annotations()
+            st.rerun()
+    for i, sug in enumerate(suggestions):
+        col_info, col_accept, col_discard = st.columns([4, 1, 1])
+        with col_info:
+            mapped = "; ".join(f"{cat}: {', '.join(values)}" for cat, values in sug['mapped_value'].items())
+            st.write(f"**{sug['text']}** ({sug['label']}) 位置 {sug['start']}-{sug['end']} → {mapped}")
+        with col_accept:
+            if st.button("采纳", key=f"accept_suggestion_{current_idx}_{i}", use_container_width=True):
+                if manager.accept_suggestion(current_idx, i):
+                    save_annotations()
+                    st.rerun()
+                else:
+                    st.error("与已有标注重叠")
+        with col_discard:
+            if st.button("忽略", key=f"discard_suggestion_{current_idx}_{i}", use_container_width=True):
+                manager.discard_suggestion(current_idx, i)
+                st.rerun()
+
+def history_controls():
+    # 撤销/重做：历史保存在会话的 AnnotationManager 中，撤销后照常保存，并跳到受影响的行
+    manager = st.session_state.annotation_manager
+    undo_label, redo_label = manager.history.undo_label, manager.history.redo_label
+    col_undo, col_redo = st.columns(2)
+    with col_undo:
+        undo = st.button("↶ 撤销", key="undo_btn", use_container_width=True, disabled=undo_label is None,
+                         help=f"撤销：{undo_label}" if undo_label else "没有可撤销的操作")
+    with col_redo:
+        redo = st.button("↷ 重做", key="redo_btn", use_container_width=True, disabled=redo_label is None,
+                         help=f"重做：{redo_label}" if redo_label else "没有可重做的操作")
+    if undo or redo:
+        rows = manager.undo() if undo else manager.redo()
+        if rows:
+            save_annotations()
+            # 当前行受影响时留在当前行，否则跳到批次范围内第一条受影响的行
+            lo, hi = row_bounds()
+            current_idx = st.session_state.current_index
+            target = current_idx if current_idx in rows else next((idx for idx in rows if lo <= idx < hi), current_idx)
+            reset_mapping_widgets(target)
+            jump_to(target)
+
+# 簇成员预览的条数上限
+CLUSTER_PREVIEW_ROWS = 20
+
+def display_cluster(query, current_idx):
+    # 当前行所在近重复簇：把本行标注按位置对齐后投射到簇内其他行，一次标注覆盖整簇
+    clusters = st.session_state.get("clusters")
+    if clusters is None or clusters.size(current_idx) <= 1:
+        return
+    manager = st.session_state.annotation_manager
+    members = [int(m) for m in clusters.members(current_idx) if m != current_idx]
+    pending = [m for m in members if not manager.get_annotations(m)]
+    st.markdown("---")
+    role = "代表" if clusters.is_representative(current_idx) else f"成员（代表为第 {clusters.representative(current_idx) + 1} 条）"
+    st.write(f"#### 相似 query（本条为簇{role}，簇内另有 {len(members)} 条，其中 {len(pending)} 条未标注）")
+    with st.expander("查看簇成员"):
+        for m in members[:CLUSTER_PREVIEW_ROWS]:
+            st.write(f"第 {m + 1} 条：{get_row(m)['query']}（{len(manager.get_annotations(m))} 个标注）")
+        if len(members) > CLUSTER_PREVIEW_ROWS:
+            st.caption(f"仅显示前 {CLUSTER_PREVIEW_ROWS} 条")
+    col_project, col_overwrite = st.columns([2, 1])
+    with col_overwrite:
+        overwrite = st.checkbox("覆盖已有标注的行", key=f"cluster_overwrite_{current_idx}")
+    with col_project:
+        targets = members if overwrite else pending
+        if st.button(f"📋 投射当前标注到 {len(targets)} 条相似 query", key=f"project_cluster_{current_idx}",
+                     use_container_width=True, disabled=not targets or not manager.get_annotations(current_idx)):
+            written = manager.project_annotations(current_idx, query, [(m, get_row(m)['query']) for m in targets],
+                                                  overwrite=overwrite)
+            if written:
+                save_annotations()
+            st.success(f"已写入 {len(written)} 条")
+            st.rerun()
+
+@metrics.timed()
 def display_current_annotations(query, current_idx):
     st.write("#### 映射标注")
     current_annotations = st.session_state.annotation_manager.get_annotations(current_idx)
@@ -488,113 +928,143 @@ def display_current_annotations(query, current_idx):
         st.info("暂无标注，请先添加实体标注")
         return
     
-    # 简化预览 - 只显示标注文本
-    st.write("**当前标注预览:**")
-    colors = {
-        "品牌": "#ff6b6b", "品类": "#4ecdc4", "型号": "#45b7d1", 
-        "CPU": "#96ceb4", "GPU": "#ffd966", "内存": "#d4a5a5",
-        "存储": "#9bdeac", "屏幕尺寸": "#a2d2ff", "价格": "#ffafcc"
-    }
+    metrics.count("spans_rendered", len(current_annotations))
+    revision = st.session_state.annotation_manager.row_revision(current_idx)
+    display_annotated_text(query, current_annotations, (current_idx, revision))
+    # 所有标注汇总为一张表，只有选中的一条渲染编辑控件，span 多时重跑开销与 span 数无关
+    with st.expander(f"全部标注（{len(current_annotations)}）", expanded=len(current_annotations) <= 10):
+        st.markdown(st.session_state.row_memo.get(("table", current_idx, revision),
+                                                  lambda: spans_table(current_annotations)))
     
-    annotated_text = []
-    for ann in current_annotations:
-        color = colors.get(ann['label'], "#ffe66d")
-        annotated_text.append(
-            f"<span style='background-color: {color}; padding: 4px 8px; margin: 2px; "
-            f"border-radius: 4px; display: inline-block; font-size: 14px;'>"
-            f"{ann['text']} ({ann['label']})</span>"
-        )
+    unmapped = [i for i, ann in enumerate(current_annotations) if not is_mapped(ann)]
+    i = st.selectbox(
+        "编辑标注",
+        options=range(len(current_annotations)),
+        index=unmapped[0] if unmapped else 0,
+        format_func=lambda k: span_title(k, current_annotations[k]),
+        key=f"focused_span_{current_idx}",
+    )
+    if i is None or i >= len(current_annotations):
+        return
+    # 在副本上编辑，通过 update_annotation 写回，保证增量统计拿到修改前的旧值
+    ann = dict(current_annotations[i])
+    ann["mapped_value"] = dict(ann["mapped_value"]) if isinstance(ann.get("mapped_value"), dict) else ann.get("mapped_value")
     
-    if annotated_text:
-        st.markdown("".join(annotated_text), unsafe_allow_html=True)
-    else:
-        st.info("暂无标注")
+    col_del, col_info = st.columns([1, 4])
+    with col_del:
+        if st.button("🗑️ 删除", key=f"delete_{current_idx}_{i}", use_container_width=True):
+            st.session_state.annotation_manager.remove_annotation(current_idx, i)
+            save_annotations()
+            st.success("标注已删除")
+            st.rerun()
     
-    # 映射部分 - 使用展开器让界面更整洁
-    for i, ann in enumerate(current_annotations):
-        with st.expander(f"标注 {i+1}: {ann['text']} - {ann['label']}", expanded=False):
-            col_del, col_info = st.columns([1, 4])
-            with col_del:
-                if st.button("🗑️ 删除", key=f"delete_{current_idx}_{i}", use_container_width=True):
-                    st.session_state.annotation_manager.remove_annotation(current_idx, i)
-                    save_annotations()
-                    st.success("标注已删除")
-                    st.rerun()
+    with col_info:
+        st.write(f"位置: {ann['start']}-{ann['end']}")
+    
+    # 多类别映射
+    if st.session_state.vocab_mapper.has_vocabulary():
+        label_category_map = st.session_state.get("label_category_map", {})
+        categories = label_category_map.get(ann['label'], [])
+        
+        if "mapped_value" not in ann or not isinstance(ann["mapped_value"], dict):
+            ann["mapped_value"] = {}
+            st.session_state.annotation_manager.update_annotation(current_idx, i, ann)
+        
+        for cat in categories:
+            current_mapping = ann["mapped_value"].get(cat, [])
+            if not isinstance(current_mapping, list):
+                current_mapping = [current_mapping] if current_mapping else []
             
-            with col_info:
-                st.write(f"位置: {ann['start']}-{ann['end']}")
+            col_map, col_add = st.columns([3, 2])
+            with col_map:
+                # 选项只下发按相关度排序的前 MAPPING_TOP_K 个，其他词条通过搜索在服务端检索
+                search = st.text_input(
+                    f"搜索{cat}词表",
+                    value="",
+                    key=f"mapping_search_{current_idx}_{i}_{cat}",
+                    placeholder=f"默认按“{ann['text']}”匹配",
+                )
+                candidates = mapping_options(st.session_state.vocab_mapper, ann['text'], cat,
+                                             current_mapping, search=search.strip(), top_k=MAPPING_TOP_K)
+                metrics.count("mapping_options", len(candidates))
+                selected_mappings = st.multiselect(
+                    f"**{cat}** 映射", 
+                    options=candidates,
+                    default=current_mapping,
+                    key=f"mapping_multiselect_{current_idx}_{i}_{cat}"
+                )
             
-            # 多类别映射
-            if st.session_state.vocab_mapper.has_vocabulary():
-                label_category_map = st.session_state.get("label_category_map", {})
-                categories = label_category_map.get(ann['label'], [])
-                
-                if "mapped_value" not in ann or not isinstance(ann["mapped_value"], dict):
-                    ann["mapped_value"] = {}
-                    st.session_state.annotation_manager.update_annotation(current_idx, i, ann)
-                
-                for cat in categories:
-                    candidates = st.session_state.vocab_mapper.vocab.get(cat, [])
-                    current_mapping = ann["mapped_value"].get(cat, [])
-                    if not isinstance(current_mapping, list):
-                        current_mapping = [current_mapping] if current_mapping else []
-                    
-                    col_map, col_add = st.columns([3, 2])
-                    with col_map:
-                        selected_mappings = st.multiselect(
-                            f"**{cat}** 映射", 
-                            options=candidates,
-                            default=current_mapping,
-                            key=f"mapping_multiselect_{current_idx}_{i}_{cat}"
-                        )
-                    
-                    with col_add:
-                        new_candidate = st.text_input(
-                            f"添加{cat}候选词", 
-                            value="", 
-                            key=f"add_candidate_{current_idx}_{i}_{cat}",
-                            placeholder="输入新词条"
-                        )
-                        if st.button("添加", key=f"add_candidate_btn_{current_idx}_{i}_{cat}") and new_candidate:
-                            if new_candidate not in st.session_state.vocab_mapper.vocab.get(cat, []):
-                                st.session_state.vocab_mapper.vocab.setdefault(cat, []).append(new_candidate)
-                                if 'selected_project' in st.session_state:
-                                    vocab_path = f"{PROJECT_DIR}/{st.session_state.selected_project}_vocab.json"
-                                    with open(vocab_path, "w", encoding="utf-8") as f:
-                                        json.dump(st.session_state.vocab_mapper.vocab, f, ensure_ascii=False)
-                                st.success(f"已添加: {new_candidate}")
-                                st.rerun()
-                            else:
-                                st.warning("词条已存在")
-                    
-                    if selected_mappings != current_mapping:
-                        ann["mapped_value"][cat] = selected_mappings
-                        st.session_state.annotation_manager.update_annotation(current_idx, i, ann)
-                        save_annotations()
-                        st.success(f"映射已更新: {cat} → {selected_mappings}")
-
-def display_annotated_text(query, annotations):
+            with col_add:
+                new_candidate = st.text_input(
+                    f"添加{cat}候选词", 
+                    value="", 
+                    key=f"add_candidate_{current_idx}_{i}_{cat}",
+                    placeholder="输入新词条"
+                )
+                if st.button("添加", key=f"add_candidate_btn_{current_idx}_{i}_{cat}") and new_candidate:
+                    if st.session_state.vocab_mapper.add_candidate(cat, new_candidate):
+                        if 'selected_project' in st.session_state:
+                            save_project_vocab(cat, new_candidate)
+                        st.success(f"已添加: {new_candidate}")
+                        st.rerun()
+                    else:
+                        st.warning("词条已存在")
+            
+            if selected_mappings != current_mapping:
+                ann["mapped_value"][cat] = selected_mappings
+                st.session_state.annotation_manager.update_annotation(current_idx, i, ann)
+                save_annotations()
+                st.success(f"映射已更新: {cat} → {selected_mappings}")
+
+    display_mapping_propagation(current_idx, i, ann)
+
+def display_mapping_propagation(current_idx, i, ann):
+    # 同一写法（文本 + 标签）在数据集中出现多次时：未映射的 span 给出最常用的已有映射，已映射的可一键应用到全部出现处
+    manager = st.session_state.annotation_manager
+    if not is_mapped(ann):
+        suggestion = manager.suggest_mapping(ann['text'], ann['label'])
+        if suggestion:
+            mapped_value, count = suggestion
+            mapped = "; ".join(f"{cat}: {', '.join(values)}" for cat, values in mapped_value.items())
+            col_info, col_accept = st.columns([4, 1])
+            with col_info:
+                st.info(f"“{ann['text']}”此前有 {count} 处映射为 {mapped}")
+            with col_accept:
+                if st.button("采纳映射", key=f"accept_mapping_{current_idx}_{i}", use_container_width=True):
+                    manager.update_annotation(current_idx, i, dict(ann, mapped_value=mapped_value))
+                    save_annotations()
+                    reset_mapping_widgets(current_idx)
+                    st.rerun()
+        return
+    others = manager.span_index.occurrences(ann['text'], ann['label']) - 1
+    if others <= 0:
+        return
+    col_apply, col_overwrite = st.columns([3, 2])
+    with col_overwrite:
+        overwrite = st.checkbox("覆盖其他已有映射", key=f"propagate_overwrite_{current_idx}_{i}")
+    with col_apply:
+        if st.button(f"将此映射应用到其他 {others} 处“{ann['text']}”（{ann['label']}）",
+                     key=f"propagate_mapping_{current_idx}_{i}", use_container_width=True):
+            updated = manager.propagate_mapping(ann['text'], ann['label'], ann['mapped_value'], overwrite=overwrite)
+            save_annotations()
+            reset_mapping_widgets(current_idx)
+            st.success(f"已更新 {updated} 处标注")
+            st.rerun()
+
+def reset_mapping_widgets(current_idx):
+    # 映射在控件之外被修改时清掉本行多选框的状态，否则重跑时控件仍保留旧值并写回
+    prefix = f"mapping_multiselect_{current_idx}_"
+    for key in [k for k in st.session_state if isinstance(k, str) and k.startswith(prefix)]:
+        del st.session_state[key]
+
+def display_annotated_text(query, annotations, row_key):
     st.write("**标注预览:**")
-    colors = {
-        "品牌": "#ff6b6b",
-        "品类": "#4ecdc4",
-        "型号": "#45b7d1",
-    }
-    sorted_annotations = sorted(annotations, key=lambda x: x['start'])
-    colored_parts = []
-    last_end = 0
-    for ann in sorted_annotations:
-        if ann['start'] > last_end:
-            colored_parts.append(query[last_end:ann['start']])
-        color = colors.get(ann['label'], "#ffe66d")
-        colored_part = f"<mark style='background-color: {color}; padding: 2px; border-radius: 3px;' title='{ann['label']}'>{ann['text']}</mark>"
-        colored_parts.append(colored_part)
-        last_end = ann['end']
-    if last_end < len(query):
-        colored_parts.append(query[last_end:])
-    annotated_html = "".join(colored_parts)
-    st.markdown(annotated_html, unsafe_allow_html=True)
+    # 预览 HTML 按 (行号, 行修订号) 缓存，行未修改时重跑不再计算缓存键或重新生成
+    html = st.session_state.row_memo.get(("preview", *row_key, query),
+                                         lambda: annotated_html(query, span_key(annotations)))
+    st.markdown(html, unsafe_allow_html=True)
 
+@metrics.timed()
 def export_controls():
     # 简化导出控件
     st.markdown("---")
@@ -634,12 +1104,12 @@ def export_controls():
         with col_right:
             st.write("")  # 占位
             # 下一条按钮
-            total = len(st.session_state.df)
+            _, hi = row_bounds()
             current_idx = st.session_state.current_index
             # if st.button("⬅️ 上一条", key="export_prev_btn", use_container_width=True) and current_idx > 0:
             #     st.session_state.current_index -= 1
             #     st.rerun()
-            if st.button("➡️ 下一条", key="export_next_btn", use_container_width=True) and current_idx < total - 1:
+            if st.button("➡️ 下一条", key="export_next_btn", use_container_width=True) and current_idx < hi - 1:
                 st.session_state.current_index += 1
                 st.rerun()
     
@@ -648,22 +1118,46 @@ def export_controls():
     with col1:
         st.write("#### 数据导出")
         if hasattr(st.session_state, 'df'):
-            export_data = st.session_state.annotation_manager.export_annotations(st.session_state.df)
-            csv = export_data.to_csv(index=False, encoding='utf-8-sig')
-            st.download_button(
-                label="📥 下载全部标注数据",
-                data=csv,
-                file_name="ner_annotations.csv",
-                mime="text/csv",
-                use_container_width=True
+            export_format = st.selectbox(
+                "导出格式", options=list(EXPORT_FORMATS),
+                format_func=lambda fmt: EXPORT_FORMATS[fmt][0], key="export_format"
             )
+            # 只在点击时分块写出到本会话独有的临时文件；下载内容交给 Streamlit 后立即删除文件，
+            # 之后的重跑不再重新读取。大项目可直接用 HTTP 接口 GET /projects/{项目}/export 流式下载
+            if st.button("📦 生成导出文件", key="build_export_btn", use_container_width=True):
+                fd, export_path = tempfile.mkstemp(prefix="ner_export_", suffix=f".{export_format}")
+                os.close(fd)
+                try:
+                    with st.spinner("正在导出..."):
+                        export_to_file(export_path, export_format, st.session_state.df, st.session_state.annotation_manager)
+                    metrics.count("export_bytes", os.path.getsize(export_path))
+                    with open(export_path, "rb") as f:
+                        st.download_button(
+                            label="📥 下载全部标注数据",
+                            data=f,
+                            file_name=f"ner_annotations.{export_format}",
+                            mime=EXPORT_FORMATS[export_format][1],
+                            use_container_width=True
+                        )
+                except Exception as e:
+                    print(f"[ERROR] 导出失败: {e}")
+                    st.error(f"导出失败: {e}")
+                finally:
+                    for path in (export_path, f"{export_path}.tmp"):
+                        if os.path.exists(path):
+                            os.remove(path)
 
+@metrics.timed()
 def save_annotations():
-    # 保存标注到本地
+    # 保存标注到本地：只追加变更行到日志，日志过大时自动合并为快照
     if 'selected_project' in st.session_state:
-        ann_path = f"{PROJECT_DIR}/{st.session_state.selected_project}_annotations.json"
-        with open(ann_path, "w", encoding="utf-8") as f:
-            json.dump(st.session_state.annotation_manager.annotations, f, ensure_ascii=False)
+        manager = st.session_state.annotation_manager
+        # 在写锁内记下签名：锁释放后其他会话的追加仍会在下次重跑时拾取
+        st.session_state.project.save()
+        if manager.conflicts:
+            # 与其他标注员同时修改了同一行且位置重叠的标注，合并时以对方已保存的为准
+            st.session_state.merge_conflicts = manager.conflicts
+            manager.conflicts = {}
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
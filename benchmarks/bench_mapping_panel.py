@@ -0,0 +1,98 @@
+# 对比映射面板"全部 span 展开 + 全量候选"与"只渲染选中 span + top-k 候选 + 缓存预览"的服务端开销
+# 统计每次重跑需要计算的候选列表耗时，以及下发给前端的组件数据量（选项、标签、预览 HTML 的 JSON 字节数）
+# 用法: python -m benchmarks.bench_mapping_panel --spans 30 --categories 5 --vocab 500
+import argparse
+import json
+import random
+import time
+from functools import lru_cache
+
+from utils.mapping import VocabularyMapper
+from utils.render import annotated_html, mapping_options, span_key, span_title, spans_table
+
+TOP_K = 20
+
+
+def make_row(n_spans, n_categories, vocab_size, seed=0):
+    rng = random.Random(seed)
+    categories = [f"cpu_cat{c}" for c in range(n_categories)]
+    vocab = {cat: [f"Intel Core i{rng.randint(3, 9)}-{rng.randint(1000, 14999)}{c}" for _ in range(vocab_size)]
+             for c, cat in enumerate(categories)}
+    spans, parts, pos = [], [], 0
+    for i in range(n_spans):
+        text = f"i{rng.randint(3, 9)}-{rng.randint(1000, 14999)}"
+        spans.append({'text': text, 'label': "CPU", 'start': pos, 'end': pos + len(text),
+                      'mapped_value': {categories[0]: [vocab[categories[0]][i]]} if i % 2 else {}})
+        parts.append(text)
+        pos += len(text) + 1
+    return " ".join(parts), spans, vocab, categories
+
+
+def eager_panel(query, spans, mapper, categories):
+    # 原实现：每个 span 一个展开器，每个类别一个多选框，选项为全部候选
+    payload = []
+    for i, ann in enumerate(spans):
+        payload.append(f"标注 {i + 1}: {ann['text']} - {ann['label']}")
+        for cat in categories:
+            current = ann['mapped_value'].get(cat, [])
+            options = mapper.find_mappings(ann['text'], cat)
+            payload.append({"label": cat, "options": options + [m for m in current if m not in options],
+                            "default": current})
+    payload.append(annotated_html(query, span_key(spans)))
+    return payload
+
+
+def windowed_panel(query, spans, mapper, categories, focused, preview):
+    # 新实现：汇总表 + 选中 span 的编辑控件（top-k 选项）+ 缓存的预览 HTML
+    payload = [preview(query, span_key(spans)), spans_table(spans),
+               [span_title(i, ann) for i, ann in enumerate(spans)]]
+    ann = spans[focused]
+    for cat in categories:
+        current = ann['mapped_value'].get(cat, [])
+        payload.append({"label": cat, "default": current,
+                        "options": mapping_options(mapper, ann['text'], cat, current, top_k=TOP_K)})
+    return payload
+
+
+def measure(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        payload = fn()
+    elapsed = (time.perf_counter() - t0) / repeat
+    return elapsed, len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="映射面板渲染开销基准测试")
+    parser.add_argument("--spans", type=int, default=30)
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--vocab", type=int, default=500, help="每个类别的词表大小")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    query, spans, vocab, categories = make_row(args.spans, args.categories, args.vocab)
+    mapper = VocabularyMapper()
+    mapper.load_vocabulary(vocab)
+    for cat in categories:
+        mapper.get_index(cat)
+    preview = lru_cache(maxsize=512)(annotated_html)
+
+    eager_time, eager_bytes = measure(lambda: eager_panel(query, spans, mapper, categories), args.repeat)
+    windowed_time, windowed_bytes = measure(
+        lambda: windowed_panel(query, spans, mapper, categories, 0, preview), args.repeat)
+    results = {
+        "spans": args.spans, "categories": args.categories, "vocab_per_category": args.vocab,
+        "eager": {"seconds_per_rerun": eager_time, "payload_bytes": eager_bytes},
+        "windowed": {"seconds_per_rerun": windowed_time, "payload_bytes": windowed_bytes},
+        "speedup": eager_time / windowed_time if windowed_time else None,
+        "payload_ratio": eager_bytes / windowed_bytes if windowed_bytes else None,
+    }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# 启动与重跑开销基准测试
+# 1. 冷启动：在新的解释器中执行 app.py 顶层的全部 import，取多次的中位数（按需导入的模块不计入）
+# 2. 重跑：安装了 streamlit 时用 AppTest 无界面运行 app.py，测首次运行和打开项目后每次点击"下一条"的重跑耗时
+# 3. 行派生数据：每行预览 HTML / 标注汇总表直接生成与按行修订号命中缓存的耗时
+# 用法: python -m benchmarks.bench_startup --output startup.json [--max-import-ms 800]
+import argparse
+import ast
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.datasets import make_rows, make_vocab
+from utils.render import RowMemo, annotated_html, span_key, spans_table
+from utils.storage import AnnotationJournal
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def app_imports(path=APP_PATH):
+    # app.py 模块级的 import 语句；未安装 streamlit 时跳过 streamlit 的导入并在结果中注明
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    statements, skipped = [], []
+    for node in ast.parse(source).body:
+        if not isinstance(node, (ast.Import, ast.ImportFrom)):
+            continue
+        modules = [alias.name for alias in node.names] if isinstance(node, ast.Import) else [node.module]
+        if any(importlib.util.find_spec(m.split(".")[0]) is None for m in modules):
+            skipped.extend(modules)
+            continue
+        statements.append(ast.get_source_segment(source, node))
+    return statements, skipped
+
+
+def cold_import_seconds(statements, repeat):
+    script = ("import time\nt0 = time.perf_counter()\n" + "\n".join(statements)
+              + "\nprint(time.perf_counter() - t0)\n")
+    root = os.path.dirname(APP_PATH)
+    samples = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples), samples
+
+
+def make_project(project_dir, n_rows, spans_per_row):
+    vocab = make_vocab(500)
+    df, annotations = make_rows(n_rows, spans_per_row, vocab)
+    os.makedirs(project_dir, exist_ok=True)
+    df.to_csv(f"{project_dir}/bench.csv", index=False, encoding="utf-8-sig")
+    AnnotationJournal(f"{project_dir}/bench_annotations.json").reset(annotations)
+    with open(f"{project_dir}/bench_vocab.json", "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    return df, annotations
+
+
+def rerun_seconds(n_rows, spans_per_row, clicks):
+    # 在临时目录中运行 app.py（PROJECT_DIR 为相对路径），返回 None 表示未安装 streamlit
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return None
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            make_project("data/projects", n_rows, spans_per_row)
+            at = AppTest.from_file(APP_PATH, default_timeout=120)
+            t0 = time.perf_counter()
+            at.run()
+            first = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            at.selectbox(key="project_select").set_value("bench").run()
+            open_project = time.perf_counter() - t0
+            samples = []
+            for _ in range(clicks):
+                t0 = time.perf_counter()
+                at.button(key="next_btn").click().run()
+                samples.append(time.perf_counter() - t0)
+        finally:
+            os.chdir(cwd)
+    return {"first_run": first, "open_project": open_project, "click_rerun": statistics.median(samples)}
+
+
+def derived_seconds(n_rows, spans_per_row, repeat):
+    # 每次重跑都要为当前行生成预览和汇总表；按 (行号, 修订号) 缓存后行未变化时只需一次字典查找
+    df, annotations = make_rows(n_rows, spans_per_row, make_vocab(500))
+    rows = [(df['query'][i], annotations[i]) for i in range(n_rows)]
+
+    def direct():
+        for query, spans in rows:
+            annotated_html(query, span_key(spans))
+            spans_table(spans)
+
+    memo = RowMemo(maxsize=n_rows * 2)
+
+    def memoized():
+        for idx, (query, spans) in enumerate(rows):
+            memo.get(("preview", idx, 0, query), lambda: annotated_html(query, span_key(spans)))
+            memo.get(("table", idx, 0), lambda: spans_table(spans))
+
+    memoized()
+    results = {}
+    for name, fn in (("direct", direct), ("memoized", memoized)):
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            elapsed = (time.perf_counter() - t0) / n_rows
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = best
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动与重跑开销基准测试")
+    parser.add_argument("--repeat", type=int, default=5, help="冷启动测量次数（取中位数）")
+    parser.add_argument("--rows", type=int, default=1000, help="重跑测试用的项目行数")
+    parser.add_argument("--spans", type=int, default=30, help="每行 span 数")
+    parser.add_argument("--clicks", type=int, default=10, help="重跑测试点击次数（取中位数）")
+    parser.add_argument("--max-import-ms", type=float, help="冷启动导入耗时上限，超过时以非零状态退出")
+    parser.add_argument("--max-rerun-ms", type=float, help="点击重跑耗时上限，超过时以非零状态退出")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    statements, skipped = app_imports()
+    cold, samples = cold_import_seconds(statements, args.repeat)
+    results = {"cold_import_seconds": cold, "cold_import_samples": samples, "skipped_imports": skipped,
+               "rerun": rerun_seconds(args.rows, args.spans, args.clicks),
+               "row_derived_seconds": derived_seconds(args.rows, args.spans, 3)}
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if skipped:
+        print(f"[WARN] 未安装、未计入冷启动: {', '.join(skipped)}")
+    if results["rerun"] is None:
+        print("[WARN] 未安装 streamlit，跳过重跑测试")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    failed = []
+    if args.max_import_ms is not None and cold * 1000 > args.max_import_ms:
+        failed.append(f"冷启动导入 {cold * 1000:.0f} ms > {args.max_import_ms} ms")
+    if args.max_rerun_ms is not None and results["rerun"] is not None \
+            and results["rerun"]["click_rerun"] * 1000 > args.max_rerun_ms:
+        failed.append(f"点击重跑 {results['rerun']['click_rerun'] * 1000:.0f} ms > {args.max_rerun_ms} ms")
+    if failed:
+        print("[FAIL] " + "；".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# 基准测试用的合成数据：query、按 映射词表.json 形状生成的词表、每行若干 span 的标注
+import random
+
+import pandas as pd
+
+# 类别及其在 映射词表.json 中的大致词条占比
+VOCAB_SHAPE = {
+    "category": 0.15, "brand": 0.09, "model": 0.44, "release_year": 0.005, "cpu_brand": 0.004,
+    "cpu_series": 0.006, "cpu_family": 0.009, "cpu_model": 0.07, "cpu_gen": 0.005, "gpu_type": 0.003,
+    "gpu_brand": 0.002, "gpu_series": 0.002, "gpu_model": 0.032, "screen_size_inch": 0.014,
+    "storage_capacity_gb": 0.013, "memory_capacity_gb": 0.008, "color": 0.15, "ai": 0.001,
+}
+LABEL_CATEGORIES = {
+    "品类": ["category"], "品牌": ["brand"], "型号": ["model"], "年份": ["release_year"],
+    "CPU": ["cpu_brand", "cpu_series", "cpu_family", "cpu_model", "cpu_gen"],
+    "GPU": ["gpu_type", "gpu_brand", "gpu_series", "gpu_model"], "屏幕尺寸": ["screen_size_inch"],
+    "存储": ["storage_capacity_gb"], "内存": ["memory_capacity_gb"], "颜色": ["color"],
+}
+_SYLLABLES = ["联想", "华为", "小新", "酷睿", "锐龙", "星光", "银", "黑", "灰", "pro", "air", "max",
+              "book", "pad", "rtx", "gtx", "i5", "i7", "r7", "灵耀", "拯救者", "轻薄", "游戏本", "笔记本"]
+
+
+def make_vocab(n_terms, seed=0):
+    rng = random.Random(seed)
+    vocab = {}
+    for category, share in VOCAB_SHAPE.items():
+        terms = set()
+        for _ in range(max(1, int(n_terms * share))):
+            if category.endswith(("_gb", "_inch", "_year", "_gen")) or category == "cpu_model":
+                terms.add(str(rng.randint(1, 20000)))
+            else:
+                terms.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 3))) + str(rng.randint(0, 99)))
+        vocab[category] = sorted(terms)
+    return vocab
+
+
+def make_rows(n_rows, spans_per_row, vocab, seed=0, mapped_ratio=0.6):
+    # 返回 (DataFrame[query], {行号: [span]})，span 文本取自词表，位置与 query 一致且互不重叠
+    rng = random.Random(seed)
+    labels = list(LABEL_CATEGORIES)
+    queries, annotations = [], {}
+    for idx in range(n_rows):
+        parts, row, pos = [], [], 0
+        for _ in range(spans_per_row):
+            label = rng.choice(labels)
+            category = rng.choice(LABEL_CATEGORIES[label])
+            text = rng.choice(vocab[category])
+            row.append({
+                'text': text, 'label': label, 'start': pos, 'end': pos + len(text),
+                'mapped_value': {category: [text]} if rng.random() < mapped_ratio else {},
+            })
+            parts.append(text)
+            pos += len(text) + 1
+        queries.append(" ".join(parts) or "空")
+        annotations[idx] = row
+    return pd.DataFrame({"query": queries}), annotations
@@ -0,0 +1,308 @@
+# 核心路径基准测试（无需 Streamlit）：标注增删、导出、映射检索、项目加载/保存、统计、全文检索、近重复聚类、标注质检、标注一致性
+# 每个用例在多个数据规模下记录耗时（多次取最小）与峰值内存，结果写入 JSON，可与上一次结果对比发现回退
+# 用法: python -m benchmarks.suite --sizes 1000 10000 100000 --output bench.json [--compare old.json]
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.datasets import LABEL_CATEGORIES, make_rows, make_vocab
+from utils.agreement import compute_agreement
+from utils.annotation import AnnotationManager
+from utils.cluster import cluster_queries
+from utils.export import iter_jsonl
+from utils.lint import run_lint
+from utils.mapping import VocabularyMapper
+from utils.project import read_dataset
+from utils.search_index import QueryIndex, SearchIndex
+from utils.stats import AnnotationStats
+from utils.storage import AnnotationJournal
+
+CASES = {}
+
+
+def case(name):
+    # 用例 setup(data) 在计时外执行，返回 (待计时的函数, 操作次数)
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class Dataset:
+    def __init__(self, n_rows, spans_per_row, vocab_terms, workdir, seed=0):
+        self.n_rows = n_rows
+        self.vocab = make_vocab(vocab_terms, seed)
+        self.df, self.annotations = make_rows(n_rows, spans_per_row, self.vocab, seed)
+        self.n_spans = sum(len(row) for row in self.annotations.values())
+        self.workdir = workdir
+        self._project = None
+
+    def manager(self):
+        manager = AnnotationManager()
+        manager.initialize_annotations(self.n_rows)
+        manager.import_annotations(self.annotations)
+        return manager
+
+    def project(self):
+        # 与新建项目相同的文件布局：数据 CSV + 标注快照
+        if self._project is None:
+            base = os.path.join(self.workdir, f"bench_{self.n_rows}")
+            self.df.to_csv(f"{base}.csv", index=False, encoding="utf-8-sig")
+            AnnotationJournal(f"{base}_annotations.json").reset(self.annotations)
+            self._project = base
+        return self._project
+
+
+@case("add_annotation")
+def bench_add_annotation(data):
+    manager = AnnotationManager()
+    manager.initialize_annotations(data.n_rows)
+
+    def run():
+        for idx, row in data.annotations.items():
+            for span in row:
+                manager.add_annotation(idx, span)
+    return run, data.n_spans
+
+
+@case("export_annotations")
+def bench_export_annotations(data):
+    manager = data.manager()
+    return (lambda: manager.export_annotations(data.df)), data.n_rows
+
+
+@case("export_jsonl")
+def bench_export_jsonl(data):
+    manager = data.manager()
+
+    def run():
+        for _ in iter_jsonl(data.df, manager):
+            pass
+    return run, data.n_rows
+
+
+@case("find_mappings")
+def bench_find_mappings(data):
+    mapper = VocabularyMapper()
+    mapper.load_vocabulary(data.vocab)
+    lookups = []
+    for row in data.annotations.values():
+        for span in row:
+            lookups.append((span['text'], LABEL_CATEGORIES[span['label']][0]))
+        if len(lookups) >= 20000:
+            break
+    # 先构建各类别索引，只计检索耗时
+    for category in data.vocab:
+        mapper.get_index(category)
+
+    def run():
+        for text, category in lookups:
+            mapper.find_mappings(text, category, top_k=20)
+    return run, len(lookups)
+
+
+@case("project_load")
+def bench_project_load(data):
+    base = data.project()
+
+    def run():
+        df = read_dataset(f"{base}.csv")
+        manager = AnnotationManager()
+        manager.attach_journal(AnnotationJournal(f"{base}_annotations.json"))
+        manager.set_row_count(len(df))
+    return run, data.n_rows
+
+
+@case("project_save")
+def bench_project_save(data):
+    # 修改 1% 的行后保存（save_annotations 的路径），每次在新的项目副本上执行
+    base = data.project()
+    journal_path = f"{base}_annotations.journal"
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+    manager = AnnotationManager()
+    manager.attach_journal(AnnotationJournal(f"{base}_annotations.json"))
+    edited = range(0, data.n_rows, 100)
+    for idx in edited:
+        manager.replace_annotations(idx, [])
+    return manager.save, len(edited)
+
+
+@case("statistics")
+def bench_statistics(data):
+    def run():
+        stats = AnnotationStats()
+        stats.rebuild(data.annotations, data.n_rows)
+        return stats.progress(), dict(stats.status_counts)
+    return run, data.n_rows
+
+
+@case("search_build")
+def bench_search_build(data):
+    return (lambda: QueryIndex(data.df['query'])), data.n_rows
+
+
+@case("search")
+def bench_search(data):
+    # 从数据中取 query 片段、标签和映射值组成检索式，每条检索式计一次操作
+    search = SearchIndex(QueryIndex(data.df['query']), data.manager())
+    queries = []
+    for idx in range(0, data.n_rows, max(data.n_rows // 50, 1)):
+        query = data.df['query'][idx]
+        spans = data.annotations.get(idx) or [{'label': '品牌', 'text': query[:2]}]
+        span = spans[0]
+        queries += [query[:2], query[:4], f"label:{span['label']} {query[:2]}",
+                    f"{span['label']}={span['text']} OR text:{span['text']}", f"-status:完成 {query[:3]}"]
+
+    def run():
+        for text in queries:
+            search.search(text)
+    return run, len(queries)
+
+
+@case("cluster")
+def bench_cluster(data):
+    # 单进程聚类全部 query（签名 + LSH + 连通分量）
+    queries = data.df['query'].tolist()
+    return (lambda: cluster_queries(queries)), data.n_rows
+
+
+@case("lint")
+def bench_lint(data):
+    # 单进程全量质检（行内检查 + 跨行标签一致性）
+    queries = data.df['query'].tolist()
+    manager = data.manager()
+    return (lambda: run_lint(queries, manager, data.vocab, LABEL_CATEGORIES, "bench")), data.n_rows
+
+
+@case("lint_incremental")
+def bench_lint_incremental(data):
+    # 从已保存的项目加载，修改 1% 的行后增量质检，每条重查的行计一次操作
+    queries = data.df['query'].tolist()
+    base = data.project()
+    manager = AnnotationManager()
+    manager.attach_journal(AnnotationJournal(f"{base}_annotations.json"))
+    previous = run_lint(queries, manager, data.vocab, LABEL_CATEGORIES, "bench")
+    edited = range(0, data.n_rows, 100)
+    for idx in edited:
+        row = manager.get_annotations(idx)
+        if row:
+            manager.remove_annotation(idx, len(row) - 1)
+    return (lambda: run_lint(queries, manager, data.vocab, LABEL_CATEGORIES, "bench", previous)), len(edited)
+
+
+@case("agreement")
+def bench_agreement(data):
+    # 两套标注的一致性：第二套把每 10 行中一行的首个 span 右边界加一，每行计一次操作
+    second = {}
+    for idx, row in data.annotations.items():
+        if idx % 10 == 0 and row:
+            row = [dict(row[0], end=row[0]['end'] + 1)] + row[1:]
+        second[idx] = row
+    queries = data.df['query'].tolist()
+    return (lambda: compute_agreement([data.annotations, second], queries=queries)), data.n_rows
+
+
+def time_case(setup, data, repeat):
+    best, ops = None, 0
+    for _ in range(repeat):
+        run, ops = setup(data)
+        gc.collect()
+        t0 = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, ops
+
+
+def peak_memory(setup, data):
+    # 只统计被测函数执行期间新增的峰值（tracemalloc 会拖慢执行，与计时分开跑）
+    run, _ = setup(data)
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - base
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    # 与基线按 (用例, 规模) 对比，耗时比超过阈值视为回退
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["case"], r["rows"]): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\n对比基线 {baseline_path}")
+    for r in results:
+        old = baseline.get((r["case"], r["rows"]))
+        if old is None:
+            continue
+        ratio = r["seconds"] / max(old["seconds"], 1e-9)
+        flag = "  <-- 回退" if ratio > threshold else ""
+        print(f"{r['case']:<20}{r['rows']:>10}{old['seconds']:>12.4f}{r['seconds']:>12.4f}{ratio:>8.2f}x{flag}")
+        if flag:
+            regressions.append(r)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="标注工具核心路径基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="数据行数，可到 1000000")
+    parser.add_argument("--spans", type=int, default=3, help="每行 span 数")
+    parser.add_argument("--vocab", type=int, default=2700, help="词表词条数")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="不测峰值内存（大规模时可节省一半时间）")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=1.2, help="耗时超过基线该倍数视为回退")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'case':<20}{'rows':>10}{'seconds':>12}{'us/op':>10}{'peak(MB)':>10}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            data = Dataset(size, args.spans, args.vocab, workdir)
+            for name in args.cases:
+                seconds, ops = time_case(CASES[name], data, args.repeat)
+                peak = None if args.no_memory else peak_memory(CASES[name], data)
+                results.append({"case": name, "rows": size, "ops": ops, "seconds": seconds,
+                                "seconds_per_op": seconds / ops if ops else None, "peak_bytes": peak})
+                peak_text = "-" if peak is None else f"{peak / 2**20:.1f}"
+                print(f"{name:<20}{size:>10}{seconds:>12.4f}{seconds / max(ops, 1) * 1e6:>10.2f}{peak_text:>10}",
+                      flush=True)
+            del data
+            gc.collect()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": {"spans": args.spans, "vocab": args.vocab, "repeat": args.repeat},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import pytest
+
+from utils.agreement import comparison_rows, compute_agreement
+
+
+def span(text, label, start, end, mapped=None):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': mapped or {}}
+
+
+QUERIES = ["苹果手机", "华为电脑"]
+
+
+def test_comparison_rows_include_rows_only_one_set_annotated():
+    # 项目标注和导出文件都不保存空行，只有一套标注的行也要参与比较
+    a = {0: [span("苹果", "品牌", 0, 2)], 1: [span("华为", "品牌", 0, 2)]}
+    b = {0: [span("苹果", "品牌", 0, 2)], 5: []}
+    assert comparison_rows([a, b]) == [0, 1]
+
+
+def test_hand_computed_example():
+    a = {0: [span("苹果", "品牌", 0, 2, {"品牌": ["苹果"]})], 1: [span("华为", "品牌", 0, 2)]}
+    b = {0: [span("苹果", "品牌", 0, 2, {"品牌": ["苹果"]})]}
+    report = compute_agreement([a, b], ["a", "b"], QUERIES)
+    assert report.n_rows == 2
+    assert report.n_units == 8
+    summary = report.summary()
+    # span：a 有 2 个、b 有 1 个，精确匹配 1 个 -> F1 = 2 * 1 / (2 + 1)
+    assert summary["span_exact"] == pytest.approx(2 / 3)
+    assert summary["span_partial"] == pytest.approx(2 / 3)
+    # 字符：a 标了 4 个字、b 标了 2 个，重合 2 个 -> F1 = 2 * 2 / (4 + 2)
+    assert summary["token_f1"] == pytest.approx(2 / 3)
+    # 8 个字一致 6 个，po = 0.75；pe = 0.5 * 0.25 + 0.5 * 0.75 = 0.5
+    assert summary["cohen_kappa"] == pytest.approx(0.5)
+    # 两人 Fleiss：P = 0.75，品牌占 6/16、O 占 10/16，Pe = 0.375² + 0.625²
+    pe = 0.375 ** 2 + 0.625 ** 2
+    assert summary["fleiss_kappa"] == pytest.approx((0.75 - pe) / (1 - pe))
+    assert report.mapping_table() == [{"category": "品牌", "compared": 1, "agreed": 1, "rate": 1.0}]
+    assert report.disagreement_rows().tolist() == [1]
+    assert report.kinds(1) == ["missing"]
+    assert report.kinds(0) == []
+
+
+def test_disagreement_kinds():
+    a = {
+        0: [span("苹果", "品牌", 0, 2, {"品牌": ["苹果"]})],
+        1: [span("华为电脑", "品牌", 0, 4)],
+        2: [span("小米", "品牌", 0, 2)],
+    }
+    b = {
+        0: [span("苹果", "品牌", 0, 2, {"品牌": ["苹果公司"]})],
+        1: [span("华为", "品牌", 0, 2)],
+        2: [span("小米", "品类", 0, 2)],
+    }
+    report = compute_agreement([a, b], queries=["苹果手机", "华为电脑", "小米"])
+    assert report.kinds(0) == ["mapping"]
+    assert report.kinds(1) == ["boundary"]
+    assert report.kinds(2) == ["label"]
+    assert report.disagreement_rows("label").tolist() == [2]
+
+
+def test_explicit_rows_limit_the_sample():
+    a = {0: [span("苹果", "品牌", 0, 2)], 1: [span("华为", "品牌", 0, 2)]}
+    b = {0: [span("苹果", "品牌", 0, 2)]}
+    report = compute_agreement([a, b], queries=QUERIES, rows=[0])
+    assert report.n_rows == 1
+    assert report.summary()["span_exact"] == 1.0
+    assert len(report.disagreement_rows()) == 0
+
+
+def test_needs_two_sets():
+    with pytest.raises(ValueError):
+        compute_agreement([{}])
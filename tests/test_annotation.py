@@ -0,0 +1,56 @@
+from utils.annotation import AnnotationManager, sort_spans
+
+
+def span(text, label, start, end, mapped=None):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': mapped or {}}
+
+
+def starts(manager, idx):
+    return [s['start'] for s in manager.get_annotations(idx)]
+
+
+def test_sort_spans_orders_and_rejects_overlaps():
+    assert [s['start'] for s in sort_spans([span("b", "x", 4, 6), span("a", "x", 0, 2)])] == [0, 4]
+    assert sort_spans([span("a", "x", 0, 3), span("b", "x", 2, 4)]) is None
+    # 首尾相接不算重叠
+    assert sort_spans([span("a", "x", 0, 2), span("b", "x", 2, 4)]) is not None
+
+
+def test_spans_stay_sorted_and_overlaps_are_rejected():
+    manager = AnnotationManager()
+    manager.set_row_count(1)
+    for start in (10, 0, 5, 20):
+        assert manager.add_annotation(0, span("ab", "x", start, start + 2))
+    assert starts(manager, 0) == [0, 5, 10, 20]
+    assert not manager.add_annotation(0, span("abc", "x", 4, 7))
+    assert not manager.add_annotation(0, span("a", "x", 21, 22))
+    assert not manager.add_annotation(0, span("a" * 30, "x", 0, 30))
+    assert manager.add_annotation(0, span("abc", "x", 2, 5))
+    assert starts(manager, 0) == [0, 2, 5, 10, 20]
+    manager.remove_annotation(0, 1)
+    assert starts(manager, 0) == [0, 5, 10, 20]
+    assert manager._starts[0] == [0, 5, 10, 20]
+
+
+def test_update_moves_span_and_ignores_itself_in_overlap_check():
+    manager = AnnotationManager()
+    manager.set_row_count(1)
+    manager.add_annotations(0, [span("a", "x", 0, 2), span("b", "y", 5, 7), span("c", "z", 10, 12)])
+    # 原地扩展只与自身重叠，允许
+    assert manager.update_annotation(0, 1, span("b", "y", 4, 8))
+    assert not manager.update_annotation(0, 1, span("b", "y", 1, 8))
+    assert manager.update_annotation(0, 0, span("a", "x", 14, 16))
+    assert [s['text'] for s in manager.get_annotations(0)] == ["b", "c", "a"]
+    assert starts(manager, 0) == manager._starts[0] == [4, 10, 14]
+    # 批量添加整批校验，有重叠时一个都不写入
+    assert not manager.add_annotations(0, [span("d", "x", 20, 22), span("e", "x", 11, 13)])
+    assert starts(manager, 0) == [4, 10, 14]
+
+
+def test_suggestions_overlapping_spans_are_dropped():
+    manager = AnnotationManager()
+    manager.set_row_count(2)
+    manager.add_annotation(0, span("苹果", "品牌", 0, 2))
+    manager.merge_suggestions({0: [span("苹", "品牌", 1, 2), span("手机", "品类", 2, 4)], 1: [span("x", "y", 0, 1)]})
+    assert [s['text'] for s in manager.get_suggestions(0)] == ["手机"]
+    assert len(manager.get_suggestions(1)) == 1
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from benchmarks.datasets import LABEL_CATEGORIES, make_rows, make_vocab
+from benchmarks.suite import CASES, Dataset, compare, time_case
+
+
+def test_synthetic_rows_are_consistent_with_queries():
+    vocab = make_vocab(300)
+    assert make_vocab(300) == vocab
+    df, annotations = make_rows(50, 3, vocab)
+    assert len(df) == len(annotations) == 50
+    for idx, row in annotations.items():
+        query = df['query'][idx]
+        for prev, span in zip([None] + row, row):
+            assert query[span['start']:span['end']] == span['text']
+            assert prev is None or prev['end'] < span['start']
+            assert span['label'] in LABEL_CATEGORIES
+            assert set(span['mapped_value']) <= set(LABEL_CATEGORIES[span['label']])
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_every_case_runs_on_a_small_dataset(name, tmp_path):
+    data = Dataset(40, 2, 200, str(tmp_path))
+    seconds, ops = time_case(CASES[name], data, repeat=1)
+    assert seconds >= 0 and ops > 0
+
+
+def test_compare_flags_cases_slower_than_threshold(tmp_path):
+    baseline = tmp_path / "old.json"
+    baseline.write_text(json.dumps({"results": [
+        {"case": "search", "rows": 1000, "seconds": 1.0},
+        {"case": "lint", "rows": 1000, "seconds": 1.0},
+    ]}), encoding="utf-8")
+    results = [
+        {"case": "search", "rows": 1000, "seconds": 1.1},
+        {"case": "lint", "rows": 1000, "seconds": 1.5},
+        {"case": "lint", "rows": 10000, "seconds": 9.0},
+    ]
+    assert compare(results, str(baseline), 1.2) == [results[1]]
+    assert compare(results, str(baseline), 2.0) == []
@@ -0,0 +1,76 @@
+import numpy as np
+
+from utils.annotation import AnnotationManager
+from utils.cluster import QueryClusters, align_spans, cluster_queries, normalize_query
+
+
+def span(text, label, start, end):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': {}}
+
+
+def test_exact_and_near_duplicates_share_a_representative():
+    queries = ["苹果手机 128G 黑色", "苹果手机128g黑色", "ＡＰＰＬＥ 手机", "apple 手机",
+               "华为笔记本电脑 16寸", "华为笔记本电脑 16 寸 ", "小米电视"]
+    assert normalize_query(queries[2]) == normalize_query(queries[3]) == "apple 手机"
+    labels = cluster_queries(queries, threshold=0.6)
+    assert labels[0] == labels[1] == 0
+    assert labels[2] == labels[3] == 2
+    assert labels[4] == labels[5] == 4
+    assert labels[6] == 6
+    assert labels[0] != labels[4]
+
+
+def test_representative_is_most_frequent_spelling():
+    queries = ["华为 mate60", "华为mate60 pro", "华为 MATE60", "华为 mate60"]
+    labels = cluster_queries(queries, threshold=0.5)
+    # "华为 mate60" 出现 3 次（大小写不同也算同一写法），取其第一行
+    assert labels.tolist() == [0, 0, 0, 0]
+
+
+def test_empty_and_missing_queries_stay_singletons():
+    queries = ["", None, "  ", "小米手机", "小米手机", None]
+    labels = cluster_queries(queries)
+    assert labels.tolist() == [0, 1, 2, 3, 3, 5]
+    clusters = QueryClusters(labels)
+    assert clusters.n_clusters == 5
+    assert clusters.size(1) == 1
+    assert clusters.members(4).tolist() == [3, 4]
+
+
+def test_query_clusters_csr_and_json_round_trip():
+    clusters = QueryClusters([0, 0, 2, 0, 2, 5])
+    assert clusters.representatives().tolist() == [0, 2, 5]
+    assert clusters.members(3).tolist() == [0, 1, 3]
+    assert clusters.sizes().tolist() == [3, 3, 2, 3, 2, 1]
+    assert clusters.is_representative(2) and not clusters.is_representative(4)
+    restored = QueryClusters.from_json(clusters.to_json(threshold=0.7))
+    assert np.array_equal(restored.labels, clusters.labels)
+
+
+def test_align_spans_shifts_offsets_and_skips_missing_text():
+    spans = [span("苹果", "品牌", 0, 2), span("黑色", "颜色", 4, 6), span("128G", "容量", 7, 11)]
+    aligned = align_spans("苹果手机黑色 128G", spans, "新款 苹果手机 128g 黑色")
+    assert [(s['text'], s['start'], s['end']) for s in aligned] == [
+        ("苹果", 3, 5), ("128g", 8, 12), ("黑色", 13, 15)]
+    assert spans[0]['start'] == 0
+    # 目标中不存在的文本跳过，重复出现时取离原位置最近的一处
+    assert align_spans("苹果 壳", [span("壳", "品类", 3, 4)], "华为手机") == []
+    nearest = align_spans("x 壳 y", [span("壳", "品类", 2, 3)], "壳 x 壳 y")
+    assert [(s['start'], s['end']) for s in nearest] == [(4, 5)]
+
+
+def test_project_annotations_writes_aligned_rows():
+    queries = ["苹果手机 黑色", "新款苹果手机黑色", "苹果手机", "华为手机"]
+    manager = AnnotationManager()
+    manager.set_row_count(len(queries))
+    manager.add_annotation(0, span("苹果", "品牌", 0, 2))
+    manager.add_annotation(0, span("黑色", "颜色", 5, 7))
+    manager.add_annotation(2, span("手机", "品类", 2, 4))
+    targets = list(enumerate(queries))
+    assert manager.project_annotations(0, queries[0], targets) == [1]
+    assert [(s['text'], s['start']) for s in manager.annotations[1]] == [("苹果", 2), ("黑色", 6)]
+    # 已有标注的行默认不覆盖，无法对齐的行不写入
+    assert manager.annotations[2][0]['label'] == "品类"
+    assert not manager.annotations.get(3)
+    assert manager.project_annotations(0, queries[0], targets, overwrite=True) == [1, 2]
+    assert [s['text'] for s in manager.annotations[2]] == ["苹果"]
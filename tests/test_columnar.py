@@ -0,0 +1,76 @@
+import copy
+
+import utils.columnar as columnar
+from utils.annotation import AnnotationManager
+from utils.columnar import ColumnarAnnotationStore
+from utils.storage import AnnotationJournal
+
+
+def span(text, label, start, end, mapped=None):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': mapped or {}}
+
+
+ROWS = {
+    0: [span("苹果", "品牌", 0, 2, {"品牌": ["苹果"]}), span("手机", "品类", 2, 4)],
+    2: [{**span("华为", "品牌", 0, 2), "note": "非标准字段原样保存"}],
+    3: [],
+}
+
+
+def test_round_trip_and_vocab_seeded_terms(tmp_path):
+    store = ColumnarAnnotationStore.from_dict(copy.deepcopy(ROWS), {"品牌": ["华为", "苹果"]})
+    assert store.n_rows == 4
+    assert store.get(0) == ROWS[0]
+    assert store.get(1) == []
+    assert store.get(2) == ROWS[2]
+    assert store.span_count(0) == 2
+    # 映射取值表按词表顺序预置
+    assert store.terms.strings == ["华为", "苹果"]
+    clean = ColumnarAnnotationStore.from_dict({0: ROWS[0]})
+    clean.save_npz(str(tmp_path / "a.npz"))
+    assert ColumnarAnnotationStore.load_npz(str(tmp_path / "a.npz")).get(0) == ROWS[0]
+
+
+def test_empty_mapping_categories_round_trip(tmp_path):
+    # 空类别也要原样读回，否则 merge_row 和撤销的逐键比较会把未改动的行当成已修改
+    row = [span("苹果", "品牌", 0, 2, {"品牌": [], "品类": ["手机"]}), span("手机", "品类", 2, 4, {"品类": []})]
+    store = ColumnarAnnotationStore.from_dict({0: copy.deepcopy(row), 1: [span("华为", "品牌", 0, 2)]})
+    assert store.get(0) == row
+    assert store.get(1) == [span("华为", "品牌", 0, 2)]
+    store.save_npz(str(tmp_path / "a.npz"))
+    assert ColumnarAnnotationStore.load_npz(str(tmp_path / "a.npz")).get(0) == row
+
+
+def test_compact_folds_overlay_back(monkeypatch):
+    monkeypatch.setattr(columnar, "COMPACT_MIN_ROWS", 1)
+    store = ColumnarAnnotationStore.from_dict(copy.deepcopy(ROWS))
+    store[1] = [span("米", "品牌", 1, 2)]
+    assert not store.needs_compaction()
+    store[3] = [span("华为", "品牌", 0, 2)]
+    assert store.needs_compaction()
+    store.compact()
+    assert store._overlay == {}
+    assert dict(store.items()) == {0: ROWS[0], 1: [span("米", "品牌", 1, 2)], 2: ROWS[2],
+                                   3: [span("华为", "品牌", 0, 2)]}
+
+
+def test_manager_loads_without_keeping_source_rows_and_compacts_on_save(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, "COMPACT_MIN_ROWS", 1)
+    path = str(tmp_path / "p_annotations.json")
+    AnnotationJournal(path).reset(copy.deepcopy(ROWS))
+    manager = AnnotationManager(columnar=True)
+    manager.set_vocab({"品牌": ["华为", "苹果"]})
+    manager.attach_journal(AnnotationJournal(path))
+    manager.set_row_count(6)
+    assert isinstance(manager.annotations, ColumnarAnnotationStore)
+    assert manager.annotations.terms.strings[:2] == ["华为", "苹果"]
+    assert manager.stats.total == 3
+    assert manager.next_row(0, label="品牌") == 2
+    for idx in (1, 4, 5):
+        manager.add_annotation(idx, span("苹果", "品牌", 0, 2))
+    manager.save()
+    assert manager.annotations._overlay == {}
+    assert manager.get_annotations(5) == [span("苹果", "品牌", 0, 2)]
+    reloaded = AnnotationManager(columnar=True)
+    reloaded.attach_journal(AnnotationJournal(path))
+    assert dict(reloaded.annotations.items()) == dict(manager.annotations.items())
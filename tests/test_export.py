@@ -0,0 +1,65 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from utils.annotation import AnnotationManager
+from utils.export import export_to_file
+
+
+def span(text, label, start, end, mapped=None):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': mapped or {}}
+
+
+@pytest.fixture
+def project():
+    df = pd.DataFrame({"query": ["苹果 手机", "华为电脑", "小米"], "id": [1.5, None, 3.0], "note": ["a", None, "c"]})
+    manager = AnnotationManager()
+    manager.set_row_count(len(df))
+    manager.add_annotation(0, span("苹果", "品牌", 0, 2, {"品牌": ["苹果"]}))
+    manager.add_annotation(0, span("手机", "品类", 3, 5))
+    manager.add_annotation(1, span("华为电脑", "品类", 0, 4))
+    return df, manager
+
+
+def test_csv_round_trip_and_empty_cells_for_missing_values(tmp_path, project):
+    df, manager = project
+    path = export_to_file(str(tmp_path / "out.csv"), "csv", df, manager, chunk_size=2)
+    text = open(path, encoding="utf-8-sig").read()
+    # 与 DataFrame.to_csv 一致：缺失值为空单元格，不是 "nan"
+    assert "nan" not in text
+    assert text.splitlines()[2].startswith("华为电脑,,,")
+    loaded = pd.read_csv(io.StringIO(text))
+    assert loaded["query"].tolist() == df["query"].tolist()
+    assert loaded["id"].tolist()[::2] == [1.5, 3.0] and pd.isna(loaded["id"][1])
+    assert [json.loads(a) for a in loaded["annotations"]] == [manager.get_annotations(i) for i in range(3)]
+    expected = df.assign(annotations=[json.dumps(manager.get_annotations(i), ensure_ascii=False) for i in range(3)])
+    assert text == expected.to_csv(index=False, lineterminator="\n")
+
+
+def test_jsonl_round_trip(tmp_path, project):
+    df, manager = project
+    path = export_to_file(str(tmp_path / "out.jsonl"), "jsonl", df, manager, chunk_size=2)
+    records = [json.loads(line) for line in open(path, encoding="utf-8")]
+    assert [r["query"] for r in records] == df["query"].tolist()
+    assert records[1]["id"] is None and records[1]["note"] is None
+    assert [r["annotations"] for r in records] == [manager.get_annotations(i) for i in range(3)]
+
+
+def test_conll_bio_tags(tmp_path, project):
+    df, manager = project
+    path = export_to_file(str(tmp_path / "out.conll"), "conll", df, manager)
+    sentences = [[line.split("\t") for line in block.splitlines()]
+                 for block in open(path, encoding="utf-8").read().split("\n\n") if block]
+    # 空白字符不输出，句子之间空行分隔
+    assert sentences[0] == [["苹", "B-品牌"], ["果", "I-品牌"], ["手", "B-品类"], ["机", "I-品类"]]
+    assert [tag for _, tag in sentences[1]] == ["B-品类", "I-品类", "I-品类", "I-品类"]
+    assert sentences[2] == [["小", "O"], ["米", "O"]]
+
+
+def test_unknown_format_leaves_no_file(tmp_path, project):
+    df, manager = project
+    with pytest.raises(ValueError):
+        export_to_file(str(tmp_path / "out.xml"), "xml", df, manager)
+    assert list(tmp_path.iterdir()) == []
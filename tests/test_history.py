@@ -0,0 +1,95 @@
+from utils.annotation import AnnotationManager
+from utils.storage import AnnotationJournal
+
+
+def span(text, label, start, end, mapped=None):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': mapped or {}}
+
+
+def suggestion(text, label, start, end):
+    return {**span(text, label, start, end, {label: [text]}), 'source': 'auto', 'score': 1.0}
+
+
+APPLE = span("苹果", "品牌", 0, 2)
+PHONE = span("手机", "品类", 2, 4)
+
+
+def new_manager(n_rows=3):
+    manager = AnnotationManager()
+    manager.initialize_annotations(n_rows)
+    return manager
+
+
+def test_undo_redo_restores_rows_and_stats():
+    manager = new_manager()
+    manager.add_annotation(0, APPLE)
+    manager.add_annotation(0, PHONE)
+    manager.remove_annotation(0, 0)
+    assert manager.annotations[0] == [PHONE]
+    assert manager.history.undo_label == "删除标注"
+    assert manager.undo() == [0]
+    assert manager.annotations[0] == [APPLE, PHONE]
+    assert manager.stats.total == 2
+    manager.undo()
+    manager.undo()
+    assert manager.annotations[0] == []
+    assert manager.undo() == []
+    manager.redo()
+    assert manager.annotations[0] == [APPLE]
+    # 新的修改清空重做栈
+    manager.add_annotation(1, PHONE)
+    assert manager.redo() == []
+
+
+def test_propagation_is_undone_in_one_step():
+    manager = new_manager()
+    for idx in range(3):
+        manager.add_annotation(idx, APPLE)
+    assert manager.propagate_mapping("苹果", "品牌", {"品牌": ["苹果"]}) == 3
+    manager.undo()
+    assert all(manager.annotations[idx] == [APPLE] for idx in range(3))
+
+
+def test_undo_accept_suggestion_restores_the_suggestion():
+    manager = new_manager()
+    pending = [suggestion("苹果", "品牌", 0, 2), suggestion("手机", "品类", 2, 4)]
+    manager.merge_suggestions({0: pending})
+    manager.accept_suggestion(0, 0)
+    assert manager.get_suggestions(0) == pending[1:]
+    manager.undo()
+    assert manager.annotations[0] == []
+    assert manager.get_suggestions(0) == pending
+    manager.redo()
+    assert len(manager.annotations[0]) == 1
+    assert manager.get_suggestions(0) == pending[1:]
+
+
+def test_undo_accept_all_is_one_operation():
+    manager = new_manager()
+    pending = [suggestion("苹果", "品牌", 0, 2), suggestion("手机", "品类", 2, 4)]
+    manager.merge_suggestions({0: pending})
+    assert manager.accept_all_suggestions(0) == 2
+    assert manager.get_suggestions(0) == []
+    assert len(manager.history) == 1
+    manager.undo()
+    assert manager.annotations[0] == []
+    assert manager.get_suggestions(0) == pending
+
+
+def test_undo_keeps_other_sessions_changes(tmp_path):
+    path = str(tmp_path / "p_annotations.json")
+    a, b = AnnotationManager(), AnnotationManager()
+    for manager in (a, b):
+        manager.attach_journal(AnnotationJournal(path))
+        manager.set_row_count(3)
+    a.add_annotation(0, APPLE)
+    a.save()
+    b.add_annotation(0, span("红色", "颜色", 5, 7))
+    b.save()
+    a.sync()
+    # 撤销只去掉自己添加的 span，保留对方保存的修改
+    a.undo()
+    assert a.annotations[0] == [span("红色", "颜色", 5, 7)]
+    a.save()
+    b.sync()
+    assert b.annotations[0] == [span("红色", "颜色", 5, 7)]
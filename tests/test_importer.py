@@ -0,0 +1,87 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from utils.importer import (FileProjectWriter, SQLiteProjectWriter, detect_format, import_stream, iter_json_array,
+                            parse_annotation_values)
+from utils.project import read_dataset
+from utils.sqlite_store import SQLiteProject
+from utils.storage import AnnotationJournal
+
+APPLE = {'text': '苹果', 'label': '品牌', 'start': 0, 'end': 2, 'mapped_value': {}}
+
+
+def test_detect_format():
+    assert detect_format("a.CSV") == "csv"
+    assert detect_format("a.ndjson") == "jsonl"
+    with pytest.raises(ValueError):
+        detect_format("a.txt")
+
+
+def test_parse_annotation_values_reports_malformed_cells():
+    parsed, errors = parse_annotation_values([json.dumps([APPLE]), "[{bad", "", None, [APPLE], "{}"])
+    assert parsed == [[APPLE], [], [], [], [APPLE], []]
+    assert errors == [1]
+
+
+def test_json_array_items_span_buffer_boundaries():
+    items = [{"query": f"苹果手机{i}", "n": 12345678 + i} for i in range(50)]
+    data = io.BytesIO(json.dumps(items, ensure_ascii=False).encode("utf-8"))
+    assert list(iter_json_array(data, buffer_size=7)) == items
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.BytesIO(b'{"query": "x"}')))
+
+
+def csv_source(n_rows):
+    df = pd.DataFrame({
+        "query": [f"苹果手机{i}" if i != 3 else None for i in range(n_rows)],
+        "id": range(n_rows),
+        "annotations": [json.dumps([APPLE], ensure_ascii=False) if i % 2 == 0 else ("[{bad" if i == 5 else "")
+                        for i in range(n_rows)],
+    })
+    return io.BytesIO(df.to_csv(index=False).encode("utf-8-sig"))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_csv_import_into_file_project_in_chunks(tmp_path, workers):
+    seen = []
+    report = import_stream(csv_source(10), "csv", FileProjectWriter(str(tmp_path), "p"), chunk_size=3,
+                           workers=workers, progress=lambda rows, position, total: seen.append(rows))
+    assert report["rows"] == 10
+    assert report["annotated_rows"] == 5
+    assert report["annotation_errors"] == [5]
+    assert report["empty_queries"] == [3]
+    assert seen == [3, 6, 9, 10]
+    df = read_dataset(str(tmp_path / "p.csv"))
+    assert list(df.columns) == ["query", "id"]
+    assert df["id"].tolist() == list(range(10))
+    assert AnnotationJournal(str(tmp_path / "p_annotations.json")).load() == {i: [APPLE] for i in range(0, 10, 2)}
+
+
+def test_jsonl_import_into_sqlite_project(tmp_path):
+    lines = [{"query": "苹果手机", "annotations": [APPLE]}, {"query": "华为电脑", "annotations": "not json"}]
+    data = io.BytesIO("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in lines).encode("utf-8"))
+    report = import_stream(data, "jsonl", SQLiteProjectWriter(str(tmp_path / "p.db")), chunk_size=1)
+    assert report["annotation_errors"] == [1]
+    project = SQLiteProject(str(tmp_path / "p.db"))
+    assert project.count_queries() == 2
+    assert project.load() == {0: [APPLE]}
+
+
+def test_xlsx_import(tmp_path):
+    pytest.importorskip("openpyxl")
+    path = tmp_path / "src.xlsx"
+    pd.DataFrame({"query": ["苹果手机", "华为电脑", "小米"], "id": [1, 2, 3]}).to_excel(path, index=False)
+    with open(path, "rb") as fp:
+        report = import_stream(fp, "xlsx", FileProjectWriter(str(tmp_path), "p"), chunk_size=2)
+    assert report["rows"] == 3
+    assert read_dataset(str(tmp_path / "p.csv"))["query"].tolist() == ["苹果手机", "华为电脑", "小米"]
+
+
+def test_missing_query_column_and_empty_file_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="query"):
+        import_stream(io.BytesIO("text\n苹果\n".encode("utf-8")), "csv", FileProjectWriter(str(tmp_path), "a"))
+    with pytest.raises(ValueError, match="为空"):
+        import_stream(io.BytesIO(b"[]"), "json", FileProjectWriter(str(tmp_path), "b"))
@@ -0,0 +1,88 @@
+from utils.annotation import AnnotationManager
+from utils.lint import LintReport, RowLinter, lint_rows, run_lint
+from utils.storage import AnnotationJournal
+
+VOCAB = {"品牌": ["苹果", "华为"], "品类": ["手机"]}
+LABEL_MAP = {"品牌": ["品牌"], "品类": ["品类"]}
+
+
+def span(text, label, start, end, mapped=None):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': mapped or {}}
+
+
+def checks(issues):
+    return [(issue["check"], issue["span"]) for issue in issues]
+
+
+def test_row_checks():
+    linter = RowLinter(VOCAB, LABEL_MAP)
+    assert linter.check("苹果手机", [span("苹果", "品牌", 0, 2, {"品牌": ["苹果"]})]) == []
+    issues = linter.check("苹果手机", [
+        span("苹果", "品牌", 0, 2, {"品类": ["手机"], "品牌": ["ＡＰＰＬＥ"]}),
+        span("果手", "品类", 1, 3),
+        span("机器", "品类", 3, 9),
+        span("手机", "品类", 2, 3),
+    ])
+    assert checks(issues) == [
+        ("disallowed_category", 0), ("unknown_vocab", 0),
+        ("overlap", 1),
+        ("bad_offsets", 2),
+        ("text_mismatch", 3), ("overlap", 3),
+    ]
+    assert {issue["severity"] for issue in issues if issue["check"] == "unknown_vocab"} == {"warning"}
+
+
+def test_vocab_comparison_ignores_width_and_case():
+    linter = RowLinter({"品牌": ["iPhone"]}, {"品牌": ["品牌"]})
+    assert linter.check("ＩＰＨＯＮＥ", [span("ＩＰＨＯＮＥ", "品牌", 0, 6, {"品牌": ["ＩＰＨＯＮＥ"]})]) == []
+
+
+def test_process_pool_matches_inline():
+    items = [(i, "苹果手机", [span("苹果", "品牌", 0, 2, {"品牌": ["香蕉"]})]) for i in range(30)]
+    inline = lint_rows(items, VOCAB, LABEL_MAP)
+    assert lint_rows(items, VOCAB, LABEL_MAP, workers=2, chunk_size=10) == inline
+    assert sorted(inline) == list(range(30))
+
+
+def project(queries):
+    manager = AnnotationManager()
+    manager.initialize_annotations(len(queries))
+    return manager
+
+
+def test_incremental_run_rechecks_only_changed_rows(tmp_path):
+    queries = ["苹果手机", "华为手机", "苹果电脑"]
+    manager = AnnotationManager()
+    manager.attach_journal(AnnotationJournal(str(tmp_path / "p_annotations.json")))
+    manager.set_row_count(len(queries))
+    manager.add_annotation(0, span("苹果", "品牌", 0, 2, {"品牌": ["苹果"]}))
+    manager.add_annotation(1, span("华为", "品牌", 0, 2, {"品牌": ["小米"]}))
+    manager.save()
+    report = run_lint(queries, manager, VOCAB, LABEL_MAP, "ctx")
+    assert report.checked == 2
+    assert report.rows().tolist() == [1]
+    # 保存状态后只重查之后修改的行；未保存的修改同样视为变化
+    report = LintReport.from_json(report.to_json())
+    manager.add_annotation(2, span("苹果", "品类", 0, 2))
+    again = run_lint(queries, manager, VOCAB, LABEL_MAP, "ctx", previous=report)
+    assert again.checked == 1
+    assert again.rows().tolist() == [0, 1, 2]
+    # 跨行问题：苹果在第 0 行是品牌、第 2 行是品类，次数并列时都标出
+    assert [issue["check"] for issue in again.issues(2)] == ["inconsistent_label"]
+    assert again.rows("inconsistent_label").tolist() == [0, 2]
+    # context 变化（词表、映射或数据）时全量重查
+    assert run_lint(queries, manager, VOCAB, LABEL_MAP, "other", previous=again).checked == 3
+
+
+def test_report_counts_and_round_trip():
+    queries = ["苹果手机"]
+    manager = project(queries)
+    manager.add_annotation(0, span("苹果", "品牌", 0, 2, {"品类": ["手机"]}))
+    report = run_lint(queries, manager, VOCAB, LABEL_MAP, "ctx")
+    assert report.counts() == {"disallowed_category": 1}
+    assert report.severity_counts() == {"warning": 0, "error": 1}
+    assert [issue["row"] for issue in report.iter_issues()] == [0]
+    restored = LintReport.from_json(report.to_json())
+    assert restored.row_issues == report.row_issues
+    assert restored.versions == report.versions
+    assert LintReport.from_json({"format": -1}) is None
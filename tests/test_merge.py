@@ -0,0 +1,129 @@
+import sqlite3
+
+import pandas as pd
+
+from utils.annotation import AnnotationManager, merge_row
+from utils.sqlite_store import SQLiteProject
+from utils.storage import AnnotationJournal
+
+
+def span(text, label, start, end):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': {}}
+
+
+APPLE = span("苹果", "品牌", 0, 2)
+PHONE = span("手机", "品类", 2, 4)
+APPLE_PHONE = span("苹果手机", "品类", 0, 4)
+RED = span("红色", "颜色", 5, 7)
+
+
+def test_merge_row_without_base_keeps_local():
+    assert merge_row(None, [APPLE], [PHONE]) == ([APPLE], [])
+
+
+def test_merge_row_combines_disjoint_additions():
+    merged, dropped = merge_row([], [APPLE], [RED])
+    assert merged == [APPLE, RED]
+    assert dropped == []
+
+
+def test_merge_row_applies_local_removal_to_remote():
+    merged, dropped = merge_row([APPLE, PHONE], [PHONE], [APPLE, PHONE, RED])
+    assert merged == [PHONE, RED]
+    assert dropped == []
+
+
+def test_merge_row_drops_local_addition_overlapping_remote():
+    # 远端已保存的版本优先，与之重叠的本地新增返回给调用方
+    merged, dropped = merge_row([], [APPLE_PHONE], [APPLE])
+    assert merged == [APPLE]
+    assert dropped == [APPLE_PHONE]
+
+
+def test_merge_row_same_addition_on_both_sides_is_not_duplicated():
+    merged, dropped = merge_row([], [APPLE], [APPLE])
+    assert merged == [APPLE]
+    assert dropped == []
+
+
+def open_manager(tmp_path):
+    manager = AnnotationManager()
+    manager.attach_journal(AnnotationJournal(str(tmp_path / "p_annotations.json")))
+    manager.set_row_count(5)
+    return manager
+
+
+def test_concurrent_saves_merge_per_row(tmp_path):
+    a, b = open_manager(tmp_path), open_manager(tmp_path)
+    a.add_annotation(0, APPLE)
+    b.add_annotation(0, RED)
+    b.add_annotation(1, PHONE)
+    a.save()
+    b.save()
+    assert b.annotations[0] == [APPLE, RED]
+    assert b.conflicts == {}
+    assert a.sync() == [0, 1]
+    assert a.annotations[0] == [APPLE, RED]
+    assert a.annotations[1] == [PHONE]
+
+
+def test_overlapping_concurrent_edit_is_reported_as_conflict(tmp_path):
+    a, b = open_manager(tmp_path), open_manager(tmp_path)
+    a.add_annotation(0, APPLE)
+    b.add_annotation(0, APPLE_PHONE)
+    a.save()
+    b.save()
+    assert b.annotations[0] == [APPLE]
+    assert b.conflicts == {0: [APPLE_PHONE]}
+    reloaded = open_manager(tmp_path)
+    assert reloaded.annotations[0] == [APPLE]
+
+
+def test_sync_replaces_clean_rows(tmp_path):
+    a, b = open_manager(tmp_path), open_manager(tmp_path)
+    a.add_annotation(0, APPLE)
+    a.save()
+    b.sync()
+    a.remove_annotation(0, 0)
+    a.save()
+    assert b.sync() == [0]
+    assert b.annotations[0] == []
+    assert b.stats.total == 0
+
+
+def test_bulk_change_from_another_session_is_merged_on_save(tmp_path):
+    n_rows = 1500
+    SQLiteProject(str(tmp_path / "p.db")).import_dataframe(pd.DataFrame({"query": ["苹果手机 红色"] * n_rows}))
+    a = AnnotationManager()
+    a.attach_journal(SQLiteProject(str(tmp_path / "p.db")))
+    a.set_row_count(n_rows)
+    a.journal._conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    a.add_annotation(3, RED)
+    # 另一个会话整体覆盖，所有行升版本
+    SQLiteProject(str(tmp_path / "p.db")).reset({idx: [APPLE] for idx in range(n_rows)})
+    a.save()
+    assert a.annotations[3] == [APPLE, RED]
+    assert a.annotations[n_rows - 1] == [APPLE]
+    assert a.stats.total == n_rows + 1
+    a.add_annotation(4, PHONE)
+    a.save()
+    assert SQLiteProject(str(tmp_path / "p.db")).load_rows([3, 4]) == {3: [APPLE, RED], 4: [APPLE, PHONE]}
+
+
+def test_failed_incremental_sync_does_not_block_later_saves(tmp_path, monkeypatch):
+    a, b = open_manager(tmp_path), open_manager(tmp_path)
+    b.add_annotation(1, PHONE)
+    b.save()
+
+    def broken(cursor):
+        raise OSError("disk hiccup")
+
+    monkeypatch.setattr(a.journal, "changes_since", broken)
+    a.add_annotation(0, APPLE)
+    a.save()
+    assert a.annotations[1] == [PHONE]
+    monkeypatch.undo()
+    a.add_annotation(2, RED)
+    a.save()
+    reloaded = open_manager(tmp_path)
+    assert {idx: spans for idx, spans in reloaded.annotations.items() if spans} == {0: [APPLE], 1: [PHONE], 2: [RED]}
@@ -0,0 +1,71 @@
+import os
+import threading
+
+import pytest
+
+from utils.metrics import PROM_FILE, TRACE_FILE, Recorder, summarize
+
+
+def test_rerun_records_sections_and_counters(tmp_path):
+    recorder = Recorder(str(tmp_path))
+
+    @recorder.timed()
+    def load():
+        recorder.count("rows", 3)
+
+    with recorder.rerun("page") as record:
+        load()
+        load()
+        with recorder.section("render"):
+            pass
+    assert record["sections"]["load"]["calls"] == 2
+    assert record["counters"] == {"rows": 6}
+    # 重跑之外的调用只计入进程级汇总
+    load()
+    assert recorder.sections["load"][0] == 3
+    assert recorder.counters["rows"] == 9
+    reruns, per_section = summarize(str(tmp_path / TRACE_FILE))
+    assert len(reruns) == 1 and sorted(per_section) == ["load", "render"]
+    prom = (tmp_path / PROM_FILE).read_text(encoding="utf-8")
+    assert "ner_reruns_total 1\n" in prom
+    assert 'ner_section_calls_total{section="load"} 2' in prom
+    assert 'ner_events_total{name="rows"} 6' in prom
+    assert oct(os.stat(tmp_path / PROM_FILE).st_mode & 0o777) == oct(0o644)
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+
+
+def test_rerun_interrupted_by_exception_is_still_recorded(tmp_path):
+    recorder = Recorder(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with recorder.rerun():
+            raise RuntimeError("rerun")
+    assert recorder.reruns == 1
+    assert recorder.current() is None
+
+
+def test_concurrent_reruns_write_one_trace_line_each(tmp_path):
+    recorder = Recorder(str(tmp_path))
+
+    def session():
+        for _ in range(20):
+            with recorder.rerun():
+                recorder.count("n")
+
+    threads = [threading.Thread(target=session) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    reruns, _ = summarize(str(tmp_path / TRACE_FILE))
+    assert len(reruns) == recorder.reruns == 80
+    assert recorder.counters["n"] == 80
+
+
+def test_export_failure_only_warns(tmp_path, capsys):
+    blocker = tmp_path / "file"
+    blocker.write_text("", encoding="utf-8")
+    recorder = Recorder(str(blocker / "metrics"))
+    with recorder.rerun():
+        pass
+    assert recorder.reruns == 1
+    assert "[WARN]" in capsys.readouterr().out
@@ -0,0 +1,30 @@
+from utils.preannotate import PreAnnotator, preannotate_queries
+
+VOCAB = {"品牌": ["苹果", "Apple"], "品类": ["苹果手机", "手机"]}
+LABEL_MAP = {"品牌": ["品牌"], "品类": ["品类"]}
+
+
+def test_longest_match_and_word_boundaries():
+    annotator = PreAnnotator(VOCAB, LABEL_MAP)
+    spans = annotator.annotate("买苹果手机和apple手机，不要applepie")
+    assert [(s['text'], s['label'], s['start']) for s in spans] == [
+        ("苹果手机", "品类", 1), ("apple", "品牌", 6), ("手机", "品类", 11)]
+    assert spans[1]['mapped_value'] == {"品牌": ["Apple"]}
+    assert all(s['source'] == 'auto' for s in spans)
+
+
+def test_process_pool_matches_inline():
+    queries = [f"苹果{i}手机" for i in range(5000)] + ["苹果1手机"] + [None, ""]
+    inline = preannotate_queries(queries, VOCAB, LABEL_MAP)
+    pooled = preannotate_queries(queries, VOCAB, LABEL_MAP, workers=2, chunk_size=500)
+    assert pooled == inline
+    assert len(inline) == 5001
+
+
+def test_scalar_vocab_value_is_a_single_term():
+    # 词表中 "ai": "ai" 这样的值是单个词条，不是逐字符的 'a'、'i'
+    annotator = PreAnnotator({"ai": "ai", "品牌": "苹果"}, {"ai": ["ai"], "品牌": ["品牌"]})
+    spans = annotator.annotate("苹果ai手机，不是aim")
+    assert [(s['text'], s['label'], s['mapped_value']) for s in spans] == [
+        ("苹果", "品牌", {"品牌": ["苹果"]}), ("ai", "ai", {"ai": ["ai"]})]
+    assert len(annotator) == 2
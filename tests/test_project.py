@@ -0,0 +1,66 @@
+import json
+import os
+
+import pandas as pd
+
+from utils.project import file_signature, list_projects, project_paths, project_signature
+from utils.service import ProjectHandle
+
+
+def write_project(tmp_path):
+    pd.DataFrame({"query": ["苹果手机", "华为电脑"]}).to_csv(tmp_path / "p.csv", index=False)
+    (tmp_path / "p_vocab.json").write_text(json.dumps({"品牌": ["苹果"]}, ensure_ascii=False), encoding="utf-8")
+    (tmp_path / "p_label_map.json").write_text("{}", encoding="utf-8")
+
+
+def test_project_listing_and_paths(tmp_path):
+    write_project(tmp_path)
+    (tmp_path / "q.json").write_text("[]", encoding="utf-8")
+    assert list_projects(str(tmp_path)) == ["p", "q"]
+    paths = project_paths(str(tmp_path), "p")
+    assert paths["data"].endswith("p.csv")
+    assert paths["annotations"][1].endswith("p_annotations.journal")
+    assert project_paths(str(tmp_path), "missing")["data"] is None
+
+
+def test_signature_changes_only_with_the_file(tmp_path):
+    write_project(tmp_path)
+    paths = project_paths(str(tmp_path), "p")
+    before = project_signature(paths)
+    assert before == project_signature(paths)
+    assert before["annotations"] == (None, None, None)
+    assert file_signature(str(tmp_path / "nope.json")) is None
+    vocab = paths["vocab"]
+    stat = os.stat(vocab)
+    with open(vocab, "w", encoding="utf-8") as f:
+        json.dump({"品牌": ["苹果", "华为"]}, f, ensure_ascii=False)
+    os.utime(vocab, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    after = project_signature(paths)
+    assert [kind for kind in before if before[kind] != after[kind]] == ["vocab"]
+
+
+def test_unchanged_project_is_not_reparsed(tmp_path):
+    write_project(tmp_path)
+
+    class CountingHandle(ProjectHandle):
+        def __init__(self, *args, **kwargs):
+            self.reads = []
+            super().__init__(*args, **kwargs)
+
+        def _read_dataset(self, path, mtime_ns):
+            self.reads.append(path)
+            return super()._read_dataset(path, mtime_ns)
+
+        def _read_json(self, path, mtime_ns):
+            self.reads.append(path)
+            return super()._read_json(path, mtime_ns)
+
+    handle = CountingHandle(str(tmp_path), "p")
+    handle.refresh()
+    loaded = list(handle.reads)
+    assert handle.paths["data"] in loaded and handle.paths["label_map"] in loaded
+    df = handle.df
+    for _ in range(3):
+        assert handle.refresh() == []
+    assert handle.reads == loaded
+    assert handle.df is df
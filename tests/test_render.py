@@ -0,0 +1,49 @@
+from utils.mapping import VocabularyMapper
+from utils.render import RowMemo, annotated_html, mapping_options, span_key, spans_table
+
+
+def span(text, label, start, end, mapped=None):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': mapped or {}}
+
+
+def test_row_memo_reuses_values_and_evicts_least_recent():
+    memo, calls = RowMemo(maxsize=2), []
+
+    def compute(value):
+        calls.append(value)
+        return value
+
+    assert memo.get((0, 1), lambda: compute("a")) == "a"
+    assert memo.get((0, 1), lambda: compute("x")) == "a"
+    memo.get((1, 1), lambda: compute("b"))
+    memo.get((0, 1), lambda: compute("x"))
+    # (1, 1) 最久未用，被淘汰；行修订号变化时重新计算
+    memo.get((2, 1), lambda: compute("c"))
+    assert memo.get((1, 1), lambda: compute("b2")) == "b2"
+    assert memo.get((0, 2), lambda: compute("a2")) == "a2"
+    assert calls == ["a", "b", "c", "b2", "a2"]
+
+
+def test_annotated_html_marks_spans_and_escapes_text():
+    spans = [span("<苹果>", "品牌", 0, 4), span("手机", "未知标签", 5, 7)]
+    out = annotated_html("<苹果> 手机&壳", span_key(spans))
+    assert out.startswith("<mark style='background-color: #ff6b6b;")
+    assert "title='品牌'>&lt;苹果&gt;</mark> <mark" in out
+    assert "background-color: #ffe66d" in out
+    assert out.endswith("</mark>&amp;壳")
+    assert annotated_html("a<b", ()) == "a&lt;b"
+
+
+def test_spans_table_has_one_row_per_span():
+    table = spans_table([span("苹果", "品牌", 0, 2, {"品牌": ["Apple"], "系列": []}), span("a|b", "型号", 3, 6)])
+    lines = table.split("\n")
+    assert len(lines) == 4
+    assert lines[2] == "| 1 | 苹果 | 品牌 | 0-2 | 品牌: Apple |"
+    assert lines[3] == "| 2 | a\\|b | 型号 | 3-6 | — |"
+
+
+def test_mapping_options_keep_selected_values():
+    mapper = VocabularyMapper()
+    mapper.load_vocabulary({"品牌": ["华为", "苹果", "小米"]})
+    assert mapping_options(mapper, "苹果手机", "品牌", ["小米"]) == ["苹果", "小米"]
+    assert mapping_options(mapper, "苹果手机", "品牌", [], search="华") == ["华为"]
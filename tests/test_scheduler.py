@@ -0,0 +1,74 @@
+import numpy as np
+
+from utils.annotation import AnnotationManager
+from utils.scheduler import LeaseScheduler, row_priorities
+
+
+def span(text, label, start, end):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': {'品牌': [text]}}
+
+
+def setup(tmp_path, n_rows=10, **kwargs):
+    manager = AnnotationManager()
+    manager.initialize_annotations(n_rows)
+    scheduler = LeaseScheduler(str(tmp_path / "p_leases.json"), n_rows, batch_size=4, lease_seconds=60, **kwargs)
+    return manager, scheduler
+
+
+def test_annotators_get_different_batches(tmp_path):
+    manager, scheduler = setup(tmp_path)
+    alice = scheduler.acquire("alice", manager, now=0)
+    bob = scheduler.acquire("bob", manager, now=0)
+    assert (alice["start"], alice["end"]) == (0, 4)
+    assert (bob["start"], bob["end"]) == (4, 8)
+    # 已持有未完成批次时再次领取返回同一批次并续期
+    again = scheduler.acquire("alice", manager, now=30)
+    assert again["batch"] == alice["batch"]
+    assert again["expires"] == 90
+
+
+def test_expired_lease_is_reassigned(tmp_path):
+    manager, scheduler = setup(tmp_path)
+    alice = scheduler.acquire("alice", manager, now=0)
+    scheduler.acquire("bob", manager, now=30)
+    scheduler.acquire("carol", manager, now=30)
+    assert scheduler.acquire("dave", manager, now=30) is None
+    # alice 的租约在 60 秒后过期，批次交给下一个领取的人
+    dave = scheduler.acquire("dave", manager, now=61)
+    assert dave["batch"] == alice["batch"]
+    assert scheduler.renew(alice, now=62) is None
+    assert {lease["owner"] for lease in scheduler.active_leases(now=62)} == {"bob", "carol", "dave"}
+
+
+def test_renew_after_expiry_succeeds_if_nobody_took_the_batch(tmp_path):
+    manager, scheduler = setup(tmp_path)
+    alice = scheduler.acquire("alice", manager, now=0)
+    renewed = scheduler.renew(alice, now=100)
+    assert renewed["batch"] == alice["batch"]
+    assert renewed["expires"] == 160
+
+
+def test_finished_batches_are_skipped_and_returned(tmp_path):
+    manager, scheduler = setup(tmp_path)
+    alice = scheduler.acquire("alice", manager, now=0)
+    for idx in range(alice["start"], alice["end"]):
+        manager.add_annotation(idx, span("苹果", "品牌", 0, 2))
+    nxt = scheduler.acquire("alice", manager, now=10)
+    assert nxt["batch"] != alice["batch"]
+    assert scheduler.progress(manager) == (1, 3)
+
+
+def test_release_frees_the_batch(tmp_path):
+    manager, scheduler = setup(tmp_path)
+    alice = scheduler.acquire("alice", manager, now=0)
+    scheduler.release(alice)
+    assert scheduler.acquire("bob", manager, now=1)["batch"] == alice["batch"]
+
+
+def test_batches_without_suggestions_come_first(tmp_path):
+    # 第 0、1 批全部有高置信度预标注，第 2 批没有词表命中
+    suggestions = {idx: [{'score': 1.0}] for idx in range(8)}
+    priorities = row_priorities(10, suggestions)
+    assert np.array_equal(priorities[:8], np.zeros(8)) and priorities[8:].tolist() == [1.0, 1.0]
+    manager, scheduler = setup(tmp_path, priorities=priorities)
+    assert scheduler.acquire("alice", manager, now=0)["batch"] == 2
@@ -0,0 +1,80 @@
+import pytest
+
+from utils.annotation import AnnotationManager
+from utils.search_index import FilteredView, QueryIndex, SearchIndex, SearchQuery
+from utils.stats import STATUS_DONE
+
+QUERIES = ["苹果手机 RTX 4060", "华为电脑", "ＲＴＸ4060 笔记本", "小米手机", "苹果电脑", None]
+
+
+def span(text, label, start, end, mapped=None):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': mapped or {}}
+
+
+def test_parser_builds_and_or_not_and_field_nodes():
+    assert SearchQuery("").tree is None
+    assert SearchQuery("苹果 手机").tree == ("and", [("query", "苹果"), ("query", "手机")])
+    assert SearchQuery('"RTX 4060" | 华为').tree == ("or", [("query", "RTX 4060"), ("query", "华为")])
+    assert SearchQuery("NOT label:品牌 -status:完成").tree == (
+        "and", [("not", ("label", "品牌")), ("not", ("status", STATUS_DONE))])
+    assert SearchQuery("(a OR b) AND 品牌=华为").tree == (
+        "and", [("or", [("query", "a"), ("query", "b")]), ("map", ("品牌", None, "华为"))])
+    assert SearchQuery("map:brand=华为").tree == ("map", (None, "brand", "华为"))
+    assert SearchQuery("issue:错误").tree == ("issue", "error")
+    for bad in ("(苹果", "苹果 )", "status:unknown", "cluster:x", "NOT"):
+        with pytest.raises(ValueError):
+            SearchQuery(bad)
+
+
+def test_query_index_matches_substrings_after_normalization():
+    index = QueryIndex(QUERIES)
+    assert index.search("rtx4060").tolist() == [2]
+    assert index.search("RTX").tolist() == [0, 2]
+    assert index.search("手").tolist() == [0, 3]
+    assert index.search("苹果电脑").tolist() == [4]
+    assert index.search("戴尔").tolist() == []
+    assert len(index.search("")) == len(QUERIES)
+
+
+@pytest.fixture
+def search():
+    manager = AnnotationManager()
+    manager.set_row_count(len(QUERIES))
+    manager.add_annotation(0, span("苹果", "品牌", 0, 2, {"品牌": ["苹果"]}))
+    manager.add_annotation(1, span("华为", "品牌", 0, 2))
+    manager.add_annotation(4, span("苹果", "品牌", 0, 2, {"品牌": ["苹果"]}))
+    return SearchIndex(QueryIndex(QUERIES), manager)
+
+
+def test_search_filters_by_text_and_annotations(search):
+    assert search.search("") is None
+    assert search.search("苹果 手机").tolist() == [0]
+    assert search.search("label:品牌 -手机").tolist() == [1, 4]
+    assert search.search("品牌=苹果").tolist() == [0, 4]
+    assert search.search("map:苹果 OR text:华为").tolist() == [0, 1, 4]
+    assert search.search("status:完成").tolist() == [0, 4]
+    assert search.search("NOT label:品牌").tolist() == [2, 3, 5]
+    assert search.search("电脑 (status:未完成 | status:未开始)").tolist() == [1]
+    with pytest.raises(ValueError):
+        search.search("cluster:代表")
+
+
+def test_search_sees_edits_without_rebuilding(search):
+    manager = search.manager
+    manager.add_annotation(3, span("小米", "品牌", 0, 2, {"品牌": ["小米"]}))
+    manager.remove_annotation(0, 0)
+    assert search.search("label:品牌").tolist() == [1, 3, 4]
+    assert search.search("品牌=小米").tolist() == [3]
+    assert search.search("map:苹果").tolist() == [4]
+    manager.update_annotation(1, 0, span("华为", "品牌", 0, 2, {"品牌": ["华为"]}))
+    assert search.search("status:完成").tolist() == [1, 3, 4]
+
+
+def test_filtered_view_navigation_within_bounds():
+    view = FilteredView([1, 3, 4, 8], lo=2, hi=8)
+    assert view.rows.tolist() == [3, 4]
+    assert 4 in view and 8 not in view
+    assert view.next_after(4) == 3
+    assert view.next_after(4, wrap=False) is None
+    assert view.prev_before(3) == 4
+    assert view.position(2) == 0 and view.at(1) == 4 and view.at(2) is None
@@ -0,0 +1,139 @@
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+
+from utils.api import AnnotationAPI
+from utils.service import AnnotationService, ProjectHandle
+from utils.sqlite_store import SQLiteProject, import_file_project
+
+
+def span(text, label, start, end):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': {}}
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def project_dir(tmp_path, request):
+    pd.DataFrame({"query": ["苹果手机", "华为电脑", "小米手环"]}).to_csv(tmp_path / "p.csv", index=False)
+    (tmp_path / "p_vocab.json").write_text(json.dumps({"品牌": ["苹果"]}, ensure_ascii=False), encoding="utf-8")
+    if request.param == "sqlite":
+        import_file_project(str(tmp_path), "p").close()
+    return str(tmp_path)
+
+
+def test_two_services_see_each_others_writes(project_dir):
+    a, b = AnnotationService(project_dir), AnnotationService(project_dir)
+    assert a.add_span("p", 0, span("苹果", "品牌", 0, 2))
+    assert b.add_span("p", 1, span("华为", "品牌", 0, 2))
+    assert a.get_row("p", 1)["annotations"] == [span("华为", "品牌", 0, 2)]
+    assert b.get_row("p", 0)["annotations"] == [span("苹果", "品牌", 0, 2)]
+    assert a.stats("p")["spans"] == 2
+
+
+def test_own_save_does_not_hide_other_writers_vocab(project_dir):
+    a, b = AnnotationService(project_dir), AnnotationService(project_dir)
+    handle = a.open("p")
+    handle.manager.add_annotation(0, span("苹果", "品牌", 0, 2))
+    assert b.add_vocab_term("p", "品牌", "华为")
+    b.add_span("p", 1, span("华为", "品牌", 0, 2))
+    # a 保存时只记下自己写入后的标注签名，b 的词条和标注仍会在下次打开时拾取
+    handle.save()
+    assert a.open("p").mapper.vocab["品牌"] == ["苹果", "华为"]
+    assert a.get_row("p", 1)["annotations"] == [span("华为", "品牌", 0, 2)]
+
+
+def test_refresh_reports_what_changed_through_overridable_readers(project_dir):
+    class CountingHandle(ProjectHandle):
+        reads = []
+
+        def _read_json(self, path, mtime_ns):
+            self.reads.append(path)
+            return super()._read_json(path, mtime_ns)
+
+    handle = CountingHandle(project_dir, "p")
+    assert handle.refresh() == []
+    other = AnnotationService(project_dir)
+    other.add_span("p", 2, span("小米", "品牌", 0, 2))
+    assert "annotations" in handle.refresh()
+    assert handle.manager.get_annotations(2) == [span("小米", "品牌", 0, 2)]
+    with open(handle.paths["suggestions"], "w", encoding="utf-8") as f:
+        json.dump({"1": [dict(span("华为", "品牌", 0, 2), confidence=1.0)]}, f)
+    assert handle.refresh() == ["suggestions"]
+    assert handle.reads[-1] == handle.paths["suggestions"]
+    assert len(handle.manager.get_suggestions(1)) == 1
+
+
+def test_own_vocab_write_is_not_reloaded(project_dir, monkeypatch):
+    service = AnnotationService(project_dir)
+    handle = service.open("p")
+    assert service.add_vocab_term("p", "品牌", "华为")
+    assert service.save_label_map("p", {"品牌": ["品牌"]}) is None
+    loads = []
+    monkeypatch.setattr(handle.mapper, "load_vocabulary", loads.append)
+    service.open("p")
+    assert loads == []
+    assert handle.label_map == {"品牌": ["品牌"]}
+
+
+def test_sqlite_config_revision_only_follows_vocab_and_label_map(tmp_path):
+    project = SQLiteProject(str(tmp_path / "p.db"))
+    project.import_dataframe(pd.DataFrame({"query": ["苹果手机"]}))
+    assert project.config_revision() == 0
+    assert project.save_vocab({"品牌": ["苹果"]}) == 1
+    assert project.add_vocab_term("品牌", "华为") == 2
+    assert project.save_label_map({"品牌": ["品牌"]}) == 3
+    project.append({0: [span("苹果", "品牌", 0, 2)]})
+    assert project.config_revision() == 3
+
+
+def test_row_errors(project_dir):
+    service = AnnotationService(project_dir)
+    with pytest.raises(IndexError):
+        service.get_row("p", 3)
+    with pytest.raises(FileNotFoundError):
+        service.open("missing")
+    assert service.add_span("p", 0, span("苹果", "品牌", 0, 2))
+    # 与已有标注重叠
+    assert not service.add_span("p", 0, span("苹果手机", "品类", 0, 4))
+    result = service.write_rows("p", {0: [span("手机", "品类", 2, 4)], 9: []})
+    assert result == {"updated": [0], "rejected": [9]}
+
+
+def call(app, method, path, body=None, query=b""):
+    # 直接驱动 ASGI 应用，不依赖 uvicorn
+    messages = []
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+
+    async def receive():
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query}
+    asyncio.run(app(scope, receive, send))
+    status = messages[0]["status"]
+    data = b"".join(m.get("body", b"") for m in messages[1:])
+    return status, data
+
+
+def test_http_api(project_dir):
+    app = AnnotationAPI(AnnotationService(project_dir), workers=2)
+    try:
+        assert call(app, "GET", "/projects") == (200, json.dumps({"projects": ["p"]}).encode())
+        status, body = call(app, "POST", "/projects/p/rows/0/spans", span("苹果", "品牌", 0, 2))
+        assert status == 201
+        assert json.loads(body)["annotations"] == [span("苹果", "品牌", 0, 2)]
+        assert call(app, "POST", "/projects/p/rows/0/spans", span("苹果手机", "品类", 0, 4))[0] == 409
+        assert call(app, "GET", "/projects/p/rows/7")[0] == 404
+        assert call(app, "DELETE", "/projects/p/rows")[0] == 405
+        status, body = call(app, "GET", "/projects/p/search", query="q=label:品牌".encode())
+        assert json.loads(body) == {"total": 1, "rows": [0]}
+        status, body = call(app, "GET", "/projects/p/export", query=b"format=jsonl")
+        assert status == 200
+        records = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+        assert records[0]["query"] == "苹果手机"
+        assert records[0]["annotations"] == [span("苹果", "品牌", 0, 2)]
+    finally:
+        app.shutdown()
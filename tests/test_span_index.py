@@ -0,0 +1,60 @@
+from utils.annotation import AnnotationManager
+from utils.span_index import mapping_signature
+
+
+def span(text, label, start, end, mapped=None):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': mapped or {}}
+
+
+def new_manager(rows):
+    manager = AnnotationManager()
+    manager.set_row_count(len(rows))
+    for idx, spans in enumerate(rows):
+        for s in spans:
+            manager.add_annotation(idx, s)
+    return manager
+
+
+def test_mapping_signature_ignores_empty_categories_and_key_order():
+    assert mapping_signature({"b": ["1"], "a": ["2"], "c": []}) == mapping_signature({"a": ["2"], "b": ["1"]})
+    assert mapping_signature(None) == mapping_signature({}) == "{}"
+
+
+def test_propagate_fills_unmapped_spans_and_keeps_others():
+    manager = new_manager([
+        [span("苹果", "品牌", 0, 2), span("苹果", "品牌", 3, 5)],
+        [span("苹果", "品牌", 0, 2, {"品牌": ["Apple"]})],
+        [span("苹果", "品类", 0, 2)],
+        [span("华为", "品牌", 0, 2)],
+    ])
+    mapped = {"品牌": ["苹果"]}
+    assert manager.propagate_mapping("苹果", "品牌", mapped) == 2
+    assert [s['mapped_value'] for s in manager.annotations[0]] == [mapped, mapped]
+    assert manager.annotations[1][0]['mapped_value'] == {"品牌": ["Apple"]}
+    assert manager.annotations[2][0]['mapped_value'] == {}
+    assert manager.annotations[3][0]['mapped_value'] == {}
+    # 已是相同映射的 span 不计入；overwrite=True 时覆盖其他映射
+    assert manager.propagate_mapping("苹果", "品牌", mapped) == 0
+    assert manager.propagate_mapping("苹果", "品牌", mapped, overwrite=True) == 1
+    assert manager.annotations[1][0]['mapped_value'] == mapped
+    assert manager.stats.mapped == 3
+    assert manager.annotations[0][0]['mapped_value'] is not manager.annotations[0][1]['mapped_value']
+
+
+def test_suggest_mapping_returns_most_common_existing_mapping():
+    apple, brand = {"品牌": ["Apple"]}, {"品牌": ["苹果"]}
+    manager = new_manager([
+        [span("苹果", "品牌", 0, 2, apple)],
+        [span("苹果", "品牌", 0, 2, brand)],
+        [span("苹果", "品牌", 0, 2, brand)],
+        [span("苹果", "品牌", 0, 2)],
+    ])
+    assert manager.suggest_mapping("苹果", "品牌") == (brand, 2)
+    assert manager.suggest_mapping("苹果", "品类") is None
+    # 删除和修改经由同一组钩子增量更新
+    manager.remove_annotation(1, 0)
+    manager.update_annotation(2, 0, span("苹果", "品牌", 0, 2))
+    assert manager.suggest_mapping("苹果", "品牌") == (apple, 1)
+    manager.remove_annotation(0, 0)
+    assert manager.suggest_mapping("苹果", "品牌") is None
+    assert manager.span_index.rows_of("苹果", "品牌") == [2, 3]
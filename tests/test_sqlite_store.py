@@ -0,0 +1,101 @@
+import json
+import sqlite3
+
+import pandas as pd
+
+from utils.annotation import AnnotationManager
+from utils.sqlite_store import PagedFrame, SQLiteProject, export_file_project, import_file_project
+from utils.stats import STATUS_DONE, STATUS_INCOMPLETE
+
+
+def span(text, label, start, end, mapped=None):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': mapped or {}}
+
+
+def make_project(tmp_path, n_rows=5):
+    project = SQLiteProject(str(tmp_path / "p.db"))
+    project.import_dataframe(pd.DataFrame({"query": [f"苹果手机{i}" for i in range(n_rows)], "id": range(n_rows)}))
+    return project
+
+
+def test_rows_round_trip_with_mappings_and_extra_fields(tmp_path):
+    project = make_project(tmp_path)
+    row = [span("苹果", "品牌", 0, 2, {"品牌": ["苹果", "Apple"]}), {**span("手机", "品类", 2, 4), "note": "x"}]
+    versions = project.append({1: row, 2: [span("苹果", "品牌", 0, 2)]})
+    assert project.load() == {1: row, 2: [span("苹果", "品牌", 0, 2)]}
+    assert project.load_rows([1, 3]) == {1: row, 3: []}
+    annotations, loaded_versions, cursor = project.load_versioned()
+    assert loaded_versions == versions
+    assert cursor == max(versions.values())
+    assert project.rows_with_status(STATUS_INCOMPLETE) == [1, 2]
+    project.append({2: [span("苹果", "品牌", 0, 2, {"品牌": ["苹果"]})]})
+    assert project.rows_with_status(STATUS_DONE) == [2]
+
+
+def test_changes_since_returns_rows_written_by_other_connections(tmp_path):
+    project = make_project(tmp_path)
+    project.append({0: [span("苹果", "品牌", 0, 2)]})
+    _, _, cursor = project.load_versioned()
+    other = SQLiteProject(str(tmp_path / "p.db"))
+    other.append({3: [span("手机", "品类", 4, 6)]})
+    changes, versions, cursor = project.changes_since(cursor)
+    assert changes == {3: [span("手机", "品类", 4, 6)]}
+    assert list(versions) == [3]
+    assert project.changes_since(cursor)[0] == {}
+
+
+def test_changes_since_handles_more_rows_than_the_variable_limit(tmp_path):
+    project = make_project(tmp_path, n_rows=1500)
+    _, _, cursor = project.load_versioned()
+    other = SQLiteProject(str(tmp_path / "p.db"))
+    # 按旧版 SQLite 的默认上限收紧，一次整体覆盖涉及的行数超过它
+    project._conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    other.reset({idx: [span("苹果", "品牌", 0, 2)] for idx in range(0, 1500, 2)})
+    changes, versions, _ = project.changes_since(cursor)
+    assert len(versions) == 1500
+    assert changes[0] == [span("苹果", "品牌", 0, 2)]
+    assert changes[1] == []
+    assert project.load_rows(range(1500)) == changes
+
+
+def test_manager_merges_through_sqlite_backend(tmp_path):
+    make_project(tmp_path)
+    a, b = AnnotationManager(), AnnotationManager()
+    for manager in (a, b):
+        manager.attach_journal(SQLiteProject(str(tmp_path / "p.db")))
+        manager.set_row_count(5)
+    a.add_annotation(0, span("苹果", "品牌", 0, 2))
+    b.add_annotation(0, span("手机", "品类", 2, 4))
+    a.save()
+    b.save()
+    assert b.annotations[0] == [span("苹果", "品牌", 0, 2), span("手机", "品类", 2, 4)]
+    a.sync()
+    assert a.annotations[0] == b.annotations[0]
+
+
+def test_paged_frame_reads_by_page(tmp_path):
+    project = make_project(tmp_path, n_rows=25)
+    frame = PagedFrame(project, page_size=10, max_pages=2)
+    assert len(frame) == 25
+    assert frame.iloc[23]["query"] == "苹果手机23"
+    assert frame.iloc[-1]["id"] == 24
+    assert frame.iloc[5:12]["query"].tolist() == [f"苹果手机{i}" for i in range(5, 12)]
+    frame.iloc[0], frame.iloc[11]
+    assert len(frame._pages) == 2
+    assert frame["query"].tolist()[:2] == ["苹果手机0", "苹果手机1"]
+
+
+def test_import_and_export_file_layout(tmp_path):
+    pd.DataFrame({"query": ["苹果手机", "华为电脑"]}).to_csv(tmp_path / "p.csv", index=False)
+    (tmp_path / "p_annotations.json").write_text(json.dumps({"1": [span("华为", "品牌", 0, 2)]}), encoding="utf-8")
+    (tmp_path / "p_vocab.json").write_text(json.dumps({"品牌": ["华为"]}), encoding="utf-8")
+    project = import_file_project(str(tmp_path), "p")
+    assert project.count_queries() == 2
+    assert project.load() == {1: [span("华为", "品牌", 0, 2)]}
+    assert project.load_vocab() == {"品牌": ["华为"]}
+    out = tmp_path / "out"
+    out.mkdir()
+    export_file_project(str(tmp_path / "p.db"), str(out), "p")
+    assert pd.read_csv(out / "p.csv")["query"].tolist() == ["苹果手机", "华为电脑"]
+    snapshot = json.loads((out / "p_annotations.json").read_text(encoding="utf-8"))
+    assert snapshot == {"0": [], "1": [span("华为", "品牌", 0, 2)]}
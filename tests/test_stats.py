@@ -0,0 +1,56 @@
+import random
+
+from utils.annotation import AnnotationManager
+from utils.stats import STATUS_DONE, STATUS_INCOMPLETE, STATUS_NOT_STARTED, AnnotationStats
+
+
+def span(label, start, mapped=None):
+    return {'text': "ab", 'label': label, 'start': start, 'end': start + 2, 'mapped_value': mapped or {}}
+
+
+def snapshot(stats):
+    return (stats.total, stats.mapped, +stats.label_counts, +stats.category_counts,
+            bytes(stats.row_status), +stats.status_counts)
+
+
+def test_counts_and_status_transitions():
+    stats = AnnotationStats(3)
+    assert stats.status_counts[STATUS_NOT_STARTED] == 3
+    assert stats.add_span(0, span("品牌", 0)) == STATUS_NOT_STARTED
+    assert stats.status(0) == STATUS_INCOMPLETE
+    assert stats.add_span(0, span("品牌", 2)) is None
+    mapped = span("品牌", 4, {"品牌": ["苹果"], "系列": []})
+    stats.add_span(1, mapped)
+    assert stats.status(1) == STATUS_DONE
+    assert (stats.total, stats.mapped, stats.progress()) == (3, 1, 1 / 3)
+    assert stats.label_counts["品牌"] == 3
+    assert +stats.category_counts == {"品牌": 1}
+    # 行号超出范围时自动扩展
+    stats.add_span(5, span("颜色", 0))
+    assert stats.n_rows == 6 and stats.status_counts[STATUS_NOT_STARTED] == 3
+    assert stats.remove_span(1, mapped) == STATUS_DONE
+    assert stats.status(1) == STATUS_NOT_STARTED
+    assert +stats.category_counts == {}
+
+
+def test_incremental_stats_match_rebuild_after_edits():
+    rng = random.Random(0)
+    manager = AnnotationManager()
+    manager.set_row_count(20)
+    for _ in range(300):
+        idx = rng.randrange(20)
+        row = manager.get_annotations(idx)
+        op = rng.random()
+        if row and op < 0.3:
+            manager.remove_annotation(idx, rng.randrange(len(row)))
+        elif row and op < 0.6:
+            k = rng.randrange(len(row))
+            mapped = {"品牌": ["苹果"]} if rng.random() < 0.5 else {}
+            manager.update_annotation(idx, k, dict(row[k], mapped_value=mapped))
+        else:
+            label = rng.choice(["品牌", "颜色"])
+            manager.add_annotation(idx, span(label, 2 * rng.randrange(10), {label: ["x"]} if rng.random() < 0.5 else {}))
+    rebuilt = AnnotationStats()
+    rebuilt.rebuild(manager.annotations, n_rows=20)
+    assert snapshot(manager.stats) == snapshot(rebuilt)
+    assert sum(manager.stats.status_counts.values()) == 20
@@ -0,0 +1,83 @@
+import random
+
+from utils.annotation import AnnotationManager
+from utils.stats import STATUS_DONE, STATUS_INCOMPLETE, STATUS_NOT_STARTED
+from utils.status_index import FenwickSet
+
+
+def span(text, label, start, end, mapped=None):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': mapped or {}}
+
+
+def test_fenwick_set_matches_a_plain_set():
+    rng = random.Random(7)
+    fs, members = FenwickSet(50), set()
+    for _ in range(300):
+        i = rng.randrange(50)
+        if rng.random() < 0.6:
+            fs.add(i)
+            members.add(i)
+        else:
+            fs.discard(i)
+            members.discard(i)
+    ordered = sorted(members)
+    assert len(fs) == len(ordered)
+    assert [fs.select(k) for k in range(len(fs))] == ordered
+    for i in range(51):
+        assert fs.rank(i) == sum(1 for m in ordered if m < i)
+        after = [m for m in ordered if m > i]
+        assert fs.next_after(i, wrap=False) == (after[0] if after else None)
+        before = [m for m in ordered if m < i]
+        assert fs.prev_before(i, wrap=False) == (before[-1] if before else None)
+
+
+def test_fenwick_set_wraps_within_bounds_and_grows():
+    fs = FenwickSet(members=bytes([0, 1, 0, 1, 0, 1, 0, 1]))
+    assert fs.next_after(5, lo=2, hi=6) == 3
+    assert fs.next_after(5, wrap=False, lo=2, hi=6) is None
+    assert fs.prev_before(3, lo=2, hi=6) == 5
+    assert fs.count_in(2, 6) == 2
+    fs.resize(20)
+    fs.add(17)
+    assert fs.next_after(7) == 17
+    assert fs.select(len(fs) - 1) == 17
+
+
+def manager(n_rows):
+    m = AnnotationManager()
+    m.set_row_count(n_rows)
+    return m
+
+
+def test_next_row_by_status_and_label_follows_edits():
+    m = manager(6)
+    m.add_annotation(1, span("苹果", "品牌", 0, 2, {"品牌": ["苹果"]}))
+    m.add_annotation(3, span("手机", "品类", 2, 4))
+    m.add_annotation(4, span("华为", "品牌", 0, 2))
+    assert m.next_row(0, STATUS_DONE) == 1
+    assert m.next_row(1, STATUS_INCOMPLETE) == 3
+    assert m.next_row(4, STATUS_INCOMPLETE) == 3  # 回绕
+    assert m.next_row(1, label="品牌") == 4
+    assert m.prev_row(4, label="品牌") == 1
+    assert m.next_unfinished(1) == 2
+    m.update_annotation(3, 0, span("手机", "品类", 2, 4, {"品类": ["手机"]}))
+    m.remove_annotation(4, 0)
+    assert m.next_row(1, STATUS_INCOMPLETE) is None
+    assert m.next_row(1, label="品牌") == 1
+    assert m.get_row_status(4) == STATUS_NOT_STARTED
+    assert m.count_unfinished() == 4
+    # 批次 [1, 4) 内第 3 行之后没有未完成的行，回绕到批次开头
+    assert m.next_unfinished(3, lo=1, hi=4) == 2
+
+
+def test_resize_adds_not_started_rows_and_keeps_labels():
+    m = manager(3)
+    m.add_annotation(2, span("苹果", "品牌", 0, 2))
+    m.set_row_count(10)
+    assert m.row_index.n_rows == 10
+    assert m.next_row(2, STATUS_NOT_STARTED, wrap=False) == 3
+    assert m.count_unfinished(3, 10) == 7
+    m.add_annotation(8, span("华为", "品牌", 0, 2))
+    assert m.next_row(2, label="品牌") == 8
+    assert m.next_row(8, label="品牌") == 2
+    assert m.next_row(8, STATUS_INCOMPLETE, wrap=False) is None
@@ -0,0 +1,120 @@
+import json
+
+from utils.annotation import AnnotationManager
+from utils.storage import AnnotationJournal
+
+
+def span(text, label, start, end):
+    return {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': {}}
+
+
+def journal(tmp_path, **kwargs):
+    return AnnotationJournal(str(tmp_path / "p_annotations.json"), **kwargs)
+
+
+def test_append_then_replay(tmp_path):
+    j = journal(tmp_path)
+    v1 = j.append({0: [span("苹果", "品牌", 0, 2)], 3: []})
+    v2 = j.append({0: [span("苹果手机", "品类", 0, 4)]})
+    assert v2[0] > v1[0] > 0
+    annotations, versions, _ = journal(tmp_path).load_versioned()
+    assert annotations == {0: [span("苹果手机", "品类", 0, 4)], 3: []}
+    assert versions == {0: v2[0], 3: v1[3]}
+
+
+def test_compact_rewrites_snapshot_and_keeps_versions(tmp_path):
+    j = journal(tmp_path)
+    versions = j.append({0: [span("苹果", "品牌", 0, 2)], 1: [span("华为", "品牌", 0, 2)]})
+    annotations = j.load()
+    j.compact(annotations, versions)
+    assert not (tmp_path / "p_annotations.journal").exists()
+    assert not (tmp_path / "p_annotations.journal.old").exists()
+    reloaded, reloaded_versions, _ = journal(tmp_path).load_versioned()
+    assert reloaded == annotations
+    assert reloaded_versions == versions
+    # 合并后加载再追加，版本号不回退
+    j = journal(tmp_path)
+    j.load()
+    assert j.append({2: []})[2] > max(versions.values())
+
+
+def test_changes_since_reads_only_new_records(tmp_path):
+    j = journal(tmp_path)
+    j.append({0: [span("苹果", "品牌", 0, 2)]})
+    _, _, cursor = j.load_versioned()
+    other = journal(tmp_path)
+    other.load_versioned()
+    other.append({1: [span("华为", "品牌", 0, 2)]})
+    changes, versions, cursor = j.changes_since(cursor)
+    assert changes == {1: [span("华为", "品牌", 0, 2)]}
+    assert list(versions) == [1]
+    assert j.changes_since(cursor)[0] == {}
+
+
+def test_partial_record_is_left_for_next_read(tmp_path):
+    j = journal(tmp_path)
+    j.append({0: [span("苹果", "品牌", 0, 2)]})
+    _, _, cursor = j.load_versioned()
+    record = json.dumps({"row": 1, "annotations": [], "version": 9}) + "\n"
+    with open(tmp_path / "p_annotations.journal", "a", encoding="utf-8") as f:
+        f.write(record[:10])
+    changes, _, cursor = j.changes_since(cursor)
+    assert changes == {}
+    with open(tmp_path / "p_annotations.journal", "a", encoding="utf-8") as f:
+        f.write(record[10:])
+    assert j.changes_since(cursor)[0] == {1: []}
+
+
+def test_changes_since_falls_back_to_full_load_after_compaction(tmp_path):
+    j = journal(tmp_path)
+    j.append({0: [span("苹果", "品牌", 0, 2)]})
+    _, _, cursor = j.load_versioned()
+    other = journal(tmp_path)
+    annotations, versions, _ = other.load_versioned()
+    versions.update(other.append({1: [span("华为", "品牌", 0, 2)]}))
+    annotations[1] = [span("华为", "品牌", 0, 2)]
+    other.compact(annotations, versions)
+    changes, _, _ = j.changes_since(cursor)
+    assert changes == annotations
+
+
+def test_manager_save_appends_only_dirty_rows_and_compacts(tmp_path):
+    manager = AnnotationManager()
+    manager.attach_journal(journal(tmp_path, compact_threshold=200))
+    manager.set_row_count(10)
+    manager.add_annotation(2, span("苹果", "品牌", 0, 2))
+    manager.save()
+    lines = (tmp_path / "p_annotations.journal").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["row"] for line in lines] == [2]
+    for idx in range(3, 8):
+        manager.add_annotation(idx, span("华为", "品牌", 0, 2))
+    manager.save()
+    # 超过阈值后合并进快照
+    assert not (tmp_path / "p_annotations.journal").exists()
+    reloaded = AnnotationManager()
+    reloaded.attach_journal(journal(tmp_path))
+    assert {idx: spans for idx, spans in reloaded.annotations.items() if spans} == \
+           {idx: spans for idx, spans in manager.annotations.items() if spans}
+
+
+def test_append_trims_torn_tail_left_by_a_crash(tmp_path):
+    j = journal(tmp_path)
+    j.append({0: [span("苹果", "品牌", 0, 2)]})
+    with open(tmp_path / "p_annotations.journal", "a", encoding="utf-8") as f:
+        f.write('{"row": 1, "annotations": [], "ver')
+    j = journal(tmp_path)
+    j.load()
+    versions = j.append({1: [span("华为", "品牌", 0, 2)]})
+    annotations, reloaded_versions, _ = journal(tmp_path).load_versioned()
+    assert annotations == {0: [span("苹果", "品牌", 0, 2)], 1: [span("华为", "品牌", 0, 2)]}
+    assert reloaded_versions[1] == versions[1]
+    lines = (tmp_path / "p_annotations.journal").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["row"] for line in lines] == [0, 1]
+
+
+def test_malformed_record_is_skipped(tmp_path):
+    j = journal(tmp_path)
+    with open(tmp_path / "p_annotations.journal", "w", encoding="utf-8") as f:
+        f.write('[1, 2]\n{"annotations": []}\n')
+    j.append({0: []})
+    assert journal(tmp_path).load() == {0: []}
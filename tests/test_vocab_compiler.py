@@ -0,0 +1,71 @@
+import json
+import os
+
+import utils.vocab_compiler as vocab_compiler
+from utils.vocab_compiler import (CompiledVocab, add_vocab_term, artifact_path, compile_vocab, compile_vocab_file,
+                                  content_hash)
+
+
+def write_vocab(path, vocab):
+    path.write_text(json.dumps(vocab, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def test_cleaning_dedup_and_scalar_values():
+    compiled = CompiledVocab({"品牌": ["苹果", "Apple", "ＡＰＰＬＥ", "0", "", 7.0], "ai": "ai", "内存": ["16G", "16 GB"]})
+    # 规范化后相同的只保留第一个；"0"、空值去掉；7.0 -> "7"；标量值按单个词条处理
+    assert compiled.vocab == {"品牌": ["苹果", "Apple", "7"], "ai": ["ai"], "内存": ["16G"]}
+    assert compiled.indexes["ai"].search("ai")[0] == ("ai", 3.0)
+    assert compiled.add("品牌", "apple") is None
+    assert compiled.add("品牌", "华为") == "华为"
+    assert compiled.indexes["品牌"].search("华为手机")[0][0] == "华为"
+
+
+def test_file_cache_hit_skips_compilation(tmp_path, monkeypatch):
+    path = write_vocab(tmp_path / "v.json", {"品牌": ["苹果"]})
+    cache = str(tmp_path / "cache")
+    first = compile_vocab_file(path, cache)
+    with open(path, "rb") as f:
+        assert os.path.exists(artifact_path(cache, content_hash(f.read())))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("缓存命中时不应重新编译")
+
+    # 反序列化不经过 __init__，命中缓存时不会调用
+    monkeypatch.setattr(CompiledVocab, "__init__", fail)
+    second = compile_vocab_file(path, cache)
+    assert second is not first
+    assert second.vocab == first.vocab
+    assert second.indexes["品牌"].search("苹果") == [("苹果", 3.0)]
+
+
+def test_changed_content_invalidates_cache(tmp_path):
+    path = write_vocab(tmp_path / "v.json", {"品牌": ["苹果"]})
+    cache = str(tmp_path / "cache")
+    old = compile_vocab_file(path, cache)
+    write_vocab(tmp_path / "v.json", {"品牌": ["苹果", "华为"]})
+    new = compile_vocab_file(path, cache)
+    assert new.source_hash != old.source_hash
+    assert new.vocab == {"品牌": ["苹果", "华为"]}
+    assert len(os.listdir(cache)) == 2
+
+
+def test_stale_format_is_recompiled(tmp_path, monkeypatch):
+    cache = str(tmp_path / "cache")
+    compile_vocab({"品牌": ["苹果"]}, cache)
+    monkeypatch.setattr(vocab_compiler, "COMPILED_FORMAT", vocab_compiler.COMPILED_FORMAT + 1)
+    compiled = compile_vocab({"品牌": ["苹果"]}, cache)
+    assert compiled.format == vocab_compiler.COMPILED_FORMAT
+
+
+def test_add_vocab_term_updates_file_and_artifact(tmp_path):
+    path = write_vocab(tmp_path / "v.json", {"品牌": "苹果"})
+    cache = str(tmp_path / "cache")
+    compile_vocab_file(path, cache)
+    assert add_vocab_term(path, "品牌", "华为", cache)
+    assert not add_vocab_term(path, "品牌", "华为", cache)
+    assert json.loads(open(path, encoding="utf-8").read()) == {"品牌": ["苹果", "华为"]}
+    with open(path, "rb") as f:
+        compiled = vocab_compiler.load_artifact(cache, content_hash(f.read()))
+    # 增量更新的产物按新内容哈希保存，下次打开直接命中
+    assert compiled is not None and compiled.vocab == {"品牌": ["苹果", "华为"]}
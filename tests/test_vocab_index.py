@@ -0,0 +1,57 @@
+from utils.mapping import VocabularyMapper
+from utils.vocab_index import AhoCorasick, CategoryIndex, normalize_term
+
+
+def test_automaton_reports_overlapping_and_nested_matches():
+    automaton = AhoCorasick()
+    for term in ("he", "she", "his", "hers"):
+        automaton.add(term, term)
+    matches = sorted((start, end, value) for start, end, value in automaton.iter_matches("ushers"))
+    assert matches == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+
+def test_normalize_term_folds_width_case_space_and_capacity():
+    assert normalize_term("ＲＴＸ　４０６０") == "rtx 4060"
+    assert normalize_term("16 GB") == normalize_term("16g") == normalize_term("16.0Gb") == "16gb"
+    assert normalize_term("1T") == "1tb"
+    # 紧挨字母数字的不当作容量
+    assert normalize_term("i5-1130G7") == "i5-1130g7"
+
+
+def test_search_ranks_exact_then_by_length_overlap():
+    index = CategoryIndex(["RTX 4060", "RTX 4060 Ti", "GTX 1650", "4060"])
+    # 规范化后完全相同的得 3 分；包含/被包含的按长度比例在 (1, 2] 之间
+    assert index.search("ｒｔｘ 4060") == [("RTX 4060", 3.0), ("RTX 4060 Ti", 1 + 8 / 11), ("4060", 1 + 4 / 8)]
+    assert index.search("rtx 4060", top_k=1) == [("RTX 4060", 3.0)]
+
+
+def test_bigram_fallback_finds_near_misses():
+    index = CategoryIndex(["联想拯救者", "华为", "小米"])
+    # 既不包含也不被包含，只靠共享 bigram 匹配
+    ranked = index.search("联想拯救")
+    assert ranked[0][0] == "联想拯救者"
+    fuzzy = index.search("拯救者笔记本电脑")
+    assert [c for c, _ in fuzzy] == ["联想拯救者"]
+    assert 0.3 <= fuzzy[0][1] < 1.0
+    assert index.search("戴尔") == []
+
+
+def test_incremental_add_is_searchable_before_and_after_rebuild():
+    index = CategoryIndex(["华为"])
+    assert index.add("Apple")
+    assert not index.add("Apple")
+    assert index.search("apple手机")[0][0] == "Apple"
+    # 未编入自动机的候选词累计到阈值时整体重建
+    for i in range(CategoryIndex.REBUILD_PENDING - 1):
+        index.add(f"型号{i}")
+    assert index._pending == []
+    assert index.search("apple手机")[0][0] == "Apple"
+
+
+def test_mapper_returns_vocab_order_when_nothing_matches():
+    mapper = VocabularyMapper()
+    mapper.load_vocabulary({"品牌": ["华为", "苹果", "小米"]})
+    assert mapper.find_mappings("苹果手机", "品牌") == ["苹果"]
+    assert mapper.find_mappings("戴尔", "品牌", top_k=2) == ["华为", "苹果"]
+    assert mapper.add_candidate("品牌", "戴尔")
+    assert mapper.find_mappings("戴尔电脑", "品牌") == ["戴尔"]
@@ -0,0 +1,530 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.storage import VERSIONS_KEY, AnnotationJournal
+
+# 分歧类型：漏标/多标（对方没有重叠的同标签 span）、标签不同（位置相同）、边界不同（同标签但位置不同）、映射不同
+DISAGREEMENT_KINDS = ("missing", "label", "boundary", "mapping")
+DISAGREEMENT_NAMES = {"missing": "漏标/多标", "label": "标签不同", "boundary": "边界不同", "mapping": "映射不同"}
+
+
+def parse_annotation_set(data, fmt):
+    # json：{行号: [span]}（项目标注快照格式）或导出记录列表；jsonl：导出的 JSONL，行号为记录顺序
+    if fmt == "jsonl":
+        records = [json.loads(line) for line in data.splitlines() if line.strip()]
+    else:
+        records = json.loads(data)
+    if isinstance(records, dict):
+        records.pop(VERSIONS_KEY, None)
+        return {int(idx): spans for idx, spans in records.items()}
+    annotations = {}
+    for idx, record in enumerate(records):
+        spans = record.get('annotations') if isinstance(record, dict) else record
+        if isinstance(spans, str):
+            spans = json.loads(spans) if spans.strip() else []
+        annotations[idx] = spans if isinstance(spans, list) else []
+    return annotations
+
+
+def load_annotation_set(path):
+    # 项目标注快照会同时回放增量日志；.db 为 SQLite 项目
+    if path.endswith(".db"):
+        from utils.sqlite_store import SQLiteProject
+
+        project = SQLiteProject(path)
+        try:
+            return project.load_versioned()[0]
+        finally:
+            project.close()
+    if path.endswith("_annotations.json"):
+        return AnnotationJournal(path).load()
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_annotation_set(f.read(), "jsonl" if path.endswith(".jsonl") else "json")
+
+
+def comparison_rows(annotation_sets):
+    # 默认比较范围：至少一套有 span 的行。没有记录的行按空行比较：项目标注和导出文件都不保存空行，
+    # 只在一套中出现的行正是漏标；只比较抽样部分时请显式传入 rows
+    rows = set()
+    for annotations in annotation_sets:
+        rows.update(int(idx) for idx, spans in annotations.items() if spans)
+    return sorted(rows)
+
+
+def _first_unique(keys, *columns):
+    # 按键排序后去重，重复键保留排序前最早的一个；np.unique 基于哈希，大数组上远慢于排序
+    # 标注行内的 span 通常已按 start 排好，键已有序时跳过排序
+    if len(keys) > 1 and not (keys[1:] >= keys[:-1]).all():
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        columns = [column[order] for column in columns]
+    keep = np.ones(len(keys), dtype=bool)
+    keep[1:] = keys[1:] != keys[:-1]
+    return (keys[keep],) + tuple(column[keep] for column in columns)
+
+
+def _lookup(sorted_keys, keys):
+    # keys 中每个元素在 sorted_keys 中的位置，不存在时为 -1
+    if not len(sorted_keys):
+        return np.full(len(keys), -1, dtype=np.int64)
+    pos = np.searchsorted(sorted_keys, keys)
+    pos[pos == len(sorted_keys)] = 0
+    return np.where(sorted_keys[pos] == keys, pos, -1)
+
+
+def _f1(hits_a, total_a, hits_b, total_b):
+    # a 为参照：precision = b 中命中 / b 总数，recall = a 中命中 / a 总数
+    precision = hits_b / total_b if total_b else None
+    recall = hits_a / total_a if total_a else None
+    if not precision or not recall:
+        f1 = 0.0 if total_a or total_b else None
+    else:
+        f1 = 2 * precision * recall / (precision + recall)
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def _kappa(conf):
+    n = conf.sum()
+    if not n:
+        return None
+    observed = np.trace(conf) / n
+    expected = float((conf.sum(axis=0) * conf.sum(axis=1)).sum()) / n / n
+    return 1.0 if expected >= 1 else float((observed - expected) / (1 - expected))
+
+
+class SpanTable:
+    # 一套标注展开成的列：每个 span 一项 (行, start, end, 标签)，映射项为 (span 下标, 类别, 取值)
+    # 标签、类别、取值先按原字符串收集，再由 encode 在参与比较的各套标注间统一编码，编码可直接比较
+    def __init__(self, annotations, rows):
+        row_ids, starts, ends, labels = [], [], [], []
+        map_span, map_cat, map_val = [], [], []
+        # 位置非法（非整数、为空）的 span 不参与比较
+        self.invalid = 0
+        for idx in rows:
+            row = annotations.get(idx)
+            if not row:
+                continue
+            for span in row:
+                start, end = span.get('start'), span.get('end')
+                if not (isinstance(start, int) and isinstance(end, int) and 0 <= start < end):
+                    self.invalid += 1
+                    continue
+                mapped = span.get('mapped_value')
+                if mapped and isinstance(mapped, dict):
+                    n = len(starts)
+                    for category, mapped_values in mapped.items():
+                        for value in mapped_values if isinstance(mapped_values, list) else [mapped_values]:
+                            map_span.append(n)
+                            map_cat.append(category)
+                            map_val.append(value if isinstance(value, str) else str(value))
+                row_ids.append(idx)
+                starts.append(start)
+                ends.append(end)
+                labels.append(span.get('label'))
+        self.rows = np.asarray(row_ids, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.map_span = np.asarray(map_span, dtype=np.int64)
+        self.raw = {"labels": labels, "map_cat": map_cat, "map_val": map_val}
+
+    @staticmethod
+    def encode(tables, field):
+        # 把各套标注的 field 列合并后统一编码（pandas 的哈希编码在 C 中完成），返回取值列表
+        values = [v for t in tables for v in t.raw[field]]
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+        offset = 0
+        for t in tables:
+            n = len(t.raw.pop(field))
+            setattr(t, field, codes[offset:offset + n].astype(np.int64))
+            offset += n
+        return list(uniques)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def index(self, width, n_labels, row_lengths):
+        # 预先排好比较用的各种键：
+        #   span_keys   (行, start, end, 标签)，精确匹配
+        #   offset_keys (行, start, end)，判断"位置相同、标签不同"
+        #   group_keys  (行, 标签, start)，同一 (行, 标签) 内按 start 排序，用于重叠匹配
+        #   char_keys   (行, 字符位置)，字符级比较；同一字符被多个 span 覆盖时取先出现的
+        offsets = (self.rows * width + self.starts) * width + self.ends
+        self.span_keys, self.span_order = _first_unique(offsets * n_labels + self.labels, np.arange(len(self)))
+        self.offset_keys = np.sort(offsets, kind="stable")
+        group = self.rows * n_labels + self.labels
+        self.group_keys, self.group_ends = _first_unique(group * width + self.starts, self.ends)
+        # 逐字符展开：第 k 个字符的位置为 k - (所在 span 的第一个字符序号) + start，原地运算减少临时数组
+        lengths = self.ends - self.starts
+        span_of = np.repeat(np.arange(len(self)), lengths)
+        pos = np.arange(len(span_of), dtype=np.int64)
+        pos -= np.repeat(np.cumsum(lengths) - lengths - self.starts, lengths)
+        keys = self.rows[span_of]
+        labels = self.labels[span_of]
+        del span_of
+        if row_lengths is not None:
+            # 超出 query 长度的部分不计
+            inside = pos < row_lengths[keys]
+            keys, pos, labels = keys[inside], pos[inside], labels[inside]
+        keys *= width
+        keys += pos
+        del pos
+        self.char_keys, self.char_labels = _first_unique(keys, labels)
+
+    def overlaps(self, other, width, n_labels):
+        # 每个 span 在 other 中是否有同标签且位置重叠的 span
+        # other 同一 (行, 标签) 内的 span 互不重叠，只需看 start 小于本 span end 的最后一个
+        group = self.rows * n_labels + self.labels
+        pos = np.searchsorted(other.group_keys, group * width + self.ends) - 1
+        valid = pos >= 0
+        pos[~valid] = 0
+        if not len(other.group_keys):
+            return np.zeros(len(self), dtype=bool)
+        return valid & (other.group_keys[pos] // width == group) & (other.group_ends[pos] > self.starts)
+
+
+class AgreementReport:
+    # 一致性结果：每对标注的指标、全部标注的 Fleiss' kappa，以及按行汇总的分歧
+    def __init__(self, names, labels, categories, n_rows, n_units, pairs, fleiss, disagreements, support, invalid):
+        self.names = names
+        self.labels = labels
+        self.categories = categories
+        self.n_rows = n_rows
+        self.n_units = n_units
+        self.pairs = pairs
+        self.fleiss = fleiss
+        # 分歧编码：行号 * len(DISAGREEMENT_KINDS) + 类型，升序去重
+        self._disagreements = disagreements
+        # 每套标注各标签的 span 数：{标签: [各套的数量]}
+        self.support = support
+        self.invalid = invalid
+
+    def disagreement_rows(self, kind=None):
+        codes = self._disagreements
+        if kind is not None:
+            codes = codes[codes % len(DISAGREEMENT_KINDS) == DISAGREEMENT_KINDS.index(kind)]
+        rows = codes // len(DISAGREEMENT_KINDS)
+        if kind is None and len(rows):
+            rows = rows[np.concatenate(([True], rows[1:] != rows[:-1]))]
+        return rows
+
+    def kinds(self, idx):
+        n = len(DISAGREEMENT_KINDS)
+        lo, hi = np.searchsorted(self._disagreements, [idx * n, idx * n + n])
+        return [DISAGREEMENT_KINDS[code % n] for code in self._disagreements[lo:hi]]
+
+    def summary(self):
+        # 各对标注取平均后的总体指标
+        keys = ("span_exact", "span_partial", "token_f1", "cohen_kappa")
+        summary = {key: _mean(pair[key] if key in ("token_f1", "cohen_kappa") else pair[key]["f1"]
+                              for pair in self.pairs) for key in keys}
+        summary["fleiss_kappa"] = self.fleiss["overall"]
+        return summary
+
+    def label_table(self):
+        # 每个标签一行：各对取平均的 span 精确/重叠 F1、字符级 F1、Cohen's kappa，以及 Fleiss' kappa
+        table = []
+        for label in self.labels:
+            per_pair = [pair["labels"][label] for pair in self.pairs]
+            record = {"label": label}
+            for key in ("exact_f1", "partial_f1", "token_f1", "cohen_kappa"):
+                record[key] = _mean(p[key] for p in per_pair)
+            record["fleiss_kappa"] = self.fleiss["labels"].get(label)
+            record["spans"] = self.support[label]
+            table.append(record)
+        return table
+
+    def mapping_table(self):
+        # 每个类别一行：各对合计的参与比较数、一致数和一致率
+        table = []
+        for category in self.categories:
+            compared = sum(pair["mapping"].get(category, {}).get("compared", 0) for pair in self.pairs)
+            agreed = sum(pair["mapping"].get(category, {}).get("agreed", 0) for pair in self.pairs)
+            if compared:
+                table.append({"category": category, "compared": compared, "agreed": agreed, "rate": agreed / compared})
+        return table
+
+    def to_json(self):
+        counts = {kind: int(len(self.disagreement_rows(kind))) for kind in DISAGREEMENT_KINDS}
+        return {
+            "sets": self.names,
+            "rows": self.n_rows,
+            "chars": self.n_units,
+            "invalid_spans": self.invalid,
+            "summary": self.summary(),
+            "labels": self.label_table(),
+            "mapping": self.mapping_table(),
+            "pairs": self.pairs,
+            "fleiss": self.fleiss,
+            "disagreements": {"rows": int(len(self.disagreement_rows())), "by_kind": counts},
+        }
+
+    def disagreement_records(self, annotation_sets, queries=None, kind=None):
+        # 供人工裁决的分歧明细：每行各套标注的原始 span
+        for idx in self.disagreement_rows(kind):
+            idx = int(idx)
+            record = {"row": idx}
+            if queries is not None:
+                record["query"] = queries[idx]
+            record["kinds"] = self.kinds(idx)
+            record["annotations"] = {name: annotations.get(idx) or []
+                                     for name, annotations in zip(self.names, annotation_sets)}
+            yield record
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def _compare_pair(a, b, width, n_labels, n_categories, n_values, n_units):
+    # 返回 (指标, 分歧编码)；分歧编码为 行号 * 类型数 + 类型
+    n_kinds = len(DISAGREEMENT_KINDS)
+    # span 精确匹配
+    a_keys = (((a.rows * width + a.starts) * width + a.ends) * n_labels + a.labels)
+    b_keys = (((b.rows * width + b.starts) * width + b.ends) * n_labels + b.labels)
+    a_match = _lookup(b.span_keys, a_keys)
+    b_hit = _lookup(a.span_keys, b_keys) >= 0
+    a_hit = a_match >= 0
+    # 同标签重叠匹配
+    a_partial = a.overlaps(b, width, n_labels)
+    b_partial = b.overlaps(a, width, n_labels)
+    label_counts = [np.bincount(x, minlength=n_labels) for x in
+                    (a.labels, b.labels, a.labels[a_hit], b.labels[b_hit], a.labels[a_partial], b.labels[b_partial])]
+
+    # 字符级混淆矩阵，下标 0 为未标注（O）
+    k = n_labels + 1
+    in_b = _lookup(b.char_keys, a.char_keys)
+    both = in_b >= 0
+    conf = np.bincount((a.char_labels[both] + 1) * k + b.char_labels[in_b[both]] + 1, minlength=k * k)
+    conf += np.bincount((a.char_labels[~both] + 1) * k, minlength=k * k)
+    b_both = np.zeros(len(b.char_keys), dtype=bool)
+    b_both[in_b[both]] = True
+    conf += np.bincount(b.char_labels[~b_both] + 1, minlength=k * k)
+    conf = conf.reshape(k, k)
+    if n_units is not None:
+        conf[0, 0] = n_units - (len(a.char_keys) + len(b.char_keys) - int(both.sum()))
+    # 字符级 micro F1：两套都标为同一标签的字符 / 两套各自标注的字符数的平均
+    entity_chars = conf[1:].sum() + conf[:, 1:].sum()
+    token_f1 = 2 * np.trace(conf[1:, 1:]) / entity_chars if entity_chars else None
+
+    labels = {}
+    for code in range(n_labels):
+        i = code + 1
+        tp, a_only, b_only = conf[i, i], conf[i].sum() - conf[i, i], conf[:, i].sum() - conf[i, i]
+        binary = np.array([[tp, a_only], [b_only, conf.sum() - tp - a_only - b_only]])
+        labels[code] = {
+            "exact_f1": _f1(label_counts[2][code], label_counts[0][code], label_counts[3][code], label_counts[1][code])["f1"],
+            "partial_f1": _f1(label_counts[4][code], label_counts[0][code], label_counts[5][code], label_counts[1][code])["f1"],
+            "token_f1": float(2 * tp / (conf[i].sum() + conf[:, i].sum())) if conf[i].sum() + conf[:, i].sum() else None,
+            "cohen_kappa": _kappa(binary),
+        }
+
+    # 映射：在精确匹配的 span 对上，按 (span 对, 类别) 比较取值集合
+    pair_of_a = np.full(len(a), -1, dtype=np.int64)
+    pair_of_a[a_hit] = np.arange(int(a_hit.sum()))
+    pair_of_b = np.full(len(b), -1, dtype=np.int64)
+    pair_of_b[b.span_order[a_match[a_hit]]] = pair_of_a[a_hit]
+    pair_rows = a.rows[a_hit]
+    entries = []
+    for table, pair_of in ((a, pair_of_a), (b, pair_of_b)):
+        pairs = pair_of[table.map_span] if len(table.map_span) else np.zeros(0, dtype=np.int64)
+        keep = pairs >= 0
+        group = pairs[keep] * n_categories + table.map_cat[keep]
+        entries.append(_first_unique(group * n_values + table.map_val[keep])[0])
+    groups = np.sort(np.concatenate([entries[0] // n_values, entries[1] // n_values]))
+    if len(groups):
+        groups = groups[np.concatenate(([True], groups[1:] != groups[:-1]))]
+    common = entries[0][_lookup(entries[1], entries[0]) >= 0]
+    counts = [np.bincount(np.searchsorted(groups, e // n_values), minlength=len(groups)) for e in (*entries, common)]
+    agree = (counts[0] == counts[2]) & (counts[1] == counts[2])
+    categories = groups % n_categories
+    compared = np.bincount(categories, minlength=n_categories)
+    agreed = np.bincount(categories[agree], minlength=n_categories)
+    mapping = {code: {"compared": int(compared[code]), "agreed": int(agreed[code]),
+                      "rate": float(agreed[code] / compared[code])}
+               for code in range(n_categories) if compared[code]}
+
+    # 分歧：未精确匹配的 span 按位置相同 / 同标签重叠 / 都没有归类，加上映射不一致的行
+    codes = [pair_rows[groups[~agree] // n_categories] * n_kinds + DISAGREEMENT_KINDS.index("mapping")]
+    for x, other, hit, partial in ((a, b, a_hit, a_partial), (b, a, b_hit, b_partial)):
+        miss = ~hit
+        same_offsets = _lookup(other.offset_keys, ((x.rows * width + x.starts) * width + x.ends)[miss]) >= 0
+        kind = np.where(same_offsets, DISAGREEMENT_KINDS.index("label"),
+                        np.where(partial[miss], DISAGREEMENT_KINDS.index("boundary"), DISAGREEMENT_KINDS.index("missing")))
+        codes.append(x.rows[miss] * n_kinds + kind)
+
+    metrics = {
+        "span_exact": _f1(int(a_hit.sum()), len(a), int(b_hit.sum()), len(b)),
+        "span_partial": _f1(int(a_partial.sum()), len(a), int(b_partial.sum()), len(b)),
+        "token_f1": None if token_f1 is None else float(token_f1),
+        "cohen_kappa": _kappa(conf),
+        "labels": labels,
+        "mapping": mapping,
+    }
+    return metrics, np.concatenate(codes)
+
+
+def _fleiss(tables, n_labels, n_units):
+    # 字符级 Fleiss' kappa：每个字符为一个单元，每套标注给出一个类别（标签或未标注）
+    # 只展开至少一套标注覆盖的字符，其余字符各套都是未标注，一致度为 1
+    n_sets = len(tables)
+    if not any(len(t.char_keys) for t in tables):
+        return {"overall": 1.0 if n_units else None, "labels": {}}
+    # (字符, 类别) 编成一个键，排序后相同的键连续，游程长度即该字符上标为该类别的套数
+    codes = np.concatenate([t.char_keys * n_labels + t.char_labels for t in tables])
+    codes.sort(kind="stable")
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    counts = np.diff(np.append(starts, len(codes)))
+    codes = codes[starts]
+    cells, category_of = codes // n_labels, codes % n_labels
+    del codes, starts
+    new = np.concatenate(([True], cells[1:] != cells[:-1]))
+    unit_of = np.cumsum(new) - 1
+    n_covered = int(new.sum())
+    del cells, new
+    n_units = n_covered if n_units is None else max(n_units, n_covered)
+    labelled = np.bincount(unit_of, weights=counts, minlength=n_covered)
+    squares = np.bincount(unit_of, weights=counts.astype(np.float64) ** 2, minlength=n_covered) + (n_sets - labelled) ** 2
+    scale = n_sets * (n_sets - 1)
+    p_bar = (((squares - n_sets) / scale).sum() + (n_units - n_covered)) / n_units
+    totals = np.bincount(category_of, weights=counts, minlength=n_labels) / (n_units * n_sets)
+    p_e = float((totals ** 2).sum() + (1 - totals.sum()) ** 2)
+    overall = 1.0 if p_e >= 1 else float((p_bar - p_e) / (1 - p_e))
+    labels = {}
+    for code in range(n_labels):
+        n = counts[category_of == code].astype(np.float64)
+        if not len(n):
+            continue
+        agreement = (((n ** 2 + (n_sets - n) ** 2 - n_sets) / scale).sum() + (n_units - len(n))) / n_units
+        p = n.sum() / (n_units * n_sets)
+        p_e = p ** 2 + (1 - p) ** 2
+        labels[code] = 1.0 if p_e >= 1 else float((agreement - p_e) / (1 - p_e))
+    return {"overall": overall, "labels": labels}
+
+
+def compute_agreement(annotation_sets, names=None, queries=None, rows=None):
+    # annotation_sets: 同一数据集的多套 {行号: [span]}；queries 用于统计字符总数（计算 kappa 需要未标注字符）
+    # rows 为比较范围，默认见 comparison_rows
+    if len(annotation_sets) < 2:
+        raise ValueError("至少需要两套标注")
+    names = list(names) if names else [f"标注{i + 1}" for i in range(len(annotation_sets))]
+    rows = comparison_rows(annotation_sets) if rows is None else sorted(int(idx) for idx in rows)
+    if queries is not None:
+        rows = [idx for idx in rows if 0 <= idx < len(queries)]
+    tables = [SpanTable(annotations, rows) for annotations in annotation_sets]
+    labels = SpanTable.encode(tables, "labels")
+    categories = SpanTable.encode(tables, "map_cat")
+    n_values = max(len(SpanTable.encode(tables, "map_val")), 1)
+    row_lengths, n_units = None, None
+    if queries is not None and rows:
+        lengths = np.fromiter((len(queries[idx]) if isinstance(queries[idx], str) else 0 for idx in rows),
+                              dtype=np.int64, count=len(rows))
+        row_lengths = np.zeros(rows[-1] + 1, dtype=np.int64)
+        row_lengths[rows] = lengths
+        n_units = int(lengths.sum())
+    width = max([int(t.ends.max()) for t in tables if len(t)] + [0]) + 1
+    n_labels, n_categories = max(len(labels), 1), max(len(categories), 1)
+    if (max(rows, default=0) + 1) * width * width * n_labels >= 2 ** 62:
+        raise ValueError("行号或 span 位置过大，无法编码")
+    for table in tables:
+        table.index(width, n_labels, row_lengths)
+    pairs, codes = [], []
+    for i in range(len(tables)):
+        for j in range(i + 1, len(tables)):
+            metrics, pair_codes = _compare_pair(tables[i], tables[j], width, n_labels, n_categories, n_values, n_units)
+            metrics["labels"] = {labels[code]: v for code, v in metrics["labels"].items() if code < len(labels)}
+            metrics["mapping"] = {categories[code]: v for code, v in metrics["mapping"].items()}
+            pairs.append({"a": names[i], "b": names[j], **metrics})
+            codes.append(pair_codes)
+    fleiss = _fleiss(tables, n_labels, n_units)
+    fleiss["labels"] = {labels[code]: v for code, v in fleiss["labels"].items() if code < len(labels)}
+    disagreements = _first_unique(np.concatenate(codes))[0]
+    counts = [np.bincount(t.labels, minlength=len(labels)) for t in tables]
+    support = {label: [int(c[code]) for c in counts] for code, label in enumerate(labels)}
+    return AgreementReport(names, labels, categories, len(rows), n_units, pairs, fleiss,
+                           disagreements, support, [t.invalid for t in tables])
+
+
+def _format(value):
+    return "-" if value is None else f"{value:.3f}"
+
+
+def main():
+    from utils.project import is_sqlite_project, project_paths, read_dataset
+    from utils.sqlite_store import SQLiteProject
+
+    parser = argparse.ArgumentParser(description="标注一致性：比较同一项目的多套标注，输出指标和分歧明细")
+    parser.add_argument("project", help="项目名称（提供数据和第一套标注）")
+    parser.add_argument("annotations", nargs="+", help="其他标注文件：{行号: [span]} JSON、导出的 JSONL 或 SQLite 项目")
+    parser.add_argument("--project-dir", default="data/projects", help="项目目录")
+    parser.add_argument("--no-project", action="store_true", help="不把项目自身的标注作为第一套参与比较")
+    parser.add_argument("--names", nargs="+", help="各套标注的名称，默认取文件名")
+    parser.add_argument("--rows", help="比较范围 start:end（行号，左闭右开），默认为任一套有标注的行")
+    parser.add_argument("--output", help="指标写入 JSON 文件")
+    parser.add_argument("--disagreements", help="分歧明细写入 JSONL 文件")
+    args = parser.parse_args()
+
+    paths = project_paths(args.project_dir, args.project)
+    if paths["data"] is None:
+        parser.error(f"未找到项目数据文件: {args.project}")
+    if is_sqlite_project(paths):
+        project = SQLiteProject(paths["data"])
+        queries = project.column_values("query")
+        own = project.load_versioned()[0]
+        project.close()
+    else:
+        queries = read_dataset(paths["data"])['query'].tolist()
+        own = AnnotationJournal(paths["annotations"][0]).load()
+    sets, names = [], []
+    if not args.no_project:
+        sets.append(own)
+        names.append(args.project)
+    for path in args.annotations:
+        sets.append(load_annotation_set(path))
+        names.append(os.path.splitext(os.path.basename(path))[0])
+    if args.names:
+        if len(args.names) != len(sets):
+            parser.error(f"--names 需要 {len(sets)} 个名称")
+        names = args.names
+    rows = None
+    if args.rows:
+        start, _, end = args.rows.partition(":")
+        rows = range(int(start or 0), min(int(end) if end else len(queries), len(queries)))
+    try:
+        report = compute_agreement(sets, names, queries, rows)
+    except ValueError as e:
+        parser.error(str(e))
+
+    summary = report.summary()
+    print(f"{len(sets)} 套标注，比较 {report.n_rows} 行 / {report.n_units} 个字符")
+    print(f"span 精确 F1 {_format(summary['span_exact'])}，重叠 F1 {_format(summary['span_partial'])}，"
+          f"字符 F1 {_format(summary['token_f1'])}，Cohen's kappa {_format(summary['cohen_kappa'])}，"
+          f"Fleiss' kappa {_format(summary['fleiss_kappa'])}")
+    print(f"{'标签':<10}{'精确F1':>8}{'重叠F1':>8}{'字符F1':>8}{'Cohen':>8}{'Fleiss':>8}  span 数")
+    for record in report.label_table():
+        print(f"{str(record['label']):<10}{_format(record['exact_f1']):>8}{_format(record['partial_f1']):>8}"
+              f"{_format(record['token_f1']):>8}{_format(record['cohen_kappa']):>8}{_format(record['fleiss_kappa']):>8}"
+              f"  {'/'.join(map(str, record['spans']))}")
+    for record in report.mapping_table():
+        print(f"映射 {record['category']}: {record['agreed']}/{record['compared']} 一致（{record['rate']:.1%}）")
+    counts = report.to_json()["disagreements"]
+    print(f"{counts['rows']} 行存在分歧：" + "，".join(f"{DISAGREEMENT_NAMES[k]} {n}" for k, n in counts["by_kind"].items()))
+    if args.output:
+        from utils.storage import atomic_write_json
+
+        atomic_write_json(args.output, report.to_json())
+    if args.disagreements:
+        tmp_path = f"{args.disagreements}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in report.disagreement_records(sets, queries):
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, args.disagreements)
+        print(f"分歧明细写入 {args.disagreements}")
+
+
+if __name__ == "__main__":
+    main()
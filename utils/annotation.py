@@ -1,32 +1,576 @@
 import pandas as pd
 import copy
+import functools
+import json
+import random
+from bisect import bisect_left
+
+from utils.history import EditHistory, Operation
+from utils.span_index import SpanIndex, mapping_signature
+from utils.stats import AnnotationStats, STATUS_INCOMPLETE, STATUS_NOT_STARTED, is_mapped
+from utils.status_index import RowIndex
+# utils.cluster（difflib）和 utils.columnar 只在投射标注、启用列式存储时导入
+
+
+def _span_start(span):
+    return span['start']
+
+
+def sort_spans(spans):
+    # 按起始位置排序并校验互不重叠，有重叠时返回 None
+    ordered = sorted(spans, key=_span_start)
+    for prev, cur in zip(ordered, ordered[1:]):
+        if cur['start'] < prev['end']:
+            return None
+    return ordered
+
+
+def _span_key(span):
+    return json.dumps(span, sort_keys=True, ensure_ascii=False)
+
+
+def merge_row(base, local, remote):
+    # 行级三方合并：以远端（其他会话已保存的版本）为准，叠加本地相对 base 的增删
+    # 与远端 span 重叠的本地新增无法合并，原样返回给调用方提示
+    if base is None:
+        return local, []
+    base_keys = {_span_key(s) for s in base}
+    local_keys = {_span_key(s) for s in local}
+    removed = base_keys - local_keys
+    merged = [s for s in remote if _span_key(s) not in removed]
+    merged_keys = {_span_key(s) for s in merged}
+    dropped = []
+    for span in local:
+        key = _span_key(span)
+        if key in base_keys or key in merged_keys:
+            continue
+        candidate = sort_spans(merged + [span])
+        if candidate is None:
+            dropped.append(span)
+        else:
+            merged = candidate
+            merged_keys.add(key)
+    return sorted(merged, key=_span_start), dropped
+
+
+def _drain_rows(annotations):
+    # 按行号升序逐行取出（并从原 dict 中移除）排序后的 span 列表
+    for idx in sorted(annotations, key=int):
+        anns = annotations.pop(idx)
+        anns = anns if isinstance(anns, list) else []
+        anns.sort(key=_span_start)
+        yield int(idx), anns
+
+
+def _recorded(label):
+    # 公开的修改方法整体记为一个可撤销的操作；嵌套调用（如全部采纳 -> 逐条采纳）合并为一个
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            self.history.begin(label)
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                self.history.end(self._current_row, self.suggestions.get)
+        return wrapper
+    return decorate
 
 
 class AnnotationManager:
-    def __init__(self):
+    # 每行的 span 按 start 升序保存且互不重叠，_starts 缓存对应的起始位置用于二分查找
+    # 对外传入/替换的数据在边界处深拷贝一次，内部移动不再复制
+    # 行列表写时复制：修改时生成新列表而不原地改动，旧版本可直接留作撤销历史和合并 base
+    def __init__(self, columnar=False):
+        # columnar=True 时 annotations 使用数组存储，大数据集下内存占用显著降低
+        self.columnar = columnar
+        # 列式存储按编译后的词表顺序预置映射取值表，由 set_vocab 在加载标注前设置
+        self.vocab = None
         self.annotations = {}
+        self.journal = None
+        self._dirty = set()
+        # 多会话协作：每行已知的版本号、日志读取游标、脏行修改前的内容（合并用的 base）
+        self._versions = {}
+        self._cursor = None
+        self._base = {}
+        # 与其他会话冲突、合并时被丢弃的本地 span：{行号: [span]}
+        self.conflicts = {}
+        self._starts = {}
+        self.stats = AnnotationStats()
+        self.row_index = RowIndex()
+        self.span_index = SpanIndex()
+        # 预标注建议：{行号: [span]}，采纳后才进入 annotations
+        self.suggestions = {}
+        # 行修订号：行内容每次变化都取一个新的递增值，用作预览等派生数据的缓存键
+        # 整体重新加载时只记下当前代号，未修改的行都使用它
+        self._revision_seq = 0
+        self._generation = 0
+        self._row_revisions = {}
+        # 撤销/重做历史，随会话状态保留在内存中；重新加载整份标注时清空
+        self.history = EditHistory()
 
     def initialize_annotations(self, data_len):
-        self.annotations = {i: [] for i in range(data_len)}
+        if self.columnar:
+            from utils.columnar import ColumnarAnnotationStore
+
+            self.annotations = ColumnarAnnotationStore.from_dict({data_len - 1: []} if data_len else {}, self.vocab)
+        else:
+            self.annotations = {i: [] for i in range(data_len)}
+        self._dirty = set()
+        self._base = {}
+        self._starts = {}
+        self.stats = AnnotationStats(data_len)
+        self.row_index = RowIndex(data_len)
+        self.span_index = SpanIndex()
+        self._new_generation()
+
+    def set_vocab(self, vocab):
+        self.vocab = vocab
+
+    def set_row_count(self, data_len):
+        # 数据集行数，没有标注记录的行也计入"未开始"
+        self.stats.resize(data_len)
+        self.row_index.resize(self.stats.n_rows)
 
+    def attach_journal(self, journal):
+        # 从快照+日志恢复标注，之后的修改只追加变更行
+        self.journal = journal
+        annotations, self._versions, self._cursor = journal.load_versioned()
+        self._set_all(annotations)
+        self._dirty = set()
+        self._base = {}
+
+    def import_annotations(self, annotations):
+        # 批量导入外部标注（如数据文件中的 annotations 列），只排序不做重叠校验
+        self._set_all(copy.deepcopy(annotations))
+        self._dirty.update(self.annotations)
+        self._base = {}
+
+    def _set_all(self, annotations):
+        self._starts = {}
+        if self.columnar:
+            from utils.columnar import ColumnarAnnotationStore
+
+            # 边转换边释放读入的行列表，峰值内存不是 dict 与数组两份；统计在转换时顺带累计
+            self.stats = AnnotationStats(max(self.stats.n_rows, max((int(k) for k in annotations), default=-1) + 1))
+            self.span_index = SpanIndex()
+            self.annotations = ColumnarAnnotationStore.from_rows(self._count_rows(_drain_rows(annotations)), self.vocab)
+            self.row_index.rebuild(self.stats.row_status, self.annotations)
+        else:
+            rows = {}
+            for idx, anns in annotations.items():
+                anns = anns if isinstance(anns, list) else []
+                anns.sort(key=_span_start)
+                rows[int(idx)] = anns
+            self.annotations = rows
+            self.stats.rebuild(rows, n_rows=self.stats.n_rows)
+            self.row_index.rebuild(self.stats.row_status, rows)
+            self.span_index.rebuild(rows)
+        self._new_generation()
+
+    def _count_rows(self, rows):
+        for idx, anns in rows:
+            for span in anns:
+                self.stats.add_span(idx, span)
+                self.span_index.add(idx, span)
+            yield idx, anns
+
+    def _new_generation(self):
+        self._revision_seq += 1
+        self._generation = self._revision_seq
+        self._row_revisions = {}
+        self.history.clear()
+
+    def row_revision(self, idx):
+        return self._row_revisions.get(idx, self._generation)
+
+    def changed_rows(self, versions):
+        # 相对一份 {行号: 版本号} 快照（如上次质检时）内容可能变化的行：版本号不同的行和未保存的行
+        changed = {idx for idx, version in self._versions.items() if versions.get(idx) != version}
+        changed.update(idx for idx in versions if idx not in self._versions)
+        changed.update(self._dirty)
+        return changed
+
+    def saved_versions(self):
+        # 已保存行的版本号快照；未保存的行不计入，下次比较时视为已变化
+        return {idx: version for idx, version in self._versions.items() if idx not in self._dirty}
+
+    @property
+    def revision(self):
+        # 任意一行变化都会递增，用于缓存依赖全部标注的派生结果（如检索结果）
+        return self._revision_seq
+
+    def _starts_of(self, idx):
+        starts = self._starts.get(idx)
+        if starts is None:
+            starts = [ann['start'] for ann in self.annotations.get(idx, [])]
+            self._starts[idx] = starts
+        return starts
+
+    def _insert_pos(self, idx, annotation, skip=None):
+        # 二分定位插入位置，只需检查左右相邻的 span；有重叠返回 None
+        row = self.annotations.get(idx, [])
+        starts = self._starts_of(idx)
+        pos = bisect_left(starts, annotation['start'])
+        left, right = pos - 1, pos
+        if left == skip:
+            left -= 1
+        if right == skip:
+            right += 1
+        if left >= 0 and row[left]['end'] > annotation['start']:
+            return None
+        if right < len(row) and row[right]['start'] < annotation['end']:
+            return None
+        return pos
+
+    @_recorded("添加标注")
     def add_annotation(self, idx, annotation):
         # 检查重叠
-        for ann in self.annotations.get(idx, []):
-            if not (annotation['end'] <= ann['start'] or annotation['start'] >= ann['end']):
-                return False  # 有重叠
-        self.annotations[idx].append(copy.deepcopy(annotation))
+        pos = self._insert_pos(idx, annotation)
+        if pos is None:
+            return False  # 有重叠
+        self._touch(idx)
+        stored = copy.deepcopy(annotation)
+        row, starts = list(self.annotations.get(idx, [])), list(self._starts_of(idx))
+        row.insert(pos, stored)
+        starts.insert(pos, annotation['start'])
+        self.annotations[idx] = row
+        self._starts[idx] = starts
+        self._span_added(idx, stored)
         return True
 
+    @_recorded("批量添加标注")
+    def add_annotations(self, idx, annotations):
+        # 批量新增：整批与已有标注一起校验，全部通过才写入
+        merged = sort_spans(list(self.annotations.get(idx, [])) + list(annotations))
+        if merged is None:
+            return False
+        existing = {id(ann) for ann in self.annotations.get(idx, [])}
+        self._replace_row(idx, [ann if id(ann) in existing else copy.deepcopy(ann) for ann in merged])
+        return True
+
+    @_recorded("替换标注")
+    def replace_annotations(self, idx, annotations):
+        # 整行替换，新列表需互不重叠
+        ordered = sort_spans(annotations)
+        if ordered is None:
+            return False
+        self._replace_row(idx, copy.deepcopy(ordered))
+        return True
+
+    def _replace_row(self, idx, ordered):
+        self._touch(idx)
+        self._set_row(idx, ordered)
+
+    def _set_row(self, idx, ordered):
+        for span in self.annotations.get(idx, []):
+            self._span_removed(idx, span)
+        for span in ordered:
+            self._span_added(idx, span)
+        self.annotations[idx] = ordered
+        self._starts[idx] = [ann['start'] for ann in ordered]
+
+    def _touch(self, idx):
+        # 行第一次被修改时记下修改前的内容，保存时与其他会话的版本做三方合并
+        # 行列表写时复制，修改前的版本不会再被改动，直接引用即可
+        row = self.annotations.get(idx, [])
+        self.history.touch(idx, row)
+        if idx not in self._dirty:
+            self._base[idx] = row
+            self._dirty.add(idx)
+
+    def _current_row(self, idx):
+        return self.annotations.get(idx, [])
+
     def get_annotations(self, idx):
+        # 返回内部列表（已按 start 排序），调用方只读；修改请通过 update_annotation
         return self.annotations.get(idx, [])
 
+    @_recorded("删除标注")
     def remove_annotation(self, idx, ann_idx):
         if idx in self.annotations and 0 <= ann_idx < len(self.annotations[idx]):
-            self.annotations[idx].pop(ann_idx)
+            self._touch(idx)
+            row, starts = list(self.annotations[idx]), list(self._starts_of(idx))
+            removed = row.pop(ann_idx)
+            starts.pop(ann_idx)
+            self.annotations[idx] = row
+            self._starts[idx] = starts
+            self._span_removed(idx, removed)
 
+    @_recorded("修改标注")
     def update_annotation(self, idx, ann_idx, annotation):
         if idx in self.annotations and 0 <= ann_idx < len(self.annotations[idx]):
-            self.annotations[idx][ann_idx] = copy.deepcopy(annotation)
+            old = self.annotations[idx][ann_idx]
+            stored = copy.deepcopy(annotation)
+            same_position = old['start'] == annotation['start'] and old['end'] == annotation['end']
+            # 位置变化时需要重新校验重叠并移动到新的有序位置
+            pos = None if same_position else self._insert_pos(idx, annotation, skip=ann_idx)
+            if not same_position and pos is None:
+                return False
+            self._touch(idx)
+            row = list(self.annotations[idx])
+            if same_position:
+                row[ann_idx] = stored
+            else:
+                starts = list(self._starts_of(idx))
+                row.pop(ann_idx)
+                starts.pop(ann_idx)
+                if pos > ann_idx:
+                    pos -= 1
+                row.insert(pos, stored)
+                starts.insert(pos, annotation['start'])
+                self._starts[idx] = starts
+            self.annotations[idx] = row
+            self._span_removed(idx, old)
+            self._span_added(idx, stored)
+            return True
+        return False
+
+    # 所有 span 级别的变化都经过这两个钩子，派生索引/统计在这里增量维护
+    def _span_added(self, idx, span):
+        self._revision_seq += 1
+        self._row_revisions[idx] = self._revision_seq
+        if idx >= self.row_index.n_rows:
+            self.row_index.resize(idx + 1)
+        old_status = self.stats.add_span(idx, span)
+        if old_status is not None:
+            self.row_index.set_status(idx, old_status, self.stats.status(idx))
+        self.row_index.add_label(idx, span.get('label'))
+        self.span_index.add(idx, span)
+
+    def _span_removed(self, idx, span):
+        self._revision_seq += 1
+        self._row_revisions[idx] = self._revision_seq
+        old_status = self.stats.remove_span(idx, span)
+        if old_status is not None:
+            self.row_index.set_status(idx, old_status, self.stats.status(idx))
+        self.row_index.remove_label(idx, span.get('label'))
+        self.span_index.remove(idx, span)
+
+    @_recorded("传播映射")
+    def propagate_mapping(self, text, label, mapped_value, overwrite=False):
+        # 把映射应用到全部文本和标签相同的 span，受影响的行一起标记为变更，保存时一次追加写入
+        # overwrite=False 时跳过已有其他映射的 span；返回更新的 span 数
+        signature = mapping_signature(mapped_value)
+        updated = 0
+        for idx in self.span_index.rows_of(text, label):
+            row, changed = [], False
+            for span in self.annotations.get(idx, []):
+                if (span.get('text') == text and span.get('label') == label
+                        and mapping_signature(span.get('mapped_value')) != signature
+                        and (overwrite or not is_mapped(span))):
+                    span = dict(span, mapped_value=copy.deepcopy(mapped_value))
+                    changed = True
+                    updated += 1
+                row.append(span)
+            if changed:
+                self._replace_row(idx, row)
+        return updated
+
+    @_recorded("投射簇标注")
+    def project_annotations(self, source_idx, source_query, targets, overwrite=False):
+        # 把 source_idx 行的标注按位置对齐后投射到 targets 中的各行 [(行号, query)]，如近重复簇的其他成员
+        # overwrite=False 时跳过已有标注的行；受影响的行一起标记为变更，保存时一次追加写入；返回写入的行号
+        from utils.cluster import align_spans
+
+        spans = self.annotations.get(source_idx, [])
+        written = []
+        if not spans:
+            return written
+        for idx, query in targets:
+            if idx == source_idx or (self.annotations.get(idx) and not overwrite):
+                continue
+            aligned = align_spans(source_query, spans, query)
+            if aligned:
+                self._replace_row(idx, aligned)
+                written.append(idx)
+        return written
+
+    def undo(self):
+        # 撤销最近一次操作，返回受影响的行号
+        # 撤销与普通修改一样标记脏行，由 save() 按行追加到日志，磁盘上的版本与内存保持一致
+        op = self.history.pop_undo()
+        if op is None:
+            return []
+        self.history.push_redo(self._apply_history(op, reverse=True))
+        return sorted(op.rows)
+
+    def redo(self):
+        op = self.history.pop_redo()
+        if op is None:
+            return []
+        self.history.push_undo(self._apply_history(op, reverse=False))
+        return sorted(op.rows)
+
+    def _apply_history(self, op, reverse):
+        # 把各行从 after 恢复为 before（撤销）或反之（重做），返回反向操作
+        # 操作之后该行又被修改过（如同步到其他会话的保存）时，只撤销/重做本操作带来的增删
+        # 预标注建议一并恢复；建议在操作之后被重新生成过时以新的为准，不再改动
+        suggestions = {}
+        for idx, (before, after) in op.suggestions.items():
+            src, dst = (after, before) if reverse else (before, after)
+            current = self.suggestions.get(idx)
+            if current is src or current == src:
+                self._set_suggestions(idx, dst)
+                suggestions[idx] = (dst, current) if reverse else (current, dst)
+        applied = {}
+        for idx, (before, after) in op.rows.items():
+            src, dst = (after, before) if reverse else (before, after)
+            current = self.annotations.get(idx, [])
+            if current is src or current == src:
+                target = dst
+            else:
+                target, dropped = merge_row(src, dst, current)
+                if dropped:
+                    self.conflicts.setdefault(idx, []).extend(dropped)
+            self._replace_row(idx, target)
+            applied[idx] = (target, current) if reverse else (current, target)
+        return Operation(op.label, applied, suggestions)
+
+    def suggest_mapping(self, text, label):
+        return self.span_index.suggest(text, label)
+
+    def get_row_status(self, idx):
+        return self.stats.status(idx)
+
+    def next_row(self, idx, status=None, label=None, wrap=True, lo=0, hi=None):
+        # 当前行之后第一条满足条件的行（按状态或包含某标签），没有则返回 None
+        # lo/hi 把查找限制在 [lo, hi) 内，例如当前领取的任务批次
+        return self.row_index.rows(status, label).next_after(idx, wrap, lo, hi)
+
+    def prev_row(self, idx, status=None, label=None, wrap=True, lo=0, hi=None):
+        return self.row_index.rows(status, label).prev_before(idx, wrap, lo, hi)
+
+    def next_unfinished(self, idx, wrap=True, lo=0, hi=None):
+        # 未开始和映射未完成中离当前行最近的下一条
+        candidates = [self.next_row(idx, status, wrap=False, lo=lo, hi=hi) for status in (STATUS_NOT_STARTED, STATUS_INCOMPLETE)]
+        candidates = [c for c in candidates if c is not None]
+        if candidates:
+            return min(candidates)
+        if not wrap:
+            return None
+        candidates = [self.next_row(lo - 1, status, wrap=False, lo=lo, hi=hi) for status in (STATUS_NOT_STARTED, STATUS_INCOMPLETE)]
+        candidates = [c for c in candidates if c is not None]
+        return min(candidates) if candidates else None
+
+    def count_unfinished(self, lo=0, hi=None):
+        hi = self.row_index.n_rows if hi is None else hi
+        return sum(self.row_index.rows(status).count_in(lo, hi) for status in (STATUS_NOT_STARTED, STATUS_INCOMPLETE))
+
+    def sample_unfinished(self, k=1, rng=None, lo=0, hi=None):
+        # 在 [lo, hi) 内未完成的行中均匀随机抽样
+        rng = rng or random
+        hi = self.row_index.n_rows if hi is None else hi
+        sets = [self.row_index.rows(status) for status in (STATUS_NOT_STARTED, STATUS_INCOMPLETE)]
+        counts = [fs.count_in(lo, hi) for fs in sets]
+        picks = []
+        for p in rng.sample(range(sum(counts)), min(k, sum(counts))):
+            for fs, n in zip(sets, counts):
+                if p < n:
+                    picks.append(fs.select(fs.rank(lo) + p))
+                    break
+                p -= n
+        return picks
+
+    def sync(self):
+        # 增量拾取其他会话保存的行：未修改的行直接替换，本地也改过的行做三方合并
+        # 返回被更新的行号
+        if self.journal is None:
+            return []
+        try:
+            changes, versions, cursor = self.journal.changes_since(self._cursor)
+        except Exception as e:
+            # 增量读取失败时退回完整加载，已处理过的行按版本号跳过，不会让之后的保存一直失败
+            print(f"[WARN] 增量同步失败，改为完整加载: {e}")
+            changes, versions, cursor = self.journal.load_versioned()
+        updated = []
+        # 按版本号遍历：整体覆盖后变为空的行在 changes 中可能没有记录
+        # 游标在全部应用后才前移；中途出错时下次重读，已应用的行版本号已更新会被跳过
+        for idx, version in versions.items():
+            if version <= self._versions.get(idx, 0):
+                continue
+            remote = changes.get(idx)
+            remote = remote if isinstance(remote, list) else []
+            if idx in self._dirty:
+                merged, dropped = merge_row(self._base.get(idx), self.annotations.get(idx, []), remote)
+                self._base[idx] = copy.deepcopy(remote)
+                if dropped:
+                    self.conflicts.setdefault(idx, []).extend(dropped)
+                remote = merged
+            self._set_row(idx, sorted(remote, key=_span_start))
+            self._versions[idx] = version
+            updated.append(idx)
+        self._cursor = cursor
+        return updated
+
+    def save(self, on_written=None):
+        # 只把变更过的行写入日志，保存耗时与项目大小无关
+        # 加锁后先追上其他会话的修改并按行合并，再追加，保证不会覆盖别人的工作
+        # on_written 在释放写锁前调用：此时存储中的内容与内存一致，调用方可记下文件签名
+        if self.journal is None or not self._dirty:
+            return
+        with self.journal.locked():
+            self.sync()
+            versions = self.journal.append({idx: self.annotations.get(idx, []) for idx in sorted(self._dirty)})
+            self._versions.update(versions)
+            self._dirty.clear()
+            self._base.clear()
+            if self.journal.needs_compaction():
+                self.journal.compact(self.annotations, self._versions)
+            if on_written is not None:
+                on_written()
+        if self.columnar and self.annotations.needs_compaction():
+            self.annotations.compact()
+
+    def _overlaps(self, idx, annotation):
+        return self._insert_pos(idx, annotation) is None
+
+    def merge_suggestions(self, suggestions, replace=False):
+        # 合并预标注建议，与已有标注重叠的建议直接丢弃
+        if replace:
+            self.suggestions = {}
+        for idx, spans in suggestions.items():
+            idx = int(idx)
+            pending = [s for s in spans if not self._overlaps(idx, s)]
+            if pending:
+                self.suggestions[idx] = pending
+            else:
+                self.suggestions.pop(idx, None)
+
+    def get_suggestions(self, idx):
+        return self.suggestions.get(idx, [])
+
+    @_recorded("采纳建议")
+    def accept_suggestion(self, idx, s_idx):
+        pending = self.suggestions.get(idx, [])
+        if not 0 <= s_idx < len(pending):
+            return False
+        suggestion = pending[s_idx]
+        annotation = {k: suggestion[k] for k in ('text', 'label', 'start', 'end', 'mapped_value')}
+        result = self.add_annotation(idx, annotation)
+        self.discard_suggestion(idx, s_idx)
+        return result
+
+    @_recorded("全部采纳建议")
+    def accept_all_suggestions(self, idx):
+        accepted = 0
+        while self.suggestions.get(idx):
+            if self.accept_suggestion(idx, 0):
+                accepted += 1
+        return accepted
+
+    def discard_suggestion(self, idx, s_idx):
+        # 忽略的建议只在当前会话内移除，重新生成预标注时会再次出现
+        # 建议列表同样写时复制，采纳建议被撤销时恢复原列表
+        pending = self.suggestions.get(idx, [])
+        if 0 <= s_idx < len(pending):
+            self.history.touch_suggestions(idx, self.suggestions.get(idx))
+            self._set_suggestions(idx, pending[:s_idx] + pending[s_idx + 1:])
+
+    def _set_suggestions(self, idx, pending):
+        if pending:
+            self.suggestions[idx] = pending
+        else:
+            self.suggestions.pop(idx, None)
 
     def get_annotation_count(self):
         return sum(1 for anns in self.annotations.values() if anns)
@@ -37,5 +581,5 @@ class AnnotationManager:
         export_df['annotations'] = export_df.index.map(
             lambda idx: self.annotations.get(idx, [])
         ).map(lambda x: x if x else [])
-        export_df['annotations'] = export_df['annotations'].apply(lambda x: str(x))
+        export_df['annotations'] = export_df['annotations'].apply(lambda x: json.dumps(x, ensure_ascii=False))
         return export_df
\ No newline at end of file
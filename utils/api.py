@@ -0,0 +1,383 @@
+import argparse
+import asyncio
+import functools
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, quote
+
+from utils.export import EXPORT_FORMATS
+from utils.service import AnnotationService
+
+# 请求体上限，批量写入 1000 行、每行若干 span 远小于该值
+MAX_BODY_BYTES = 64 * 1024 * 1024
+# 单次读取的最大行数
+MAX_PAGE_ROWS = 1000
+EXPORT_CHUNK_BYTES = 1 << 16
+
+ROUTES = []
+
+
+def route(method, pattern):
+    # 路径中的 {name} 匹配一段不含 / 的参数
+    regex = re.compile("^" + re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", pattern) + "$")
+
+    def register(handler):
+        ROUTES.append((method, regex, handler))
+        return handler
+    return register
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    def __init__(self, method, params, query, body):
+        self.method = method
+        self.params = params
+        self.query = query
+        self.body = body
+
+    def int_param(self, key):
+        try:
+            return int(self.params[key])
+        except ValueError:
+            raise HTTPError(400, f"参数 {key} 必须是整数")
+
+    def arg(self, key, default=None, cast=str):
+        values = self.query.get(key)
+        if not values:
+            return default
+        try:
+            return cast(values[0])
+        except ValueError:
+            raise HTTPError(400, f"查询参数 {key} 格式错误")
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            raise HTTPError(400, "请求体不是合法的 JSON")
+
+
+class FileResponse:
+    # 流式发送文件，发送完成后按需删除（导出用的临时文件）
+    def __init__(self, path, media_type, filename, delete=False):
+        self.path = path
+        self.media_type = media_type
+        self.filename = filename
+        self.delete = delete
+
+
+class AnnotationAPI:
+    # 标注服务的 ASGI 应用：事件循环只负责收发，阻塞的存储操作放到线程池中执行
+    # 打开的项目在 AnnotationService 中复用，多个界面副本/导入任务可以共用同一个后端
+    def __init__(self, service=None, workers=8):
+        self.service = service or AnnotationService()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ner-api")
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self):
+        self.service.close()
+        self.executor.shutdown(wait=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        try:
+            handler, params = self._match(scope["method"], scope["path"])
+            body = await self._read_body(receive)
+            query = parse_qs(scope.get("query_string", b"").decode("utf-8"))
+            result = await handler(self, Request(scope["method"], params, query, body))
+        except HTTPError as e:
+            await self._send_json(send, e.status, {"error": e.message})
+            return
+        except (FileNotFoundError, IndexError) as e:
+            await self._send_json(send, 404, {"error": str(e)})
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            await self._send_json(send, 400, {"error": str(e)})
+            return
+        except Exception as e:
+            print(f"[ERROR] {scope['method']} {scope['path']} 失败: {e}")
+            await self._send_json(send, 500, {"error": "服务器内部错误"})
+            return
+        if isinstance(result, FileResponse):
+            await self._send_file(send, result)
+        else:
+            status, payload = result if isinstance(result, tuple) else (200, result)
+            await self._send_json(send, status, payload)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.run(self.service.close)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _match(self, method, path):
+        allowed = False
+        for route_method, regex, handler in ROUTES:
+            m = regex.match(path)
+            if m:
+                if route_method == method:
+                    return handler, m.groupdict()
+                allowed = True
+        if allowed:
+            raise HTTPError(405, f"不支持的方法: {method}")
+        raise HTTPError(404, f"路径不存在: {path}")
+
+    async def _read_body(self, receive):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise HTTPError(413, "请求体过大")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _send_json(self, send, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json; charset=utf-8"),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_file(self, send, response):
+        try:
+            disposition = f"attachment; filename*=UTF-8''{quote(response.filename, safe='')}"
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", response.media_type.encode()),
+                                    (b"content-length", str(os.path.getsize(response.path)).encode()),
+                                    (b"content-disposition", disposition.encode())]})
+            with open(response.path, "rb") as f:
+                while True:
+                    chunk = await self.run(f.read, EXPORT_CHUNK_BYTES)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": bool(chunk)})
+                    if not chunk:
+                        break
+        finally:
+            if response.delete:
+                os.remove(response.path)
+
+
+def _json_default(value):
+    # numpy 标量等
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _spans(payload):
+    if not isinstance(payload, list) or not all(isinstance(span, dict) for span in payload):
+        raise HTTPError(400, "spans 必须是对象列表")
+    for span in payload:
+        missing = [k for k in ('text', 'label', 'start', 'end') if k not in span]
+        if missing:
+            raise HTTPError(400, f"span 缺少字段: {', '.join(missing)}")
+    return payload
+
+
+@route("GET", "/projects")
+async def list_projects(api, request):
+    return {"projects": await api.run(api.service.list_projects)}
+
+
+@route("GET", "/projects/{name}/stats")
+async def project_stats(api, request):
+    return await api.run(api.service.stats, request.params["name"])
+
+
+@route("GET", "/projects/{name}/rows")
+async def get_rows(api, request):
+    offset = request.arg("offset", 0, int)
+    limit = min(request.arg("limit", 100, int), MAX_PAGE_ROWS)
+    return {"rows": await api.run(api.service.get_rows, request.params["name"], offset, limit)}
+
+
+@route("GET", "/projects/{name}/rows/{row}")
+async def get_row(api, request):
+    return await api.run(api.service.get_row, request.params["name"], request.int_param("row"))
+
+
+@route("PUT", "/projects/{name}/rows/{row}/spans")
+async def replace_spans(api, request):
+    row = request.int_param("row")
+    spans = _spans((request.json() or {}).get("spans"))
+    result = await api.run(api.service.write_rows, request.params["name"], {row: spans})
+    if result["rejected"]:
+        raise HTTPError(409, "标注重叠或行号无效")
+    return await api.run(api.service.get_row, request.params["name"], row)
+
+
+@route("POST", "/projects/{name}/rows/{row}/spans")
+async def add_span(api, request):
+    row = request.int_param("row")
+    span = _spans([request.json()])[0]
+    if not await api.run(api.service.add_span, request.params["name"], row, span):
+        raise HTTPError(409, "标注重叠或无效")
+    return 201, await api.run(api.service.get_row, request.params["name"], row)
+
+
+@route("PATCH", "/projects/{name}/rows/{row}/spans/{span}")
+async def update_span(api, request):
+    row, span_idx = request.int_param("row"), request.int_param("span")
+    fields = request.json()
+    if not isinstance(fields, dict):
+        raise HTTPError(400, "请求体必须是对象")
+    if not await api.run(api.service.update_span, request.params["name"], row, span_idx, fields):
+        raise HTTPError(409, "标注重叠或无效")
+    return await api.run(api.service.get_row, request.params["name"], row)
+
+
+@route("DELETE", "/projects/{name}/rows/{row}/spans/{span}")
+async def remove_span(api, request):
+    row = request.int_param("row")
+    await api.run(api.service.remove_span, request.params["name"], row, request.int_param("span"))
+    return await api.run(api.service.get_row, request.params["name"], row)
+
+
+@route("POST", "/projects/{name}/spans/batch")
+async def write_spans_batch(api, request):
+    # {"rows": {"行号": [span, ...]}, "mode": "replace" | "add"}，整批只加锁、保存一次
+    payload = request.json() or {}
+    rows = payload.get("rows")
+    if not isinstance(rows, dict):
+        raise HTTPError(400, "rows 必须是 {行号: [span]} 对象")
+    mode = payload.get("mode", "replace")
+    if mode not in ("replace", "add"):
+        raise HTTPError(400, "mode 只能是 replace 或 add")
+    rows = {int(idx): _spans(spans) for idx, spans in rows.items()}
+    return await api.run(api.service.write_rows, request.params["name"], rows, replace=mode == "replace")
+
+
+@route("GET", "/projects/{name}/search")
+async def search_rows(api, request):
+    # ?q=检索式&offset=&limit=，只返回行号，行内容用 /rows/{row} 读取
+    offset = request.arg("offset", 0, int)
+    limit = min(request.arg("limit", 100, int), MAX_PAGE_ROWS)
+    return await api.run(api.service.search, request.params["name"], request.arg("q", ""), offset, limit)
+
+
+@route("GET", "/projects/{name}/rows/{row}/cluster")
+async def get_cluster(api, request):
+    cluster = await api.run(api.service.cluster_members, request.params["name"], request.int_param("row"))
+    if cluster is None:
+        raise HTTPError(404, "项目尚未聚类")
+    return cluster
+
+
+@route("POST", "/projects/{name}/rows/{row}/cluster/project")
+async def project_cluster(api, request):
+    # {"overwrite": false}：把该行标注投射到同簇其他行
+    overwrite = bool((request.json() or {}).get("overwrite"))
+    written = await api.run(api.service.project_cluster, request.params["name"], request.int_param("row"), overwrite)
+    return {"updated": written}
+
+
+@route("POST", "/projects/{name}/lint")
+async def lint_project(api, request):
+    # {"full": false}：增量质检，返回汇总；明细用 /rows/{row}/issues 或检索式 issue: 查询
+    full = bool((request.json() or {}).get("full"))
+    return await api.run(api.service.lint, request.params["name"], full)
+
+
+@route("GET", "/projects/{name}/rows/{row}/issues")
+async def get_row_issues(api, request):
+    issues = await api.run(api.service.row_issues, request.params["name"], request.int_param("row"))
+    if issues is None:
+        raise HTTPError(404, "项目尚未质检")
+    return {"issues": issues}
+
+
+@route("POST", "/projects/{name}/mappings/propagate")
+async def propagate_mapping(api, request):
+    payload = request.json() or {}
+    updated = await api.run(api.service.propagate_mapping, request.params["name"], payload["text"],
+                            payload["label"], payload["mapped_value"], bool(payload.get("overwrite")))
+    return {"updated": updated}
+
+
+@route("GET", "/projects/{name}/mappings/suggest")
+async def suggest_mapping(api, request):
+    suggestion = await api.run(api.service.suggest_mapping, request.params["name"],
+                               request.arg("text", ""), request.arg("label", ""))
+    if suggestion is None:
+        return {"mapped_value": None, "count": 0}
+    return {"mapped_value": suggestion[0], "count": suggestion[1]}
+
+
+@route("GET", "/projects/{name}/vocab/{category}")
+async def find_mappings(api, request):
+    candidates = await api.run(api.service.find_mappings, request.params["name"], request.arg("text", ""),
+                               request.params["category"], request.arg("top_k", 20, int))
+    return {"candidates": candidates}
+
+
+@route("POST", "/projects/{name}/vocab/{category}")
+async def add_vocab_term(api, request):
+    term = (request.json() or {}).get("term")
+    if not isinstance(term, str) or not term.strip():
+        raise HTTPError(400, "term 不能为空")
+    added = await api.run(api.service.add_vocab_term, request.params["name"], request.params["category"], term.strip())
+    return (201 if added else 200), {"added": added}
+
+
+@route("GET", "/projects/{name}/export")
+async def export_project(api, request):
+    # 先分块写出到临时文件再流式发送，大项目也不会整份放进内存
+    name, fmt = request.params["name"], request.arg("format", "jsonl")
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPError(400, f"不支持的导出格式: {fmt}")
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        await api.run(api.service.export, name, fmt, path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return FileResponse(path, EXPORT_FORMATS[fmt][1], f"{name}_annotations.{fmt}", delete=True)
+
+
+def create_app(project_dir=None, workers=8):
+    project_dir = project_dir or os.environ.get("NER_PROJECT_DIR", "data/projects")
+    return AnnotationAPI(AnnotationService(project_dir), workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="标注服务 HTTP 接口（ASGI）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--project-dir", default="data/projects", help="项目目录")
+    parser.add_argument("--workers", type=int, default=8, help="执行存储操作的线程数")
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        raise ImportError("运行 HTTP 服务需要安装 uvicorn")
+    uvicorn.run(create_app(args.project_dir, args.workers), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
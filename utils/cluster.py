@@ -0,0 +1,301 @@
+import argparse
+import copy
+import difflib
+import functools
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+# 字符 shingle 的多项式哈希取模 P = 2^31 - 1，中间乘积不超出 int64
+_PRIME = (1 << 31) - 1
+_BASE = 1000003
+
+
+def normalize_query(text):
+    # 精确去重的键：全角/半角、大小写统一，连续空白合并
+    if not isinstance(text, str):
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def fold_chars(text):
+    # 逐字符规范化并保持长度不变，对齐后的位置可直接映射回原文
+    out = []
+    for c in text:
+        folded = unicodedata.normalize("NFKC", c).casefold()
+        out.append(folded if len(folded) == 1 else c)
+    return "".join(out)
+
+
+def _shingle_hashes(texts, k):
+    # 所有文本的字符 k-shingle 哈希（去掉空白后切分，"macbook pro" 与 "macbookpro" 相同）
+    # 返回 (哈希数组, 每个文本第一个 shingle 的位置)；短于 k 的文本整体作为一个 shingle
+    texts = [t.replace(" ", "") or " " for t in texts]
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    ends = np.cumsum(lengths)
+    n_shingles = np.maximum(lengths - k + 1, 1)
+    # 每个 shingle 的起点：文本起点 + 0..n_shingles-1
+    text_starts = ends - lengths
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(n_shingles, out=offsets[1:])
+    starts = np.repeat(text_starts, n_shingles) + (np.arange(offsets[-1]) - np.repeat(offsets[:-1], n_shingles))
+    # 短文本只取已有的字符，越界位置按 0 处理
+    text_ends = np.repeat(ends, n_shingles)
+    hashes = np.zeros(len(starts), dtype=np.int64)
+    for j in range(k):
+        pos = starts + j
+        valid = pos < text_ends
+        hashes = (hashes * _BASE + np.where(valid, codes[np.minimum(pos, len(codes) - 1)] + 1, 0)) % _PRIME
+    return hashes, offsets[:-1]
+
+
+def minhash_signatures(texts, num_perm=64, shingle=2, seed=0, batch=1 << 16):
+    # 每个文本的 MinHash 签名 (len(texts), num_perm)，两行签名相同位置相等的比例估计 shingle 集合的 Jaccard 相似度
+    # 第 i 个哈希函数为乘移位哈希 ((a_i * x + b_i) mod 2^64) >> 32，a_i 为奇数，只用整数乘加、不需要取模
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    hashes, starts = _shingle_hashes(texts, shingle)
+    hashes = hashes.astype(np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+    bounds = np.append(starts, len(hashes))
+    # 按文本分批，每批的 (shingle 数, num_perm) 中间矩阵控制在 batch 行左右
+    lo = 0
+    while lo < len(texts):
+        hi = max(int(np.searchsorted(bounds, bounds[lo] + batch, side="right")) - 1, lo + 1)
+        hi = min(hi, len(texts))
+        chunk = hashes[bounds[lo]:bounds[hi]]
+        # (num_perm, shingle 数) 按行连续存放，沿 axis=1 分段取最小值更快
+        values = ((a[:, None] * chunk[None, :] + b[:, None]) >> np.uint64(32)).astype(np.uint32)
+        signatures[lo:hi] = np.minimum.reduceat(values, bounds[lo:hi] - bounds[lo], axis=1).T
+        lo = hi
+    return signatures
+
+
+def _signature_chunk(texts, num_perm, shingle, seed):
+    return minhash_signatures(texts, num_perm, shingle, seed)
+
+
+def _components(n, left, right):
+    # 无向图 (left[i], right[i]) 的连通分量，返回每个点所在分量的最小点号
+    labels = np.arange(n, dtype=np.int64)
+    while True:
+        low = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, low)
+        np.minimum.at(updated, right, low)
+        # 指针跳跃，把链压平
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def lsh_pairs(signatures, bands, threshold):
+    # LSH 分段分桶：任一段签名完全相同的两行成为候选，再按签名估计的相似度过滤
+    # 每个桶只与桶内第一行比较，候选数与行数同阶
+    n, num_perm = signatures.shape
+    rows_per_band = num_perm // bands
+    left, right = [], []
+    for band in range(bands):
+        part = signatures[:, band * rows_per_band:(band + 1) * rows_per_band].astype(np.int64)
+        keys = np.zeros(n, dtype=np.int64)
+        for col in range(rows_per_band):
+            keys = keys * _BASE + part[:, col]
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        if n < 2:
+            continue
+        same = sorted_keys[1:] == sorted_keys[:-1]
+        if not same.any():
+            continue
+        # 每个位置所在桶的第一行
+        group_start = np.maximum.accumulate(np.where(np.r_[True, ~same], np.arange(n), 0))
+        members = np.flatnonzero(np.r_[False, same])
+        left.append(order[group_start[members]])
+        right.append(order[members])
+    if not left:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    left, right = np.concatenate(left), np.concatenate(right)
+    pairs = np.minimum(left, right) * n + np.maximum(left, right)
+    pairs.sort()
+    pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+    left, right = pairs // n, pairs % n
+    keep = np.empty(len(left), dtype=bool)
+    for lo in range(0, len(left), 1 << 16):
+        hi = lo + (1 << 16)
+        keep[lo:hi] = (signatures[left[lo:hi]] == signatures[right[lo:hi]]).mean(axis=1) >= threshold
+    return left[keep], right[keep]
+
+
+def cluster_queries(queries, threshold=0.7, num_perm=64, bands=16, shingle=2, seed=0,
+                    workers=1, chunk_size=50000):
+    # 返回每行所在簇的代表行号（int64 数组）
+    # 先按规范化文本精确去重，只对不同的文本计算 MinHash；LSH 候选对按估计相似度 >= threshold 连边求连通分量
+    # 代表行取簇内出现次数最多的写法的第一行
+    if num_perm % bands:
+        raise ValueError("num_perm 必须是 bands 的整数倍")
+    keys = [normalize_query(q) for q in queries]
+    unique, inverse, first_row, counts = {}, np.empty(len(keys), dtype=np.int64), [], []
+    for idx, key in enumerate(keys):
+        uid = unique.get(key)
+        if uid is None:
+            uid = unique[key] = len(first_row)
+            first_row.append(idx)
+            counts.append(0)
+        counts[uid] += 1
+        inverse[idx] = uid
+    texts = list(unique)
+    compute = functools.partial(_signature_chunk, num_perm=num_perm, shingle=shingle, seed=seed)
+    if workers and workers > 1 and len(texts) > chunk_size:
+        # 进程池会加载 multiprocessing，标注界面只用到对齐函数，用到时再导入
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            signatures = np.concatenate(list(pool.map(compute, chunks)))
+    else:
+        signatures = compute(texts)
+    left, right = lsh_pairs(signatures, bands, threshold)
+    component = _components(len(texts), left, right)
+    # 空 query 各自成簇，不与其他空行合并成一个大簇
+    if "" in unique:
+        component[unique[""]] = unique[""]
+    first_row, counts = np.asarray(first_row, dtype=np.int64), np.asarray(counts, dtype=np.int64)
+    order = np.lexsort((first_row, -counts, component))
+    is_head = np.r_[True, component[order][1:] != component[order][:-1]]
+    heads = np.repeat(order[is_head], np.diff(np.r_[np.flatnonzero(is_head), len(order)]))
+    representative = np.empty(len(texts), dtype=np.int64)
+    representative[order] = first_row[heads]
+    labels = representative[inverse]
+    if "" in unique:
+        empty = inverse == unique[""]
+        labels[empty] = np.flatnonzero(empty)
+    return labels
+
+
+class QueryClusters:
+    # 聚类结果：labels[行号] = 所在簇的代表行号；按代表行号排序的 CSR 用于取簇成员
+    def __init__(self, labels):
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self._order = np.argsort(self.labels, kind="stable")
+        sorted_labels = self.labels[self._order]
+        # 排序后相邻比较取各簇起点（比 np.unique 快）
+        starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]]) if len(sorted_labels) else \
+            np.zeros(0, dtype=np.int64)
+        self._reps = sorted_labels[starts]
+        self._starts = starts
+        self._sizes = np.diff(np.r_[starts, len(sorted_labels)])
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def n_clusters(self):
+        return len(self._reps)
+
+    def representative(self, idx):
+        return int(self.labels[idx])
+
+    def is_representative(self, idx):
+        return int(self.labels[idx]) == idx
+
+    def representatives(self):
+        # 所有簇的代表行（升序），只浏览这些行即可覆盖全部不同意图
+        return self._reps
+
+    def _slot(self, idx):
+        return int(np.searchsorted(self._reps, self.labels[idx]))
+
+    def size(self, idx):
+        return int(self._sizes[self._slot(idx)])
+
+    def members(self, idx):
+        # idx 所在簇的全部行号（升序，含 idx 本身）
+        slot = self._slot(idx)
+        start = self._starts[slot]
+        return self._order[start:start + self._sizes[slot]]
+
+    def sizes(self):
+        # 每行所在簇的大小
+        return self._sizes[np.searchsorted(self._reps, self.labels)]
+
+    def to_json(self, **params):
+        return {"params": params, "labels": self.labels.tolist()}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["labels"])
+
+
+def _map_offset(blocks, pos, end=False):
+    # 按 SequenceMatcher 的相同片段把源文本位置映射到目标文本，位置落在改动区域时返回 None
+    for a, b, size in blocks:
+        if a <= pos < a + size or (end and a < pos <= a + size):
+            return b + pos - a
+    return None
+
+
+def align_spans(source_query, spans, target_query):
+    # 把源 query 上的标注按位置对齐到目标 query：先按字符对齐映射起止位置，
+    # 映射后的文本与原文本不一致时在目标中找离原位置最近的同文本出现；找不到的标注跳过
+    if source_query == target_query:
+        return copy.deepcopy(spans)
+    source, target = fold_chars(source_query), fold_chars(target_query)
+    blocks = difflib.SequenceMatcher(None, source, target, autojunk=False).get_matching_blocks()
+    aligned, taken = [], bytearray(len(target_query))
+    for span in sorted(spans, key=lambda s: s['start']):
+        text = fold_chars(span['text'])
+        start, end = _map_offset(blocks, span['start']), _map_offset(blocks, span['end'], end=True)
+        if start is None or end is None or target[start:end] != text:
+            found = [m.start() for m in re.finditer(re.escape(text), target)] if text else []
+            if not found:
+                continue
+            start = min(found, key=lambda p: abs(p - span['start']))
+            end = start + len(text)
+        if any(taken[start:end]):
+            continue
+        taken[start:end] = b"\x01" * (end - start)
+        aligned.append(dict(copy.deepcopy(span), text=target_query[start:end], start=start, end=end))
+    aligned.sort(key=lambda s: s['start'])
+    return aligned
+
+
+def main():
+    from utils.project import is_sqlite_project, project_paths, read_dataset
+    from utils.sqlite_store import SQLiteProject
+    from utils.storage import atomic_write_json
+
+    parser = argparse.ArgumentParser(description="对项目的 query 做近重复聚类，结果写入 项目名_clusters.json")
+    parser.add_argument("project", help="项目名称")
+    parser.add_argument("--project-dir", default="data/projects", help="项目目录")
+    parser.add_argument("--threshold", type=float, default=0.7, help="归为同一簇的最低相似度（字符 shingle 的 Jaccard）")
+    parser.add_argument("--num-perm", type=int, default=64, help="MinHash 签名长度")
+    parser.add_argument("--bands", type=int, default=16, help="LSH 分段数")
+    parser.add_argument("--shingle", type=int, default=2, help="字符 shingle 长度")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="计算签名的进程数")
+    args = parser.parse_args()
+
+    paths = project_paths(args.project_dir, args.project)
+    if paths["data"] is None:
+        parser.error(f"未找到项目数据文件: {args.project}")
+    if is_sqlite_project(paths):
+        queries = SQLiteProject(paths["data"]).column_values("query")
+    else:
+        queries = read_dataset(paths["data"])['query'].tolist()
+    params = {"threshold": args.threshold, "num_perm": args.num_perm, "bands": args.bands, "shingle": args.shingle}
+    clusters = QueryClusters(cluster_queries(queries, workers=args.workers, **params))
+    atomic_write_json(paths["clusters"], clusters.to_json(**params))
+    multi = int((clusters._sizes > 1).sum())
+    print(f"{len(queries)} 条数据归为 {clusters.n_clusters} 个簇（{multi} 个簇含多条），写入 {paths['clusters']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import copy
+from collections.abc import MutableMapping
+
+import numpy as np
+
+SPAN_KEYS = ('text', 'label', 'start', 'end', 'mapped_value')
+# overlay 超过该行数（且超过总行数的 1/8）时需要 compact
+COMPACT_MIN_ROWS = 10000
+# 映射项取值为该值时表示类别存在但没有取值（如 {"品牌": []}），读回时保留空列表
+EMPTY_VALUE = -1
+
+
+class StringTable:
+    # 字符串驻留表：字符串 <-> 连续整数 id
+    def __init__(self, strings=()):
+        self.strings = []
+        self._ids = {}
+        for s in strings:
+            self.intern(s)
+
+    def intern(self, s):
+        sid = self._ids.get(s)
+        if sid is None:
+            sid = len(self.strings)
+            self._ids[s] = sid
+            self.strings.append(s)
+        return sid
+
+    def __len__(self):
+        return len(self.strings)
+
+
+def _is_plain_span(span):
+    # 只有标准字段且 mapped_value 为 {类别: [字符串]} 的 span 才能列式存储
+    if not isinstance(span, dict) or set(span) - set(SPAN_KEYS):
+        return False
+    if not all(k in span for k in ('text', 'label', 'start', 'end')):
+        return False
+    if not isinstance(span['text'], str) or not isinstance(span['label'], str):
+        return False
+    mapped = span.get('mapped_value', {})
+    if not isinstance(mapped, dict):
+        return False
+    return all(isinstance(v, list) and all(isinstance(x, str) for x in v) for v in mapped.values())
+
+
+class ColumnarAnnotationStore(MutableMapping):
+    # 列式标注存储，可直接替换 AnnotationManager.annotations 的 dict：
+    #   row_ptr[i]:row_ptr[i+1] 为第 i 行的 span 区间（CSR）
+    #   starts/ends/label_ids/text_ids 为 span 列，标签与文本驻留为 id
+    #   map_ptr[j]:map_ptr[j+1] 为第 j 个 span 的映射项，map_cat/map_val 为类别与取值 id（空类别占一项，取值为 EMPTY_VALUE）
+    # 被修改的行物化为 dict 列表放在 _overlay 中，compact() 时再折叠回数组
+    def __init__(self, vocab=None):
+        self.labels = StringTable()
+        self.texts = StringTable()
+        self.categories = StringTable()
+        # 取值表按词表顺序预置，映射值即词表下标
+        self.terms = StringTable(v for terms in (vocab or {}).values() for v in terms)
+        self._set_arrays({}, 0)
+        self._overlay = {}
+
+    def _set_arrays(self, extras, n_rows, **arrays):
+        self.row_ptr = arrays.get('row_ptr', np.zeros(n_rows + 1, dtype=np.int64))
+        self.starts = arrays.get('starts', np.empty(0, dtype=np.int32))
+        self.ends = arrays.get('ends', np.empty(0, dtype=np.int32))
+        self.label_ids = arrays.get('label_ids', np.empty(0, dtype=np.int32))
+        self.text_ids = arrays.get('text_ids', np.empty(0, dtype=np.int32))
+        self.map_ptr = arrays.get('map_ptr', np.zeros(1, dtype=np.int64))
+        self.map_cat = arrays.get('map_cat', np.empty(0, dtype=np.int32))
+        self.map_val = arrays.get('map_val', np.empty(0, dtype=np.int32))
+        # 无法列式存储的 span 原样保存：{全局 span 下标: span}
+        self._extras = extras
+
+    @property
+    def n_rows(self):
+        return len(self.row_ptr) - 1
+
+    @classmethod
+    def from_dict(cls, annotations, vocab=None):
+        return cls.from_rows(((int(idx), annotations[idx]) for idx in sorted(annotations, key=int)), vocab)
+
+    @classmethod
+    def from_rows(cls, rows, vocab=None):
+        # rows 为按行号升序的 (行号, span 列表)，可以是边读边释放原始数据的生成器
+        store = cls(vocab)
+        store._load_rows(rows)
+        return store
+
+    def _load_rows(self, rows):
+        row_counts = {}
+        starts, ends, label_ids, text_ids = [], [], [], []
+        map_counts, map_cat, map_val = [], [], []
+        extras = {}
+        for idx, row in rows:
+            row = row or []
+            row_counts[idx] = len(row)
+            for span in row:
+                if _is_plain_span(span):
+                    starts.append(span['start'])
+                    ends.append(span['end'])
+                    label_ids.append(self.labels.intern(span['label']))
+                    text_ids.append(self.texts.intern(span['text']))
+                    n = 0
+                    for cat, values in span.get('mapped_value', {}).items():
+                        cid = self.categories.intern(cat)
+                        for v in values:
+                            map_cat.append(cid)
+                            map_val.append(self.terms.intern(v))
+                            n += 1
+                        if not values:
+                            map_cat.append(cid)
+                            map_val.append(EMPTY_VALUE)
+                            n += 1
+                    map_counts.append(n)
+                else:
+                    extras[len(starts)] = copy.deepcopy(span)
+                    starts.append(span.get('start', 0))
+                    ends.append(span.get('end', 0))
+                    label_ids.append(-1)
+                    text_ids.append(-1)
+                    map_counts.append(0)
+        n_rows = max(row_counts, default=-1) + 1
+        counts = np.zeros(n_rows, dtype=np.int64)
+        counts[np.fromiter(row_counts, dtype=np.int64, count=len(row_counts))] = list(row_counts.values())
+        row_ptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(counts, out=row_ptr[1:])
+        map_ptr = np.zeros(len(map_counts) + 1, dtype=np.int64)
+        np.cumsum(np.asarray(map_counts, dtype=np.int64), out=map_ptr[1:])
+        self._set_arrays(
+            extras, n_rows,
+            row_ptr=row_ptr,
+            starts=np.asarray(starts, dtype=np.int32),
+            ends=np.asarray(ends, dtype=np.int32),
+            label_ids=np.asarray(label_ids, dtype=np.int32),
+            text_ids=np.asarray(text_ids, dtype=np.int32),
+            map_ptr=map_ptr,
+            map_cat=np.asarray(map_cat, dtype=np.int32),
+            map_val=np.asarray(map_val, dtype=np.int32),
+        )
+        self._overlay = {}
+
+    def _view_row(self, idx):
+        # 从数组构造该行的 span 列表（新对象，不影响存储）
+        if not 0 <= idx < self.n_rows:
+            return []
+        a, b = int(self.row_ptr[idx]), int(self.row_ptr[idx + 1])
+        if a == b:
+            return []
+        labels, texts = self.labels.strings, self.texts.strings
+        categories, terms = self.categories.strings, self.terms.strings
+        map_ptr = self.map_ptr[a:b + 1].tolist()
+        map_cat = self.map_cat[map_ptr[0]:map_ptr[-1]].tolist()
+        map_val = self.map_val[map_ptr[0]:map_ptr[-1]].tolist()
+        base = map_ptr[0]
+        row = []
+        for j, (start, end, lid, tid) in enumerate(zip(
+                self.starts[a:b].tolist(), self.ends[a:b].tolist(),
+                self.label_ids[a:b].tolist(), self.text_ids[a:b].tolist())):
+            if a + j in self._extras:
+                row.append(copy.deepcopy(self._extras[a + j]))
+                continue
+            mapped = {}
+            for k in range(map_ptr[j] - base, map_ptr[j + 1] - base):
+                values = mapped.setdefault(categories[map_cat[k]], [])
+                if map_val[k] != EMPTY_VALUE:
+                    values.append(terms[map_val[k]])
+            row.append({'text': texts[tid], 'label': labels[lid], 'start': start, 'end': end, 'mapped_value': mapped})
+        return row
+
+    # MutableMapping 接口：读取走视图，[] 访问会把行物化到 overlay 以支持原地修改
+    def __getitem__(self, idx):
+        row = self._overlay.get(idx)
+        if row is None:
+            if not (isinstance(idx, int) and 0 <= idx < self.n_rows):
+                raise KeyError(idx)
+            row = self._view_row(idx)
+            self._overlay[idx] = row
+        return row
+
+    def __setitem__(self, idx, row):
+        self._overlay[idx] = row
+
+    def __delitem__(self, idx):
+        if idx not in self:
+            raise KeyError(idx)
+        if isinstance(idx, int) and 0 <= idx < self.n_rows:
+            self._overlay[idx] = []
+        else:
+            del self._overlay[idx]
+
+    def __contains__(self, idx):
+        return idx in self._overlay or (isinstance(idx, int) and 0 <= idx < self.n_rows)
+
+    def __iter__(self):
+        yield from range(self.n_rows)
+        for idx in self._overlay:
+            if not (isinstance(idx, int) and 0 <= idx < self.n_rows):
+                yield idx
+
+    def __len__(self):
+        return self.n_rows + sum(1 for idx in self._overlay if not (isinstance(idx, int) and 0 <= idx < self.n_rows))
+
+    def get(self, idx, default=None):
+        row = self._overlay.get(idx)
+        if row is not None:
+            return row
+        if isinstance(idx, int) and 0 <= idx < self.n_rows:
+            return self._view_row(idx)
+        return default
+
+    def items(self):
+        for idx in self:
+            yield idx, self.get(idx)
+
+    def values(self):
+        for idx in self:
+            yield self.get(idx)
+
+    def span_count(self, idx):
+        row = self._overlay.get(idx)
+        if row is not None:
+            return len(row)
+        if isinstance(idx, int) and 0 <= idx < self.n_rows:
+            return int(self.row_ptr[idx + 1] - self.row_ptr[idx])
+        return 0
+
+    def needs_compaction(self):
+        # overlay 中的行是普通 dict 列表，积累过多会抵消列式存储省下的内存
+        return len(self._overlay) > max(COMPACT_MIN_ROWS, self.n_rows // 8)
+
+    def compact(self):
+        # 把 overlay 中的修改折叠回数组；逐行读取，不先物化整份 dict
+        if self._overlay:
+            self._load_rows((idx, self.get(idx)) for idx in sorted(self, key=int))
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.row_ptr, self.starts, self.ends, self.label_ids,
+                                      self.text_ids, self.map_ptr, self.map_cat, self.map_val))
+
+    def save_npz(self, path):
+        self.compact()
+        if self._extras:
+            raise ValueError(f"存在 {len(self._extras)} 个非标准格式的 span，无法保存为 npz")
+        np.savez(
+            path,
+            row_ptr=self.row_ptr, starts=self.starts, ends=self.ends,
+            label_ids=self.label_ids, text_ids=self.text_ids,
+            map_ptr=self.map_ptr, map_cat=self.map_cat, map_val=self.map_val,
+            labels=np.array(self.labels.strings, dtype=str),
+            texts=np.array(self.texts.strings, dtype=str),
+            categories=np.array(self.categories.strings, dtype=str),
+            terms=np.array(self.terms.strings, dtype=str),
+        )
+
+    @classmethod
+    def load_npz(cls, path):
+        store = cls()
+        with np.load(path, allow_pickle=False) as data:
+            store.labels = StringTable(data['labels'].tolist())
+            store.texts = StringTable(data['texts'].tolist())
+            store.categories = StringTable(data['categories'].tolist())
+            store.terms = StringTable(data['terms'].tolist())
+            store._set_arrays({}, 0, **{k: data[k] for k in (
+                'row_ptr', 'starts', 'ends', 'label_ids', 'text_ids', 'map_ptr', 'map_cat', 'map_val')})
+        return store
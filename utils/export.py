@@ -0,0 +1,154 @@
+import argparse
+import csv
+import io
+import json
+import os
+
+import pandas as pd
+
+EXPORT_FORMATS = {
+    "csv": ("CSV", "text/csv"),
+    "jsonl": ("JSONL", "application/jsonl"),
+    "parquet": ("Parquet", "application/octet-stream"),
+    "conll": ("CoNLL (BIO)", "text/plain"),
+}
+
+
+def iter_chunks(df, manager, chunk_size=5000):
+    # 按行块产出 (DataFrame 切片, 对应的标注列表)，内存只与块大小相关
+    for begin in range(0, len(df), chunk_size):
+        chunk = df.iloc[begin:begin + chunk_size]
+        if 'annotations' in chunk.columns:
+            chunk = chunk.drop(columns=['annotations'])
+        annotations = [manager.get_annotations(idx) for idx in range(begin, begin + len(chunk))]
+        yield chunk, annotations
+
+
+def _is_missing(value):
+    # NaN / None / NaT / pd.NA；列表等非标量的单元格不算缺失
+    return value is None or (pd.api.types.is_scalar(value) and bool(pd.isna(value)))
+
+
+def _records(chunk, annotations):
+    columns = list(chunk.columns)
+    for values, anns in zip(chunk.itertuples(index=False, name=None), annotations):
+        record = {}
+        for col, value in zip(columns, values):
+            # NaN 等无法 JSON 序列化的值统一为 None
+            record[col] = None if _is_missing(value) else (value.item() if hasattr(value, "item") else value)
+        record['annotations'] = anns
+        yield record
+
+
+def iter_csv(df, manager, chunk_size=5000):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    # 带 BOM，Excel 打开中文不乱码（与原 utf-8-sig 导出一致）
+    yield "\ufeff"
+    header_written = False
+    for chunk, annotations in iter_chunks(df, manager, chunk_size):
+        if not header_written:
+            writer.writerow(list(chunk.columns) + ['annotations'])
+            header_written = True
+        for values, anns in zip(chunk.itertuples(index=False, name=None), annotations):
+            # 缺失值写为空单元格，与 DataFrame.to_csv 一致
+            writer.writerow(["" if _is_missing(v) else v for v in values] + [json.dumps(anns, ensure_ascii=False)])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def iter_jsonl(df, manager, chunk_size=5000):
+    for chunk, annotations in iter_chunks(df, manager, chunk_size):
+        yield "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in _records(chunk, annotations))
+
+
+def bio_tags(query, annotations):
+    # 字符级 BIO 标注，适用于不分词的中文文本
+    tags = ["O"] * len(query)
+    for ann in annotations:
+        start, end = ann['start'], min(ann['end'], len(query))
+        if start >= end:
+            continue
+        tags[start] = f"B-{ann['label']}"
+        for i in range(start + 1, end):
+            tags[i] = f"I-{ann['label']}"
+    return tags
+
+
+def iter_conll(df, manager, chunk_size=5000):
+    for chunk, annotations in iter_chunks(df, manager, chunk_size):
+        lines = []
+        for query, anns in zip(chunk['query'], annotations):
+            query = query if isinstance(query, str) else ""
+            for ch, tag in zip(query, bio_tags(query, anns)):
+                if not ch.isspace():
+                    lines.append(f"{ch}\t{tag}\n")
+            lines.append("\n")
+        yield "".join(lines)
+
+
+TEXT_EXPORTERS = {
+    "csv": iter_csv,
+    "jsonl": iter_jsonl,
+    "conll": iter_conll,
+}
+
+
+def write_parquet(path, df, manager, chunk_size=5000):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("导出 Parquet 需要安装 pyarrow")
+    writer = None
+    try:
+        for chunk, annotations in iter_chunks(df, manager, chunk_size):
+            chunk = chunk.copy()
+            chunk['annotations'] = [json.dumps(a, ensure_ascii=False) for a in annotations]
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export_to_file(path, fmt, df, manager, chunk_size=5000):
+    # 分块写入临时文件后原子重命名
+    tmp_path = f"{path}.tmp"
+    if fmt == "parquet":
+        write_parquet(tmp_path, df, manager, chunk_size)
+    elif fmt in TEXT_EXPORTERS:
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            for piece in TEXT_EXPORTERS[fmt](df, manager, chunk_size):
+                f.write(piece)
+    else:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    from utils.service import AnnotationService
+
+    parser = argparse.ArgumentParser(description="离线导出项目标注数据")
+    parser.add_argument("project", help="项目名称")
+    parser.add_argument("--project-dir", default="data/projects", help="项目目录")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="jsonl")
+    parser.add_argument("--output", help="输出文件，默认为 <项目名>_export.<格式>")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    service = AnnotationService(args.project_dir)
+    try:
+        handle = service.open(args.project)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    output = args.output or f"{args.project}_export.{args.format}"
+    export_to_file(output, args.format, handle.df, handle.manager, args.chunk_size)
+    print(f"已导出 {len(handle.df)} 条数据到 {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+from collections import deque
+
+
+class Operation:
+    # 一次可撤销的操作：rows = {行号: (修改前的行, 修改后的行)}
+    # 行列表写时复制、不会被原地修改，前后两个版本与当前标注共享未变化的 span 对象
+    # suggestions 同样记录预标注建议列表的前后版本（如采纳建议时被移除的建议），没有建议为 None
+    __slots__ = ("label", "rows", "suggestions")
+
+    def __init__(self, label, rows=None, suggestions=None):
+        self.label = label
+        self.rows = rows if rows is not None else {}
+        self.suggestions = suggestions if suggestions is not None else {}
+
+    def __len__(self):
+        return len(self.rows) + len(self.suggestions)
+
+
+class EditHistory:
+    # 撤销/重做的操作日志，开销与修改的行数成正比，与项目大小无关
+    # 撤销栈超过深度上限或记录的行版本总数超过上限时，丢弃最早的操作
+    def __init__(self, max_depth=100, max_rows=100000):
+        self.max_depth = max_depth
+        self.max_rows = max_rows
+        self._undo = deque()
+        self._redo = []
+        self._rows = 0
+        # 正在记录的操作及嵌套层数（如"全部采纳"内部逐条采纳，只记为一个操作）
+        self._open = None
+        self._nesting = 0
+
+    def clear(self):
+        self._undo.clear()
+        self._redo = []
+        self._rows = 0
+
+    def begin(self, label):
+        if self._nesting == 0:
+            self._open = Operation(label)
+        self._nesting += 1
+
+    def touch(self, idx, row):
+        # 行在当前操作中第一次被修改前调用，记下修改前的版本
+        if self._open is not None and idx not in self._open.rows:
+            self._open.rows[idx] = row
+
+    def touch_suggestions(self, idx, pending):
+        # 行的预标注建议在当前操作中第一次被修改前调用
+        if self._open is not None and idx not in self._open.suggestions:
+            self._open.suggestions[idx] = pending
+
+    def end(self, current_row, current_suggestions):
+        # 最外层操作结束时，用 current_row(行号) / current_suggestions(行号) 取修改后的版本；没有实际变化的不记录
+        self._nesting -= 1
+        if self._nesting:
+            return
+        op, self._open = self._open, None
+        rows = _changed(op.rows, current_row)
+        suggestions = _changed(op.suggestions, current_suggestions)
+        if rows or suggestions:
+            self.push_undo(Operation(op.label, rows, suggestions))
+            self._redo = []
+
+    def push_undo(self, op):
+        self._undo.append(op)
+        self._rows += len(op)
+        while len(self._undo) > 1 and (len(self._undo) > self.max_depth or self._rows > self.max_rows):
+            self._rows -= len(self._undo.popleft())
+
+    def pop_undo(self):
+        if not self._undo:
+            return None
+        op = self._undo.pop()
+        self._rows -= len(op)
+        return op
+
+    def push_redo(self, op):
+        self._redo.append(op)
+
+    def pop_redo(self):
+        return self._redo.pop() if self._redo else None
+
+    @property
+    def undo_label(self):
+        return self._undo[-1].label if self._undo else None
+
+    @property
+    def redo_label(self):
+        return self._redo[-1].label if self._redo else None
+
+    def __len__(self):
+        return len(self._undo)
+
+
+def _changed(befores, current):
+    changes = {}
+    for idx, before in befores.items():
+        after = current(idx)
+        if after is not before and after != before:
+            changes[idx] = (before, after)
+    return changes
@@ -0,0 +1,253 @@
+import argparse
+import io
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+IMPORT_FORMATS = ("csv", "jsonl", "json", "xlsx")
+
+
+def detect_format(name):
+    ext = os.path.splitext(name)[1].lower().lstrip(".")
+    if ext == "ndjson":
+        return "jsonl"
+    if ext not in IMPORT_FORMATS:
+        raise ValueError(f"不支持的文件类型: {name}")
+    return ext
+
+
+def iter_json_array(fp, buffer_size=1 << 20):
+    # 增量解析顶层 JSON 数组，逐个产出元素，内存只与单个元素和缓冲区大小有关
+    decoder = json.JSONDecoder()
+    text = io.TextIOWrapper(fp, encoding="utf-8-sig")
+    buf, pos, started = "", 0, False
+    while True:
+        chunk = text.read(buffer_size)
+        buf = buf[pos:] + chunk
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if not started and pos < len(buf):
+                if buf[pos] != "[":
+                    raise ValueError("JSON 数据文件的顶层必须是数组")
+                started = True
+                pos += 1
+                continue
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if not chunk:
+                    if buf[pos:].strip():
+                        raise
+                    return
+                # 元素跨越了缓冲区边界，继续读入
+                break
+            if end == len(buf) and chunk:
+                # 数字等标量可能被缓冲区截断，读入更多内容后再解析
+                break
+            yield item
+            pos = end
+        if not chunk:
+            return
+
+
+def _json_chunks(fp, chunk_size):
+    records = []
+    for item in iter_json_array(fp):
+        records.append(item)
+        if len(records) >= chunk_size:
+            yield pd.DataFrame.from_records(records)
+            records = []
+    if records:
+        yield pd.DataFrame.from_records(records)
+
+
+def _xlsx_chunks(fp, chunk_size):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("导入 xlsx 需要安装 openpyxl")
+    # 只读模式按行流式读取，不把整个工作表载入内存
+    workbook = load_workbook(fp, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(c) if c is not None else f"column{i}" for i, c in enumerate(next(rows, ()))]
+        records = []
+        for row in rows:
+            records.append(row[:len(header)])
+            if len(records) >= chunk_size:
+                yield pd.DataFrame.from_records(records, columns=header)
+                records = []
+        if records:
+            yield pd.DataFrame.from_records(records, columns=header)
+    finally:
+        workbook.close()
+
+
+def iter_source_chunks(fp, fmt, chunk_size=50000):
+    # fp 为二进制文件对象（本地文件或上传文件），按格式分块产出 DataFrame
+    if fmt == "csv":
+        yield from pd.read_csv(fp, chunksize=chunk_size, encoding="utf-8-sig")
+    elif fmt == "jsonl":
+        yield from pd.read_json(fp, lines=True, chunksize=chunk_size, dtype=False)
+    elif fmt == "json":
+        yield from _json_chunks(fp, chunk_size)
+    elif fmt == "xlsx":
+        yield from _xlsx_chunks(fp, chunk_size)
+    else:
+        raise ValueError(f"不支持的导入格式: {fmt}")
+
+
+def parse_annotation_values(values):
+    # annotations 列的单元格可能是 JSON 字符串、已解析的列表或空值；返回 (标注列表, 解析失败的行偏移)
+    parsed, errors = [], []
+    for offset, value in enumerate(values):
+        if isinstance(value, str):
+            try:
+                value = json.loads(value) if value.strip() else []
+            except ValueError:
+                errors.append(offset)
+                value = []
+        elif not isinstance(value, list):
+            value = []
+        parsed.append(value if isinstance(value, list) else [])
+    return parsed, errors
+
+
+def validate_chunk(chunk, offset):
+    if 'query' not in chunk.columns:
+        raise ValueError("数据文件必须包含 'query' 列")
+    empty = chunk['query'].isna()
+    return [offset + int(i) for i in empty.to_numpy().nonzero()[0]]
+
+
+class FileProjectWriter:
+    # 写入文件布局的项目：数据追加到 <name>.csv，非空标注按块追加到标注日志
+    def __init__(self, project_dir, name):
+        from utils.storage import AnnotationJournal
+
+        self.data_path = f"{project_dir}/{name}.csv"
+        self.journal = AnnotationJournal(f"{project_dir}/{name}_annotations.json")
+        self.journal.reset({})
+        self._columns = None
+
+    def write(self, chunk, offset, annotations):
+        chunk = chunk.drop(columns=['annotations'], errors='ignore')
+        first = self._columns is None
+        if first:
+            self._columns = list(chunk.columns)
+        chunk.reindex(columns=self._columns).to_csv(
+            self.data_path, mode="w" if first else "a", header=first, index=False,
+            encoding="utf-8-sig" if first else "utf-8")
+        self.journal.append({offset + i: anns for i, anns in enumerate(annotations) if anns})
+
+    def close(self):
+        pass
+
+
+class SQLiteProjectWriter:
+    # 写入 SQLite 项目：数据与标注在同一事务批次中按块写入
+    def __init__(self, db_path):
+        from utils.sqlite_store import SQLiteProject
+
+        self.project = SQLiteProject(db_path)
+        self.project.reset({})
+
+    def write(self, chunk, offset, annotations):
+        self.project.append_queries(chunk, offset)
+        self.project.append({offset + i: anns for i, anns in enumerate(annotations) if anns})
+
+    def close(self):
+        self.project.compact()
+
+
+def import_stream(fp, fmt, writer, chunk_size=50000, workers=1, total_bytes=None, progress=None):
+    # 分块读取 -> 校验 query 列 -> annotations 列在进程池中并行解析 -> 按顺序写入项目
+    # 进程池中同时在途的块数受限，内存与块大小成正比而与文件大小无关
+    # progress(已导入行数, 已读取字节数, 总字节数) 每写完一块调用一次
+    report = {"rows": 0, "annotated_rows": 0, "annotation_errors": [], "empty_queries": []}
+    pool = ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+    # (块, 起始行号, 解析结果或 Future)，按提交顺序写出
+    pending = deque()
+
+    def drain(limit):
+        while len(pending) > limit:
+            chunk, offset, result = pending.popleft()
+            annotations, errors = result.result() if pool is not None else result
+            report["annotation_errors"].extend(offset + e for e in errors)
+            report["annotated_rows"] += sum(1 for anns in annotations if anns)
+            writer.write(chunk, offset, annotations)
+            report["rows"] = offset + len(chunk)
+            if progress is not None:
+                progress(report["rows"], _position(fp), total_bytes)
+
+    try:
+        offset = 0
+        for chunk in iter_source_chunks(fp, fmt, chunk_size):
+            chunk = chunk.reset_index(drop=True)
+            report["empty_queries"].extend(validate_chunk(chunk, offset))
+            values = chunk['annotations'].tolist() if 'annotations' in chunk.columns else [None] * len(chunk)
+            if pool is not None:
+                pending.append((chunk, offset, pool.submit(parse_annotation_values, values)))
+            else:
+                pending.append((chunk, offset, parse_annotation_values(values)))
+            offset += len(chunk)
+            drain(workers if pool is not None else 0)
+        drain(0)
+        if offset == 0:
+            raise ValueError("数据文件为空")
+        writer.close()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return report
+
+
+def _position(fp):
+    try:
+        return fp.tell()
+    except (OSError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式导入大数据集为项目")
+    parser.add_argument("file", help="数据文件（csv / jsonl / json / xlsx）")
+    parser.add_argument("project", help="项目名称")
+    parser.add_argument("--project-dir", default="data/projects", help="项目目录")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="默认按扩展名判断")
+    parser.add_argument("--sqlite", action="store_true", help="导入为 SQLite 项目（<项目名>.db）")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="解析 annotations 的进程数")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.file)
+    os.makedirs(args.project_dir, exist_ok=True)
+    if args.sqlite:
+        writer = SQLiteProjectWriter(f"{args.project_dir}/{args.project}.db")
+    else:
+        writer = FileProjectWriter(args.project_dir, args.project)
+
+    def progress(rows, position, total):
+        percent = f" ({position / total:.0%})" if position is not None and total else ""
+        print(f"已导入 {rows} 行{percent}", flush=True)
+
+    with open(args.file, "rb") as fp:
+        report = import_stream(fp, fmt, writer, args.chunk_size, args.workers,
+                               total_bytes=os.path.getsize(args.file), progress=progress)
+    print(f"导入完成: {report['rows']} 行，其中 {report['annotated_rows']} 行带标注")
+    if report["annotation_errors"]:
+        print(f"[WARN] {len(report['annotation_errors'])} 行 annotations 解析失败，已置为空: "
+              f"{report['annotation_errors'][:20]}")
+    if report["empty_queries"]:
+        print(f"[WARN] {len(report['empty_queries'])} 行 query 为空: {report['empty_queries'][:20]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+# 默认实体标签及标签-类别映射，项目未上传映射文件时使用
+DEFAULT_ENTITY_LABELS = ["品类", "品牌", "型号", "年份", "价格", "cpu", "gpu", "内存", "存储", "重量", "颜色", "屏幕尺寸", "屏幕分辨率", "其他", "ai"]
+
+DEFAULT_LABEL_CATEGORY_MAP = {
+    "品类": ["category"],
+    "品牌": ["brand"],
+    "型号": ["model"],
+    "年份": ["release_year"],
+    "价格": ["price"],
+    "cpu": ['cpu_brand', 'cpu_series', 'cpu_family', 'cpu_model', 'cpu_gen'],
+    "gpu": ['gpu_type', 'gpu_brand', 'gpu_series', 'gpu_model'],
+    "内存": ['memory_capacity_gb'],
+    "存储": ['storage_capacity_gb'],
+    "屏幕尺寸": ['screen_size_inch'],
+    "屏幕分辨率": ['screen_resolution'],
+    "其他": ['other'],
+    "颜色": ['color'],
+    "ai": ['ai']
+}
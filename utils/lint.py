@@ -0,0 +1,276 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+
+from utils.vocab_compiler import clean_term, term_list, vocab_hash
+from utils.vocab_index import normalize_term
+
+# 检查项：代码 -> (级别, 说明)
+LINT_CHECKS = {
+    "bad_offsets": ("error", "span 位置越界或为空"),
+    "text_mismatch": ("error", "span 文本与 query[start:end] 不一致"),
+    "overlap": ("error", "同一行的 span 相互重叠"),
+    "disallowed_category": ("error", "映射类别不在该标签允许的类别中"),
+    "unknown_vocab": ("warning", "映射值不在词表中"),
+    "inconsistent_label": ("warning", "相同文本在其他行被标为不同标签"),
+}
+SEVERITIES = ("warning", "error")
+# 状态文件格式或检查逻辑变化时递增，旧的结果整体失效
+LINT_FORMAT = 1
+
+
+def lint_context(vocab, label_map, data_key):
+    # 行内检查的依赖：词表、标签-类别映射和数据文件版本，任一变化都要全量重查
+    payload = json.dumps([LINT_FORMAT, vocab_hash(vocab), label_map, list(data_key)],
+                         ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _issue(check, span, message):
+    return {"check": check, "severity": LINT_CHECKS[check][0], "span": span, "message": message}
+
+
+class RowLinter:
+    # 行内检查：只看一行的 query 和 span，可以在子进程中并行
+    def __init__(self, vocab, label_category_map):
+        self.label_category_map = {label: set(cats) for label, cats in (label_category_map or {}).items()}
+        # 词表按 normalize_term 比较，全角/大小写等写法差异不算缺失；没有词表时跳过该项检查
+        self.terms = {}
+        for category, terms in (vocab or {}).items():
+            cleaned = (clean_term(t) for t in term_list(terms))
+            self.terms[category] = {normalize_term(t) for t in cleaned if t is not None}
+
+    def check(self, query, spans):
+        query = query if isinstance(query, str) else ""
+        issues = []
+        max_end, max_span = -1, None
+        for i, span in sorted(enumerate(spans), key=lambda item: _start_key(item[1])):
+            start, end = span.get('start'), span.get('end')
+            if not (isinstance(start, int) and isinstance(end, int) and 0 <= start < end <= len(query)):
+                issues.append(_issue("bad_offsets", i, f"位置 {start}-{end} 超出 query 长度 {len(query)} 或为空"))
+                continue
+            if span.get('text') != query[start:end]:
+                issues.append(_issue("text_mismatch", i, f"文本为「{span.get('text')}」，query[{start}:{end}] 为「{query[start:end]}」"))
+            if start < max_end:
+                issues.append(_issue("overlap", i, f"与第 {max_span + 1} 个 span 重叠"))
+            if end > max_end:
+                max_end, max_span = end, i
+            self._check_mapping(i, span, issues)
+        issues.sort(key=lambda issue: issue["span"])
+        return issues
+
+    def _check_mapping(self, i, span, issues):
+        mapped = span.get('mapped_value')
+        if not isinstance(mapped, dict):
+            return
+        label = span.get('label')
+        allowed = self.label_category_map.get(label, set())
+        for category, values in mapped.items():
+            if not values:
+                continue
+            if category not in allowed:
+                issues.append(_issue("disallowed_category", i, f"标签 {label} 不允许映射到类别 {category}"))
+            if not self.terms:
+                continue
+            terms = self.terms.get(category)
+            for value in values if isinstance(values, list) else [values]:
+                if terms is None or normalize_term(value) not in terms:
+                    issues.append(_issue("unknown_vocab", i, f"类别 {category} 的词表中没有「{value}」"))
+
+
+def _start_key(span):
+    start = span.get('start')
+    return start if isinstance(start, int) else -1
+
+
+_worker_linter = None
+
+
+def _init_worker(vocab, label_category_map):
+    global _worker_linter
+    _worker_linter = RowLinter(vocab, label_category_map)
+
+
+def _lint_chunk(items):
+    return [(idx, _worker_linter.check(query, spans)) for idx, query, spans in items]
+
+
+def lint_rows(items, vocab, label_category_map, workers=1, chunk_size=20000):
+    # items: [(行号, query, spans)]；返回 {行号: [问题]}，只包含有问题的行
+    if workers and workers > 1 and len(items) > chunk_size:
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(vocab, label_category_map)) as pool:
+            results = [result for chunk in pool.map(_lint_chunk, chunks) for result in chunk]
+    else:
+        linter = RowLinter(vocab, label_category_map)
+        results = [(idx, linter.check(query, spans)) for idx, query, spans in items]
+    return {idx: issues for idx, issues in results if issues}
+
+
+def label_conflicts(span_index, annotations, n_rows):
+    # 同一文本被标为多个标签时，出现次数少于最多者的标签视为可疑；最多者并列时各标签都标出
+    conflicts = {}
+    for text, labels in span_index.labels_by_text.items():
+        if text is None or len(labels) < 2:
+            continue
+        counts = {label: span_index.occurrences(text, label) for label in labels}
+        top = max(counts.values())
+        majority = [label for label, count in counts.items() if count == top]
+        summary = "，".join(f"{label} {count} 次" for label, count in sorted(counts.items(), key=lambda item: -item[1]))
+        for label in labels:
+            if len(majority) == 1 and label == majority[0]:
+                continue
+            message = f"「{text}」被标为多个标签（{summary}），此处为 {label}"
+            for idx in span_index.rows_of(text, label):
+                if idx >= n_rows:
+                    continue
+                for i, span in enumerate(annotations.get(idx) or []):
+                    if span.get('text') == text and span.get('label') == label:
+                        conflicts.setdefault(idx, []).append(_issue("inconsistent_label", i, message))
+    return conflicts
+
+
+class LintReport:
+    # 一次质检的结果：行内问题 + 跨行问题，以及检查时各行的版本号
+    # 行内问题只依赖本行内容，下次只重查版本变化的行；跨行问题每次按 SpanIndex 重新计算
+    def __init__(self, context=None, n_rows=0, versions=None, row_issues=None, label_issues=None):
+        self.context = context
+        self.n_rows = n_rows
+        self.versions = versions or {}
+        self.row_issues = row_issues or {}
+        self.label_issues = label_issues or {}
+        # 本次实际重查的行数
+        self.checked = 0
+        self._rows = {}
+
+    def issues(self, idx):
+        issues = self.row_issues.get(idx, []) + self.label_issues.get(idx, [])
+        return sorted(issues, key=lambda issue: (issue["span"] is None, issue["span"] or 0))
+
+    def rows(self, check=None):
+        # 有问题的行号（升序 int32 数组），可限定检查项或级别（error / warning）
+        if check not in self._rows:
+            matched = set()
+            for issues_by_row in (self.row_issues, self.label_issues):
+                for idx, issues in issues_by_row.items():
+                    if check is None or any(check in (issue["check"], issue["severity"]) for issue in issues):
+                        matched.add(idx)
+            rows = np.fromiter(matched, dtype=np.int32, count=len(matched))
+            rows.sort()
+            self._rows[check] = rows
+        return self._rows[check]
+
+    def counts(self):
+        counts = Counter()
+        for issues_by_row in (self.row_issues, self.label_issues):
+            for issues in issues_by_row.values():
+                counts.update(issue["check"] for issue in issues)
+        return counts
+
+    def severity_counts(self):
+        counts = self.counts()
+        return {severity: sum(n for check, n in counts.items() if LINT_CHECKS[check][0] == severity)
+                for severity in SEVERITIES}
+
+    def iter_issues(self):
+        for idx in self.rows():
+            for issue in self.issues(int(idx)):
+                yield {"row": int(idx), **issue}
+
+    def write_jsonl(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for issue in self.iter_issues():
+                f.write(json.dumps(issue, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+        return path
+
+    def to_json(self):
+        return {
+            "format": LINT_FORMAT,
+            "context": self.context,
+            "n_rows": self.n_rows,
+            "versions": {str(idx): v for idx, v in self.versions.items()},
+            "row_issues": {str(idx): v for idx, v in self.row_issues.items()},
+            "label_issues": {str(idx): v for idx, v in self.label_issues.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        if not isinstance(data, dict) or data.get("format") != LINT_FORMAT:
+            return None
+        return cls(data.get("context"), data.get("n_rows", 0),
+                   {int(idx): v for idx, v in data.get("versions", {}).items()},
+                   {int(idx): v for idx, v in data.get("row_issues", {}).items()},
+                   {int(idx): v for idx, v in data.get("label_issues", {}).items()})
+
+
+def run_lint(queries, manager, vocab, label_category_map, context, previous=None,
+             workers=1, chunk_size=20000):
+    # 与上次结果的 context 相同时只重查版本号变化的行和未保存的行，其余行沿用上次的行内问题
+    n_rows = len(queries)
+    report = LintReport(context, n_rows)
+    if previous is not None and previous.context == context and previous.n_rows == n_rows:
+        changed = manager.changed_rows(previous.versions)
+        report.row_issues = {idx: issues for idx, issues in previous.row_issues.items() if idx not in changed}
+    else:
+        changed = manager.annotations
+    items = []
+    for idx in sorted(idx for idx in changed if isinstance(idx, int) and idx < n_rows):
+        spans = manager.annotations.get(idx)
+        if spans:
+            items.append((idx, queries[idx], spans))
+    report.row_issues.update(lint_rows(items, vocab, label_category_map, workers, chunk_size))
+    report.checked = len(items)
+    report.label_issues = label_conflicts(manager.span_index, manager.annotations, n_rows)
+    report.versions = manager.saved_versions()
+    return report
+
+
+def main():
+    from utils.project import read_json
+    from utils.service import AnnotationService
+    from utils.storage import atomic_write_json
+
+    parser = argparse.ArgumentParser(description="标注质检：增量检查项目标注，输出 JSONL 报告")
+    parser.add_argument("project", help="项目名称")
+    parser.add_argument("--project-dir", default="data/projects", help="项目目录")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="并行进程数")
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    parser.add_argument("--full", action="store_true", help="忽略上次结果，全量重查")
+    parser.add_argument("--output", help="JSONL 报告路径，默认为 <项目名>_lint.jsonl")
+    parser.add_argument("--fail-on", choices=SEVERITIES, help="存在该级别及以上的问题时以状态码 1 退出")
+    args = parser.parse_args()
+
+    service = AnnotationService(args.project_dir)
+    try:
+        handle = service.open(args.project)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    state_path = handle.paths["lint"]
+    previous = None
+    if not args.full and os.path.exists(state_path):
+        previous = LintReport.from_json(read_json(state_path))
+    report = run_lint(handle.df['query'].tolist(), handle.manager, handle.mapper.vocab, handle.label_map,
+                      handle.lint_context(), previous, workers=args.workers, chunk_size=args.chunk_size)
+    atomic_write_json(state_path, report.to_json())
+    output = args.output or f"{args.project}_lint.jsonl"
+    report.write_jsonl(output)
+    counts = report.severity_counts()
+    print(f"重查 {report.checked} 行，{len(report.rows())} 行有问题（错误 {counts['error']}，警告 {counts['warning']}），报告写入 {output}")
+    for check, n in sorted(report.counts().items()):
+        print(f"  {check}: {n}（{LINT_CHECKS[check][1]}）")
+    if args.fail_on and any(counts[s] for s in SEVERITIES[SEVERITIES.index(args.fail_on):]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,23 @@
+from utils.vocab_compiler import CompiledVocab
+from utils.vocab_index import CategoryIndex
+
+
 class VocabularyMapper:
     def __init__(self):
         self.vocab = {}
+        self._indexes = {}
+        self.compiled = None
 
     def load_vocabulary(self, vocab_data):
-        self.vocab = vocab_data
+        # 可传入原始词表 dict（索引按需构建）或 CompiledVocab（已清洗去重、索引已构建）
+        if isinstance(vocab_data, CompiledVocab):
+            self.compiled = vocab_data
+            self.vocab = vocab_data.vocab
+            self._indexes = {label: (index, len(self.vocab[label])) for label, index in vocab_data.indexes.items()}
+        else:
+            self.compiled = None
+            self.vocab = vocab_data
+            self._indexes = {}
 
     def has_vocabulary(self):
         return bool(self.vocab)
@@ -11,9 +25,40 @@ class VocabularyMapper:
     def get_vocabulary_stats(self):
         return {k: len(v) for k, v in self.vocab.items()}
 
-    def find_mappings(self, text, label):
-        # 简单匹配：完全相同或包含
+    def get_index(self, label):
+        # 按类别懒构建索引；词表列表被外部直接修改时（长度变化）重建
+        candidates = self.vocab.get(label, [])
+        cached = self._indexes.get(label)
+        if cached is None or cached[1] != len(candidates):
+            cached = (CategoryIndex(candidates), len(candidates))
+            self._indexes[label] = cached
+        return cached[0]
+
+    def add_candidate(self, label, candidate):
+        # 新增候选词，同时增量更新该类别的索引
+        if self.compiled is not None:
+            if self.compiled.add(label, candidate) is None:
+                return False
+            self._indexes[label] = (self.compiled.indexes[label], len(self.vocab[label]))
+            return True
+        candidates = self.vocab.setdefault(label, [])
+        if candidate in candidates:
+            return False
+        candidates.append(candidate)
+        cached = self._indexes.get(label)
+        if cached is not None:
+            cached[0].add(candidate)
+            self._indexes[label] = (cached[0], len(candidates))
+        return True
+
+    def search(self, text, label, top_k=None):
+        # 返回按相关度排序的 [(候选词, 得分)]
+        return self.get_index(label).search(text, top_k=top_k)
+
+    def find_mappings(self, text, label, top_k=None):
+        result = [c for c, _ in self.search(text, label, top_k=top_k)]
+        if result:
+            return result
+        # 没有任何匹配时按词表顺序返回前 top_k 个候选
         candidates = self.vocab.get(label, [])
-        result = [c for c in candidates if text in c or c in text]
-        # 如果没有包含关系，返回全部候选
-        return result if result else candidates
\ No newline at end of file
+        return candidates[:top_k] if top_k is not None else candidates
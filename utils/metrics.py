@@ -0,0 +1,199 @@
+import argparse
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# NER_METRICS=1 时启用埋点；未启用时 timed 原样返回被装饰函数、section/rerun 返回空上下文，没有额外开销
+ENABLED = os.environ.get("NER_METRICS") == "1"
+# 埋点输出目录：metrics.prom（Prometheus 文本格式，供 node_exporter textfile 等抓取）和 trace.jsonl（每次重跑一行）
+METRICS_DIR = os.environ.get("NER_METRICS_DIR", "data/metrics")
+PROM_FILE = "metrics.prom"
+TRACE_FILE = "trace.jsonl"
+
+
+class Recorder:
+    # 记录每次重跑中各段代码的耗时、调用次数和计数（对象数、写入字节数），并累计到进程级汇总
+    # Streamlit 每个会话在各自线程中重跑，当前重跑放在线程局部变量中，汇总数据加锁更新
+    def __init__(self, out_dir=None):
+        self.out_dir = out_dir
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.sections = {}  # 段名 -> [调用次数, 累计秒数]
+        self.counters = {}  # 计数名 -> 累计值
+        self.reruns = 0
+        self.rerun_seconds = 0.0
+
+    def current(self):
+        return getattr(self._local, "rerun", None)
+
+    @contextmanager
+    def rerun(self, label=None):
+        record = {"label": label, "timestamp": time.time(), "seconds": 0.0, "sections": {}, "counters": {}}
+        self._local.rerun = record
+        t0 = time.perf_counter()
+        try:
+            yield record
+        finally:
+            # st.rerun() 等以异常方式中断时也要记录
+            record["seconds"] = time.perf_counter() - t0
+            self._local.rerun = None
+            self._finish(record)
+
+    @contextmanager
+    def section(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def timed(self, name=None):
+        def decorate(fn):
+            section_name = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.section(section_name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def observe(self, name, seconds):
+        record = self.current()
+        if record is not None:
+            entry = record["sections"].setdefault(name, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+        with self._lock:
+            entry = self.sections.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def count(self, name, value=1):
+        record = self.current()
+        if record is not None:
+            record["counters"][name] = record["counters"].get(name, 0) + value
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def _finish(self, record):
+        # 多个会话线程同时结束重跑：追加 trace 和替换 metrics.prom 都在锁内完成，
+        # 临时文件名唯一，多进程共用同一输出目录时也不会互相覆盖；写出失败只告警，不影响页面
+        with self._lock:
+            self.reruns += 1
+            self.rerun_seconds += record["seconds"]
+            if self.out_dir is None:
+                return
+            try:
+                self._export(record, self.prometheus_text())
+            except OSError as e:
+                print(f"[WARN] 埋点写出失败: {e}")
+
+    def _export(self, record, prom):
+        os.makedirs(self.out_dir, exist_ok=True)
+        with open(os.path.join(self.out_dir, TRACE_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # 抓取方可能随时读取，先写临时文件再原子替换
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{PROM_FILE}.", suffix=".tmp", dir=self.out_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(prom)
+            # mkstemp 建出的文件只有属主可读，抓取进程可能以其他用户运行
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, os.path.join(self.out_dir, PROM_FILE))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP ner_reruns_total Streamlit 重跑次数",
+            "# TYPE ner_reruns_total counter",
+            f"ner_reruns_total {self.reruns}",
+            "# HELP ner_rerun_seconds_total 重跑累计耗时",
+            "# TYPE ner_rerun_seconds_total counter",
+            f"ner_rerun_seconds_total {self.rerun_seconds:.6f}",
+            "# HELP ner_section_calls_total 各段代码调用次数",
+            "# TYPE ner_section_calls_total counter",
+        ]
+        lines += [f'ner_section_calls_total{{section="{_escape(name)}"}} {calls}'
+                  for name, (calls, _) in sorted(self.sections.items())]
+        lines += ["# HELP ner_section_seconds_total 各段代码累计耗时",
+                  "# TYPE ner_section_seconds_total counter"]
+        lines += [f'ner_section_seconds_total{{section="{_escape(name)}"}} {seconds:.6f}'
+                  for name, (_, seconds) in sorted(self.sections.items())]
+        lines += ["# HELP ner_events_total 对象数、写入字节数等计数",
+                  "# TYPE ner_events_total counter"]
+        lines += [f'ner_events_total{{name="{_escape(name)}"}} {value}'
+                  for name, value in sorted(self.counters.items())]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+recorder = Recorder(METRICS_DIR) if ENABLED else None
+
+
+def timed(name=None):
+    # 装饰器：记录函数每次调用的耗时，段名默认为函数名
+    if recorder is None:
+        return lambda fn: fn
+    return recorder.timed(name)
+
+
+def section(name):
+    return recorder.section(name) if recorder is not None else nullcontext()
+
+
+def rerun(label=None):
+    return recorder.rerun(label) if recorder is not None else nullcontext()
+
+
+def count(name, value=1):
+    if recorder is not None:
+        recorder.count(name, value)
+
+
+def summarize(trace_path):
+    # 汇总 trace.jsonl：每段代码的调用次数、每次重跑平均耗时和 p95
+    per_section, reruns = {}, []
+    with open(trace_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            reruns.append(record["seconds"])
+            for name, entry in record["sections"].items():
+                per_section.setdefault(name, []).append(entry["seconds"])
+    return reruns, per_section
+
+
+def _p95(values):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.95))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="汇总埋点 trace.jsonl")
+    parser.add_argument("trace", nargs="?", default=os.path.join(METRICS_DIR, TRACE_FILE))
+    args = parser.parse_args()
+
+    reruns, per_section = summarize(args.trace)
+    if not reruns:
+        print("trace 为空")
+        return
+    print(f"重跑 {len(reruns)} 次，平均 {sum(reruns) / len(reruns) * 1000:.1f} ms，p95 {_p95(reruns) * 1000:.1f} ms")
+    print(f"{'section':<32}{'reruns':>8}{'mean(ms)':>10}{'p95(ms)':>10}")
+    for name, values in sorted(per_section.items(), key=lambda item: -sum(item[1])):
+        print(f"{name:<32}{len(values):>8}{sum(values) / len(values) * 1000:>10.1f}{_p95(values) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
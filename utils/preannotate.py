@@ -0,0 +1,176 @@
+import argparse
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.labels import DEFAULT_LABEL_CATEGORY_MAP
+from utils.vocab_compiler import term_list
+from utils.vocab_index import AhoCorasick
+
+
+def fold_text(text):
+    # 逐字符转小写并保持长度不变，匹配位置可直接映射回原文
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+_WORD_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789")
+
+
+class PreAnnotator:
+    # 用项目词表对 query 做多模式匹配，按 label_category_map 反查实体标签，生成预标注建议
+    def __init__(self, vocab, label_category_map, min_length=2):
+        category_labels = defaultdict(list)
+        for label, categories in label_category_map.items():
+            for cat in categories:
+                category_labels[cat].append(label)
+        # 规范化词条 -> {标签: {类别: [原始词条]}}
+        self._terms = {}
+        for cat, terms in vocab.items():
+            labels = category_labels.get(cat)
+            if not labels:
+                continue
+            for term in term_list(terms):
+                term = str(term).strip()
+                folded = fold_text(term)
+                if len(folded) < min_length:
+                    continue
+                entry = self._terms.setdefault(folded, {})
+                for label in labels:
+                    mapped = entry.setdefault(label, {}).setdefault(cat, [])
+                    if term not in mapped:
+                        mapped.append(term)
+        # 自动机的输出直接携带预先算好的 (词条, 标签, 置信度, 首字符/尾字符是否为字母数字)
+        label_order = {label: i for i, label in enumerate(label_category_map)}
+        self._automaton = AhoCorasick()
+        for folded, entry in self._terms.items():
+            label = min(entry, key=label_order.get)
+            info = (folded, label, round(1 / len(entry), 3), folded[0] in _WORD_CHARS, folded[-1] in _WORD_CHARS)
+            self._automaton.add(folded, info)
+        self._automaton.build()
+
+    def __len__(self):
+        return len(self._terms)
+
+    def annotate(self, query):
+        if not isinstance(query, str) or not query:
+            return []
+        folded = fold_text(query)
+        matches = []
+        last = len(folded) - 1
+        for start, end, info in self._automaton.iter_matches(folded):
+            # 英文/数字词条不能截断在连续的字母数字中间（如 pro 不匹配 product）
+            if info[3] and start > 0 and folded[start - 1] in _WORD_CHARS:
+                continue
+            if info[4] and end <= last and folded[end] in _WORD_CHARS:
+                continue
+            matches.append((start - end, start, end, info))
+        if not matches:
+            return []
+        # 最长优先、其次靠左，贪心选出互不重叠的片段
+        matches.sort(key=lambda m: (m[0], m[1]))
+        taken = bytearray(len(query))
+        spans = []
+        for _, start, end, (term, label, score, _, _) in matches:
+            if any(taken[start:end]):
+                continue
+            taken[start:end] = b"\x01" * (end - start)
+            spans.append({
+                'text': query[start:end],
+                'label': label,
+                'start': start,
+                'end': end,
+                'mapped_value': {cat: list(values) for cat, values in self._terms[term][label].items()},
+                'source': 'auto',
+                # 同一词条可归属多个标签时置信度降低
+                'score': score,
+            })
+        spans.sort(key=lambda x: x['start'])
+        return spans
+
+
+_worker_annotator = None
+MIN_CHUNK_SIZE = 2000
+
+
+def _init_worker(vocab, label_category_map, min_length):
+    global _worker_annotator
+    _worker_annotator = PreAnnotator(vocab, label_category_map, min_length)
+
+
+def _annotate_chunk(queries):
+    return [_worker_annotator.annotate(q) for q in queries]
+
+
+def preannotate_queries(queries, vocab, label_category_map, workers=1, chunk_size=20000, min_length=2):
+    # 返回 {行号: [建议标注]}，只包含有命中的行；相同 query 只匹配一次
+    unique = {}
+    row_keys = []
+    for q in queries:
+        key = q if isinstance(q, str) else None
+        if key is not None and key not in unique:
+            unique[key] = None
+        row_keys.append(key)
+    texts = list(unique)
+    if workers and workers > 1:
+        # 数据量不大时也要让每个进程都分到几块，最小块避免进程间传输开销压过匹配本身
+        chunk_size = max(min(chunk_size, -(-len(texts) // (workers * 4))), MIN_CHUNK_SIZE)
+    if workers and workers > 1 and len(texts) > chunk_size:
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(vocab, label_category_map, min_length)) as pool:
+            results = [spans for chunk in pool.map(_annotate_chunk, chunks) for spans in chunk]
+    else:
+        annotator = PreAnnotator(vocab, label_category_map, min_length)
+        results = [annotator.annotate(q) for q in texts]
+    for text, spans in zip(texts, results):
+        unique[text] = spans
+    suggestions = {}
+    for idx, key in enumerate(row_keys):
+        spans = unique.get(key) if key is not None else None
+        if spans:
+            # 相同 query 的行共享同一份建议，采纳时由 AnnotationManager 复制
+            suggestions[idx] = spans
+    return suggestions
+
+
+def main():
+    from utils.project import is_sqlite_project, project_paths, read_dataset, read_json
+    from utils.sqlite_store import SQLiteProject
+    from utils.storage import atomic_write_json
+
+    parser = argparse.ArgumentParser(description="用项目词表离线预标注整个数据集")
+    parser.add_argument("project", help="项目名称")
+    parser.add_argument("--project-dir", default="data/projects", help="项目目录")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="并行进程数")
+    parser.add_argument("--chunk-size", type=int, default=20000, help="每个进程一次处理的 query 数")
+    parser.add_argument("--min-length", type=int, default=2, help="参与匹配的最短词条长度")
+    args = parser.parse_args()
+
+    paths = project_paths(args.project_dir, args.project)
+    if paths["data"] is None:
+        parser.error(f"未找到项目数据文件: {args.project}")
+    if is_sqlite_project(paths):
+        project = SQLiteProject(paths["data"])
+        queries = project.column_values("query")
+        vocab = project.load_vocab()
+        label_map = project.load_label_map() or DEFAULT_LABEL_CATEGORY_MAP
+        if not vocab:
+            parser.error(f"项目未配置词表: {paths['data']}")
+    else:
+        if not os.path.exists(paths["vocab"]):
+            parser.error(f"项目未配置词表: {paths['vocab']}")
+        queries = read_dataset(paths["data"])['query'].tolist()
+        vocab = read_json(paths["vocab"])
+        label_map = read_json(paths["label_map"]) if os.path.exists(paths["label_map"]) else DEFAULT_LABEL_CATEGORY_MAP
+    suggestions = preannotate_queries(queries, vocab, label_map,
+                                      workers=args.workers, chunk_size=args.chunk_size,
+                                      min_length=args.min_length)
+    atomic_write_json(paths["suggestions"], {str(k): v for k, v in suggestions.items()})
+    print(f"已为 {len(suggestions)}/{len(queries)} 条数据生成预标注，写入 {paths['suggestions']}")
+
+
+if __name__ == "__main__":
+    main()
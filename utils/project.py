@@ -0,0 +1,91 @@
+import json
+import os
+
+import pandas as pd
+
+
+PROJECT_SIDE_FILES = ("_annotations.json", "_vocab.json", "_label_map.json", "_suggestions.json", "_leases.json", "_clusters.json", "_lint.json")
+
+
+def list_projects(project_dir):
+    # 项目 = 数据文件（.csv / .json）或 SQLite 项目（.db），去掉附属文件后去重
+    projects = []
+    for f in sorted(os.listdir(project_dir)):
+        if f.endswith(PROJECT_SIDE_FILES):
+            continue
+        name, ext = os.path.splitext(f)
+        if ext in (".csv", ".json", ".db") and name not in projects:
+            projects.append(name)
+    return projects
+
+
+def is_sqlite_project(paths):
+    return paths["data"] is not None and paths["data"].endswith(".db")
+
+
+def project_paths(project_dir, name):
+    base = f"{project_dir}/{name}"
+    # 已迁移到 SQLite 的项目优先使用 .db
+    if os.path.exists(f"{base}.db"):
+        return {
+            "data": f"{base}.db",
+            # WAL 模式下写入先落在 -wal 文件
+            "annotations": (f"{base}.db", f"{base}.db-wal"),
+            "vocab": None,
+            "label_map": None,
+            "suggestions": f"{base}_suggestions.json",
+            "clusters": f"{base}_clusters.json",
+            "lint": f"{base}_lint.json",
+        }
+    if os.path.exists(f"{base}.csv"):
+        data_path = f"{base}.csv"
+    elif os.path.exists(f"{base}.json"):
+        data_path = f"{base}.json"
+    else:
+        data_path = None
+    annotations_path = f"{base}_annotations.json"
+    return {
+        "data": data_path,
+        # 标注由快照和日志共同组成，任一变化都需要重新加载
+        "annotations": (annotations_path, f"{base}_annotations.journal", f"{base}_annotations.journal.old"),
+        "vocab": f"{base}_vocab.json",
+        "label_map": f"{base}_label_map.json",
+        "suggestions": f"{base}_suggestions.json",
+        # 近重复聚类结果（python -m utils.cluster 生成）
+        "clusters": f"{base}_clusters.json",
+        # 质检状态（python -m utils.lint 生成），记录各行问题和检查时的行版本
+        "lint": f"{base}_lint.json",
+    }
+
+
+def file_signature(path):
+    # (路径, mtime_ns, 大小)，文件不存在时为 None
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+def project_signature(paths):
+    signature = {}
+    for kind, path in paths.items():
+        if isinstance(path, tuple):
+            signature[kind] = tuple(file_signature(p) for p in path)
+        else:
+            signature[kind] = file_signature(path)
+    return signature
+
+
+def read_dataset(path):
+    if path.endswith(".csv"):
+        return pd.read_csv(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return pd.DataFrame(json.load(f))
+
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
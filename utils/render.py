@@ -0,0 +1,123 @@
+import html
+from collections import OrderedDict
+
+from utils.stats import STATUS_DONE, STATUS_INCOMPLETE, STATUS_NAMES, STATUS_NOT_STARTED, is_mapped
+
+LABEL_COLORS = {
+    "品牌": "#ff6b6b", "品类": "#4ecdc4", "型号": "#45b7d1",
+    "CPU": "#96ceb4", "GPU": "#ffd966", "内存": "#d4a5a5",
+    "存储": "#9bdeac", "屏幕尺寸": "#a2d2ff", "价格": "#ffafcc",
+}
+DEFAULT_LABEL_COLOR = "#ffe66d"
+STATUS_COLORS = {
+    STATUS_DONE: "#4ECDC4",  # 绿色 - 已完成
+    STATUS_INCOMPLETE: "#FFA500",  # 橙色 - 有实体但映射未完成
+    STATUS_NOT_STARTED: "#FF6B6B",  # 红色 - 未开始
+}
+
+# 导航栏的 HTML 模板在导入时生成一次，app.py 每次重跑只做格式化
+PROGRESS_TEMPLATE = """
+<div style="margin-bottom: 10px;">
+    <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
+        <span style="font-size: 14px; color: #666;">进度</span>
+        <span style="font-size: 14px; color: #666;">{position}/{total}</span>
+    </div>
+    <div style="width: 100%; background-color: #f0f2f6; border-radius: 10px; overflow: hidden;">
+        <div style="width: {percent}%; height: 8px; background: linear-gradient(90deg, #4ECDC4, #44A08D); transition: width 0.3s;"></div>
+    </div>
+</div>
+"""
+COUNTER_TEMPLATE = """
+<div style="text-align: center; padding: 8px; background: #f0f2f6; border-radius: 8px;">
+    <div style="font-size: 16px; font-weight: bold; color: #4ECDC4;">{position}</div>
+    <div style="font-size: 12px; color: #666;">/ {total}</div>
+</div>
+"""
+# 每种行状态的标记（颜色、状态名已填好），只剩实体数待填
+STATUS_BADGES = {
+    status: f"""
+<div style="text-align: center; padding: 8px; background: {color}20; border-radius: 8px; border: 1px solid {color}40;">
+    <div style="font-size: 14px; font-weight: bold; color: {color};">{STATUS_NAMES[status]}</div>
+    <div style="font-size: 12px; color: #666;">{{count}} 个实体</div>
+</div>
+"""
+    for status, color in STATUS_COLORS.items()
+}
+
+
+def progress_html(position, total):
+    percent = position / total * 100 if total > 0 else 0
+    return PROGRESS_TEMPLATE.format(position=position, total=total, percent=percent)
+
+
+def counter_html(position, total):
+    return COUNTER_TEMPLATE.format(position=position, total=total)
+
+
+def status_badge_html(status, count):
+    return STATUS_BADGES[status].format(count=count)
+
+
+class RowMemo:
+    # 按 (行号, 行修订号) 缓存每行的派生数据（预览 HTML、标注汇总表），行未修改时重跑直接复用
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def get(self, key, compute):
+        value = self._items.get(key)
+        if value is None:
+            value = compute()
+            self._items[key] = value
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        else:
+            self._items.move_to_end(key)
+        return value
+
+
+def span_key(annotations):
+    # 预览只依赖位置、标签和文本，作为缓存键
+    return tuple((ann['start'], ann['end'], ann['label'], ann['text']) for ann in annotations)
+
+
+def annotated_html(query, spans):
+    # spans 为 span_key() 的结果，需按 start 排序且互不重叠
+    parts = []
+    last_end = 0
+    for start, end, label, text in spans:
+        if start > last_end:
+            parts.append(html.escape(query[last_end:start]))
+        color = LABEL_COLORS.get(label, DEFAULT_LABEL_COLOR)
+        parts.append(f"<mark style='background-color: {color}; padding: 2px; border-radius: 3px;' "
+                     f"title='{html.escape(label)}'>{html.escape(text)}</mark>")
+        last_end = end
+    if last_end < len(query):
+        parts.append(html.escape(query[last_end:]))
+    return "".join(parts)
+
+
+def span_title(i, ann):
+    mark = "✅" if is_mapped(ann) else "⚪"
+    return f"{mark} {i + 1}. {ann['text']} - {ann['label']}"
+
+
+def spans_table(annotations):
+    # 所有 span 汇总为一张 Markdown 表，代替每个 span 一个展开器
+    rows = ["| # | 文本 | 标签 | 位置 | 映射 |", "|---|---|---|---|---|"]
+    for i, ann in enumerate(annotations):
+        mapped = ann.get('mapped_value')
+        mapped = "；".join(f"{cat}: {'/'.join(map(str, v))}" for cat, v in mapped.items() if v) \
+            if isinstance(mapped, dict) else ""
+        cells = [str(i + 1), ann['text'], ann['label'], f"{ann['start']}-{ann['end']}", mapped or "—"]
+        rows.append("| " + " | ".join(c.replace("|", "\\|") for c in cells) + " |")
+    return "\n".join(rows)
+
+
+def mapping_options(mapper, text, category, current, search="", top_k=20):
+    # 下拉框选项：按相关度排序的前 top_k 个候选词（有搜索词时按搜索词检索），已选的映射总是保留
+    if search:
+        ranked = [c for c, _ in mapper.search(search, category, top_k=top_k)]
+    else:
+        ranked = mapper.find_mappings(text, category, top_k=top_k)
+    return ranked + [m for m in current if m not in ranked]
@@ -0,0 +1,115 @@
+import os
+import time
+
+import numpy as np
+
+from utils.project import read_json
+from utils.storage import update_json
+
+# 预标注建议的置信度低于该值时视为低置信度行
+LOW_CONFIDENCE = 0.5
+
+
+def row_priorities(n_rows, suggestions, low_confidence=LOW_CONFIDENCE):
+    # 行优先级：没有任何词表命中的行最需要人工标注(1.0)，低置信度预标注次之(0.5)，其余为 0
+    priorities = np.ones(n_rows, dtype=np.float32)
+    for idx, spans in suggestions.items():
+        idx = int(idx)
+        if 0 <= idx < n_rows and spans:
+            scores = [s.get('score', 1.0) for s in spans]
+            priorities[idx] = 0.5 if min(scores) < low_confidence else 0.0
+    return priorities
+
+
+class LeaseScheduler:
+    # 把数据按固定大小切成批次，以带过期时间的租约分配给标注员
+    # 租约记录在 <项目>_leases.json 中并加锁读写，多个会话/进程共享；批次是否完成直接看行状态索引
+    def __init__(self, path, n_rows, batch_size=100, lease_seconds=1800, priorities=None):
+        self.path = path
+        self.n_rows = n_rows
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.n_batches = (n_rows + batch_size - 1) // batch_size
+        if priorities is not None and self.n_batches:
+            # 批次优先级 = 批内行优先级之和，高优先级批次先分配，同优先级按批次顺序
+            starts = np.arange(0, n_rows, batch_size)
+            batch_priority = np.add.reduceat(np.asarray(priorities, dtype=np.float64)[:n_rows], starts)
+            self._order = np.argsort(-batch_priority, kind="stable").tolist()
+        else:
+            self._order = list(range(self.n_batches))
+
+    def batch_range(self, batch):
+        start = batch * self.batch_size
+        return start, min(start + self.batch_size, self.n_rows)
+
+    def _lease(self, batch, owner, expires):
+        start, end = self.batch_range(batch)
+        return {"batch": batch, "start": start, "end": end, "owner": owner, "expires": expires}
+
+    def _unfinished(self, manager, batch):
+        return manager.count_unfinished(*self.batch_range(batch))
+
+    def acquire(self, owner, manager, now=None):
+        # 返回 owner 的租约：已持有且未完成的批次直接续期，否则分配优先级最高的空闲未完成批次
+        # 过期租约视为空闲，会被重新分配；没有可分配的批次时返回 None
+        now = time.time() if now is None else now
+        result = []
+
+        def assign(state):
+            leases = {b: lease for b, lease in state.get("leases", {}).items() if lease["expires"] > now}
+            state["leases"] = leases
+            for b, lease in list(leases.items()):
+                if lease["owner"] != owner:
+                    continue
+                if self._unfinished(manager, int(b)):
+                    lease["expires"] = now + self.lease_seconds
+                    result.append(self._lease(int(b), owner, lease["expires"]))
+                    return
+                # 已完成的批次自动归还
+                del leases[b]
+            for batch in self._order:
+                if str(batch) not in leases and self._unfinished(manager, batch):
+                    leases[str(batch)] = {"owner": owner, "expires": now + self.lease_seconds}
+                    result.append(self._lease(batch, owner, now + self.lease_seconds))
+                    return
+
+        update_json(self.path, assign)
+        return result[0] if result else None
+
+    def renew(self, lease, now=None):
+        # 续期成功返回新的租约；租约已过期并被他人领走时返回 None
+        now = time.time() if now is None else now
+        result = []
+
+        def extend(state):
+            current = state.setdefault("leases", {}).get(str(lease["batch"]))
+            if current is not None and current["owner"] == lease["owner"]:
+                current["expires"] = now + self.lease_seconds
+                result.append(self._lease(lease["batch"], lease["owner"], current["expires"]))
+            elif current is None or current["expires"] <= now:
+                state["leases"][str(lease["batch"])] = {"owner": lease["owner"], "expires": now + self.lease_seconds}
+                result.append(self._lease(lease["batch"], lease["owner"], now + self.lease_seconds))
+
+        update_json(self.path, extend)
+        return result[0] if result else None
+
+    def release(self, lease):
+        def drop(state):
+            leases = state.setdefault("leases", {})
+            current = leases.get(str(lease["batch"]))
+            if current is not None and current["owner"] == lease["owner"]:
+                del leases[str(lease["batch"])]
+
+        update_json(self.path, drop)
+
+    def active_leases(self, now=None):
+        now = time.time() if now is None else now
+        # 租约文件总是原子替换，读取不需要加锁
+        state = read_json(self.path) if os.path.exists(self.path) else {}
+        return [self._lease(int(b), lease["owner"], lease["expires"])
+                for b, lease in state.get("leases", {}).items() if lease["expires"] > now]
+
+    def progress(self, manager):
+        # (已完成批次数, 总批次数)
+        done = sum(1 for batch in range(self.n_batches) if not self._unfinished(manager, batch))
+        return done, self.n_batches
@@ -0,0 +1,358 @@
+import re
+import unicodedata
+
+import numpy as np
+
+from utils.lint import LINT_CHECKS, SEVERITIES
+from utils.stats import STATUS_DONE, STATUS_INCOMPLETE, STATUS_NAMES, STATUS_NOT_STARTED
+
+# 查询语法：
+#   RTX 4060          两个词都出现在 query 中（空格即 AND）
+#   "RTX 4060"        短语（含空格）出现在 query 中
+#   a OR b / a | b    或；NOT a / -a 非；括号分组
+#   label:品牌         有该标签的 span（也可写 标签:品牌）
+#   text:华为          有 span 文本恰为"华为"（也可写 实体:华为）
+#   map:华为           有 span 映射到"华为"；map:brand=华为 限定类别
+#   品牌=华为          有标签为"品牌"且映射到"华为"的 span
+#   status:完成        行状态（未开始 / 未完成 / 完成，或 0/1/2）
+#   cluster:代表       近重复簇的代表行（utils.cluster 聚类后可用）
+#   issue:任意         质检发现问题的行（utils.lint 质检后可用）；issue:错误 / issue:overlap 限定级别或检查项
+STATUS_ALIASES = {
+    "0": STATUS_NOT_STARTED, "未开始": STATUS_NOT_STARTED, "todo": STATUS_NOT_STARTED,
+    "1": STATUS_INCOMPLETE, "未完成": STATUS_INCOMPLETE, "incomplete": STATUS_INCOMPLETE,
+    "2": STATUS_DONE, "完成": STATUS_DONE, "done": STATUS_DONE,
+}
+STATUS_ALIASES.update({name: status for status, name in STATUS_NAMES.items()})
+FIELD_ALIASES = {"label": "label", "标签": "label", "text": "text", "实体": "text",
+                 "map": "map", "映射": "map", "status": "status", "状态": "status",
+                 "cluster": "cluster", "簇": "cluster", "issue": "issue", "问题": "issue"}
+CLUSTER_ALIASES = {"代表": "rep", "rep": "rep"}
+# issue: 的取值：任意问题、级别或检查项代码
+ISSUE_ALIASES = {"任意": None, "any": None, "错误": "error", "警告": "warning"}
+ISSUE_ALIASES.update({name: name for name in SEVERITIES})
+ISSUE_ALIASES.update({name: name for name in LINT_CHECKS})
+
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|(\|)|"([^"]*)"|([^\s()|"]+))')
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+
+def normalize(text):
+    # 全角/半角、大小写统一后再切分 n-gram，"ＲＴＸ"、"rtx" 都能命中 "RTX"
+    return unicodedata.normalize("NFKC", str(text)).casefold()
+
+
+class QueryIndex:
+    # query 文本的字符 n-gram 倒排索引（单字 + 相邻二字），中文不需要分词
+    # 用 numpy 一次性构建：所有 (gram, 行号) 对排序去重后按 CSR 存放，gram 查找为二分
+    # 数据文件只读，按数据文件签名缓存；标注相关的倒排由 AnnotationManager 增量维护
+    def __init__(self, queries):
+        self.texts = [normalize(q) for q in queries]
+        self.n_rows = len(self.texts)
+        self._build()
+
+    def _build(self):
+        # (gram, 行号) 打包成一个 int64 原地排序后相邻去重（比 np.unique 快得多），中间数组用完即释放
+        n = self.n_rows
+        lengths = np.fromiter((len(t) for t in self.texts), dtype=np.int64, count=n)
+        # 码点加 1 后最大 0x110000 < 2^21：单字 = c << 21，二字 = c1 << 21 | c2（低位非 0）
+        codes = np.frombuffer("".join(self.texts).encode("utf-32-le"), dtype=np.uint32).astype(np.int64) + 1
+        rows = np.repeat(np.arange(n, dtype=np.int64), lengths)
+        same_row = rows[1:] == rows[:-1]
+        row_bits = max(int(n).bit_length(), 1)
+        if 42 + row_bits > 63:
+            self._build_lexsort(codes, rows, same_row)
+            return
+        keys = np.empty(len(codes) + int(same_row.sum()), dtype=np.int64)
+        head = keys[:len(codes)]
+        np.left_shift(codes, 21 + row_bits, out=head)
+        head |= rows
+        pairs = codes[:-1] << 21
+        pairs |= codes[1:]
+        pairs <<= row_bits
+        pairs |= rows[:-1]
+        keys[len(codes):] = pairs[same_row]
+        del codes, rows, same_row, pairs, head
+        keys.sort()
+        if len(keys):
+            keys = keys[np.r_[True, keys[1:] != keys[:-1]]]
+        self.postings = (keys & ((1 << row_bits) - 1)).astype(np.int32)
+        keys >>= row_bits
+        self._set_grams(keys)
+
+    def _build_lexsort(self, codes, rows, same_row):
+        # 行数超过 2^21 时 (gram, 行号) 放不进一个 int64，改为两列排序
+        unigrams = codes << 21
+        grams = np.concatenate([unigrams, (unigrams[:-1] | codes[1:])[same_row]])
+        gram_rows = np.concatenate([rows, rows[:-1][same_row]])
+        order = np.lexsort((gram_rows, grams))
+        grams, gram_rows = grams[order], gram_rows[order]
+        keep = np.ones(len(grams), dtype=bool)
+        keep[1:] = (grams[1:] != grams[:-1]) | (gram_rows[1:] != gram_rows[:-1])
+        self.postings = gram_rows[keep].astype(np.int32)
+        self._set_grams(grams[keep])
+
+    def _set_grams(self, grams):
+        # grams 已排序：每个 gram 取首次出现的位置，postings[offsets[i]:offsets[i + 1]] 为其行号
+        starts = np.flatnonzero(np.r_[True, grams[1:] != grams[:-1]]) if len(grams) else _EMPTY
+        self.grams = grams[starts]
+        self.offsets = np.append(starts, len(grams)).astype(np.int64)
+
+    def _posting(self, key):
+        pos = np.searchsorted(self.grams, key)
+        if pos >= len(self.grams) or self.grams[pos] != key:
+            return _EMPTY
+        return self.postings[self.offsets[pos]:self.offsets[pos + 1]]
+
+    def search(self, pattern):
+        # 包含 pattern 的行号（升序）；二字 gram 的倒排求交后，长于 2 个字的再逐行确认
+        pattern = normalize(pattern)
+        if not pattern:
+            return np.arange(self.n_rows, dtype=np.int32)
+        codes = [ord(c) + 1 for c in pattern]
+        if len(codes) == 1:
+            return self._posting(codes[0] << 21)
+        lists = sorted((self._posting(a << 21 | b) for a, b in set(zip(codes, codes[1:]))), key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        if len(codes) > 2 and len(rows):
+            texts = self.texts
+            rows = rows[np.fromiter((pattern in texts[r] for r in rows.tolist()), dtype=bool, count=len(rows))]
+        return rows
+
+
+def _to_array(rows):
+    return np.fromiter(sorted(rows), dtype=np.int32, count=len(rows))
+
+
+def _members(fenwick_set, n_rows):
+    if fenwick_set is None:
+        return _EMPTY
+    flags = np.frombuffer(bytes(fenwick_set.members[:n_rows]), dtype=np.uint8)
+    return np.flatnonzero(flags).astype(np.int32)
+
+
+class SearchQuery:
+    # 解析后的查询树：("and" | "or", [子节点]) / ("not", 子节点) / (字段, 参数)
+    def __init__(self, text):
+        self.text = text
+        self._tokens = self._tokenize(text)
+        self._pos = 0
+        self.tree = self._parse_or() if self._tokens else None
+        if self._pos < len(self._tokens):
+            raise ValueError(f"无法解析的查询: {text}")
+
+    @staticmethod
+    def _tokenize(text):
+        tokens, pos = [], 0
+        text = text.strip()
+        while pos < len(text):
+            m = _TOKEN_RE.match(text, pos)
+            if m is None or m.end() == pos:
+                raise ValueError(f"无法解析的查询: {text}")
+            pos = m.end()
+            if m.group(1) or m.group(2) or m.group(3):
+                tokens.append(("op", m.group(1) or m.group(2) or m.group(3)))
+            elif m.group(4) is not None:
+                tokens.append(("phrase", m.group(4)))
+            else:
+                word = m.group(5)
+                tokens.append(("op", word.upper()) if word.upper() in ("AND", "OR", "NOT") else ("word", word))
+        return tokens
+
+    def _peek(self):
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else (None, None)
+
+    def _parse_or(self):
+        items = [self._parse_and()]
+        while self._peek() in (("op", "OR"), ("op", "|")):
+            self._pos += 1
+            items.append(self._parse_and())
+        return items[0] if len(items) == 1 else ("or", items)
+
+    def _parse_and(self):
+        items = []
+        while True:
+            kind, value = self._peek()
+            if kind is None or (kind == "op" and value in (")", "OR", "|")):
+                break
+            if (kind, value) == ("op", "AND"):
+                self._pos += 1
+                continue
+            items.append(self._parse_unary())
+        if not items:
+            raise ValueError(f"查询不完整: {self.text}")
+        return items[0] if len(items) == 1 else ("and", items)
+
+    def _parse_unary(self):
+        kind, value = self._peek()
+        if (kind, value) == ("op", "NOT"):
+            self._pos += 1
+            return ("not", self._parse_unary())
+        if (kind, value) == ("op", "("):
+            self._pos += 1
+            node = self._parse_or()
+            if self._peek() != ("op", ")"):
+                raise ValueError(f"括号不匹配: {self.text}")
+            self._pos += 1
+            return node
+        if kind == "phrase":
+            self._pos += 1
+            return ("query", value)
+        if kind == "word":
+            self._pos += 1
+            if value.startswith("-") and len(value) > 1:
+                return ("not", self._term(value[1:]))
+            return self._term(value)
+        raise ValueError(f"无法解析的查询: {self.text}")
+
+    def _term(self, word):
+        field, sep, arg = word.partition(":")
+        if sep and field.lower() in FIELD_ALIASES and arg:
+            field = FIELD_ALIASES[field.lower()]
+            if field == "status":
+                if arg.lower() not in STATUS_ALIASES:
+                    raise ValueError(f"未知的行状态: {arg}")
+                return ("status", STATUS_ALIASES[arg.lower()])
+            if field == "cluster":
+                if arg.lower() not in CLUSTER_ALIASES:
+                    raise ValueError(f"未知的簇条件: {arg}")
+                return ("cluster", CLUSTER_ALIASES[arg.lower()])
+            if field == "issue":
+                if arg.lower() not in ISSUE_ALIASES:
+                    raise ValueError(f"未知的质检条件: {arg}")
+                return ("issue", ISSUE_ALIASES[arg.lower()])
+            if field == "map":
+                category, eq, value = arg.partition("=")
+                return ("map", (None, category, value) if eq else (None, None, arg))
+            return (field, arg)
+        label, eq, value = word.partition("=")
+        if eq and label and value:
+            return ("map", (label, None, value))
+        return ("query", word)
+
+
+class SearchIndex:
+    # 组合检索：query 文本走 n-gram 索引，标签/状态走 RowIndex 的行集合，
+    # span 文本和映射值走 SpanIndex 的倒排；后两者随标注增删增量更新，检索时无需重建
+    def __init__(self, query_index, manager, clusters=None, lint=None):
+        self.query_index = query_index
+        self.manager = manager
+        self.clusters = clusters
+        self.lint = lint
+
+    @property
+    def n_rows(self):
+        return self.query_index.n_rows
+
+    def search(self, text):
+        # 返回满足查询的行号（升序 int32 数组）；空查询返回 None 表示不过滤
+        query = text if isinstance(text, SearchQuery) else SearchQuery(text)
+        if query.tree is None:
+            return None
+        rows, negated = self._eval(query.tree)
+        return self._complement(rows) if negated else rows
+
+    def _complement(self, rows):
+        mask = np.ones(self.n_rows, dtype=bool)
+        mask[rows] = False
+        return np.flatnonzero(mask).astype(np.int32)
+
+    def _eval(self, node):
+        # 返回 (行号数组, 是否取反)：AND 中的 NOT 用差集处理，不必先展开成全集的补集
+        kind, arg = node
+        if kind == "not":
+            rows, negated = self._eval(arg)
+            return rows, not negated
+        if kind == "and":
+            positive, negative = None, []
+            for child in arg:
+                rows, negated = self._eval(child)
+                if negated:
+                    negative.append(rows)
+                elif positive is None or len(positive):
+                    positive = rows if positive is None else np.intersect1d(positive, rows, assume_unique=True)
+            if positive is None:
+                # 只有取反项：非(a 或 b ...)
+                return self._union(negative), True
+            for rows in negative:
+                if not len(positive):
+                    break
+                positive = np.setdiff1d(positive, rows, assume_unique=True)
+            return positive, False
+        if kind == "or":
+            results = [self._eval(child) for child in arg]
+            if any(negated for _, negated in results):
+                return self._union([self._complement(r) if n else r for r, n in results]), False
+            return self._union([r for r, _ in results]), False
+        return self._leaf(kind, arg), False
+
+    @staticmethod
+    def _union(arrays):
+        arrays = [a for a in arrays if len(a)]
+        if not arrays:
+            return _EMPTY
+        return arrays[0] if len(arrays) == 1 else np.unique(np.concatenate(arrays))
+
+    def _leaf(self, kind, arg):
+        manager, n = self.manager, self.n_rows
+        if kind == "query":
+            return self.query_index.search(arg)
+        if kind == "label":
+            return _members(manager.row_index.by_label.get(arg), n)
+        if kind == "status":
+            return _members(manager.row_index.by_status.get(arg), n)
+        if kind == "text":
+            return _to_array([r for r in manager.span_index.rows_with_text(arg) if r < n])
+        if kind == "cluster":
+            if self.clusters is None:
+                raise ValueError("项目尚未聚类")
+            reps = self.clusters.representatives()
+            return reps[reps < n].astype(np.int32)
+        if kind == "issue":
+            if self.lint is None:
+                raise ValueError("项目尚未质检")
+            rows = self.lint.rows(arg)
+            return rows[rows < n]
+        if kind == "map":
+            label, category, value = arg
+            rows = manager.span_index.rows_with_mapping(value, category=category, label=label)
+            return _to_array([r for r in rows if r < n])
+        raise ValueError(f"未知的查询字段: {kind}")
+
+
+class FilteredView:
+    # 检索结果上的导航：rows 为升序行号，可再限定在当前领取的区间 [lo, hi) 内
+    def __init__(self, rows, lo=0, hi=None):
+        rows = np.asarray(rows, dtype=np.int32)
+        a = np.searchsorted(rows, lo, side="left")
+        b = len(rows) if hi is None else np.searchsorted(rows, hi, side="left")
+        self.rows = rows[a:b]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, idx):
+        pos = np.searchsorted(self.rows, idx)
+        return pos < len(self.rows) and self.rows[pos] == idx
+
+    def position(self, idx):
+        # idx 在结果中的序号；不在结果中时返回其后第一条结果的序号
+        return int(np.searchsorted(self.rows, idx))
+
+    def at(self, pos):
+        return int(self.rows[pos]) if 0 <= pos < len(self.rows) else None
+
+    def next_after(self, idx, wrap=True):
+        pos = int(np.searchsorted(self.rows, idx, side="right"))
+        if pos < len(self.rows):
+            return int(self.rows[pos])
+        return int(self.rows[0]) if wrap and len(self.rows) else None
+
+    def prev_before(self, idx, wrap=True):
+        pos = int(np.searchsorted(self.rows, idx, side="left"))
+        if pos > 0:
+            return int(self.rows[pos - 1])
+        return int(self.rows[-1]) if wrap and len(self.rows) else None
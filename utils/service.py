@@ -0,0 +1,394 @@
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+from utils.annotation import AnnotationManager
+from utils.export import EXPORT_FORMATS, export_to_file
+from utils.labels import DEFAULT_LABEL_CATEGORY_MAP
+from utils.mapping import VocabularyMapper
+from utils.project import is_sqlite_project, list_projects, project_paths, project_signature, read_dataset, read_json
+from utils.stats import STATUS_NAMES
+from utils.storage import AnnotationJournal, atomic_write_json
+from utils.vocab_compiler import add_vocab_term, compile_vocab, compile_vocab_file
+# sqlite_store / cluster / lint / search_index 在用到时才导入：界面也通过 ProjectHandle 打开项目，
+# 文件项目、没有聚类和质检结果的项目不加载这些模块
+
+
+class ProjectHandle:
+    # 一个已打开的项目：数据、标注管理器、词表映射和标签-类别映射，服务和 Streamlit 界面共用
+    # 其他进程（界面的其他会话、其他服务副本）写入的修改通过日志/数据库版本号增量拾取
+    def __init__(self, project_dir, name, vocab_cache_dir=None):
+        self.name = name
+        self.project_dir = project_dir
+        self.vocab_cache_dir = vocab_cache_dir
+        self.paths = project_paths(project_dir, name)
+        if self.paths["data"] is None:
+            raise FileNotFoundError(f"未找到项目数据文件: {name}")
+        self.backend = self._open_backend(self.paths["data"]) if is_sqlite_project(self.paths) else None
+        self.manager = AnnotationManager(columnar=os.environ.get("NER_COLUMNAR_STORE") == "1")
+        self.mapper = VocabularyMapper()
+        self.label_map = dict(DEFAULT_LABEL_CATEGORY_MAP)
+        self.df = None
+        self._query_index = None
+        self.clusters = None
+        self.lint = None
+        # 同一项目的读写在进程内串行，跨进程的并发由存储层的锁和按行合并处理
+        self.lock = threading.RLock()
+        self._signature = {}
+        self.refresh()
+
+    # 读取各类文件的入口，界面覆盖为会话间共享的缓存版本
+    def _open_backend(self, path):
+        from utils.sqlite_store import SQLiteProject
+
+        return SQLiteProject(path)
+
+    def _read_dataset(self, path, mtime_ns):
+        return read_dataset(path)
+
+    def _read_json(self, path, mtime_ns):
+        return read_json(path)
+
+    def _read_clusters(self, path, mtime_ns):
+        from utils.cluster import QueryClusters
+
+        return QueryClusters.from_json(read_json(path))
+
+    def refresh(self):
+        # 只重新读取发生变化的部分，返回签名变化的项（未变化时为空列表）
+        signature = project_signature(self.paths)
+        if self.backend:
+            signature["config"] = self.backend.config_revision()
+        previous = self._signature
+        if previous == signature:
+            return []
+        if previous.get("data") != signature["data"]:
+            # SQLite 项目只按页读取当前浏览窗口的数据
+            if self.backend:
+                from utils.sqlite_store import PagedFrame
+
+                df = PagedFrame(self.backend)
+            else:
+                df = self._read_dataset(self.paths["data"], signature["data"][1])
+            # SQLite 数据库随标注保存而变化，行数不变时沿用检索索引
+            if not self.backend or self.df is None or len(df) != len(self.df):
+                self._query_index = None
+            self.df = df
+        if self.backend:
+            # 词表与映射存在同一个数据库中，按库内的修订号判断是否需要刷新
+            if previous.get("config") != signature["config"]:
+                self.mapper.load_vocabulary(compile_vocab(self.backend.load_vocab(), self.vocab_cache_dir))
+                self.label_map = self.backend.load_label_map() or self.label_map
+        else:
+            if previous.get("vocab") != signature["vocab"]:
+                if signature["vocab"] is not None:
+                    # 按文件内容哈希命中编译缓存，只需反序列化
+                    self.mapper.load_vocabulary(compile_vocab_file(self.paths["vocab"], self.vocab_cache_dir))
+                else:
+                    self.mapper.load_vocabulary({})
+            if previous.get("label_map") != signature["label_map"] and signature["label_map"] is not None:
+                self.label_map = self._read_json(self.paths["label_map"], signature["label_map"][1])
+        # 先于标注加载词表，列式存储按词表顺序预置映射取值
+        self.manager.set_vocab(self.mapper.vocab)
+        if not previous:
+            self.manager.attach_journal(self.backend or AnnotationJournal(self.paths["annotations"][0]))
+        elif previous.get("annotations") != signature["annotations"]:
+            # 其他会话保存了标注：只拾取变更的行
+            self.manager.sync()
+        self.manager.set_row_count(len(self.df))
+        if previous.get("annotations") != signature["annotations"] or previous.get("suggestions") != signature["suggestions"]:
+            suggestions = self._read_json(self.paths["suggestions"], signature["suggestions"][1]) if signature["suggestions"] else {}
+            self.manager.merge_suggestions(suggestions, replace=True)
+        if previous.get("clusters") != signature["clusters"] or previous.get("data") != signature["data"]:
+            clusters = self._read_clusters(self.paths["clusters"], signature["clusters"][1]) if signature["clusters"] else None
+            # 数据行数变化后旧的聚类结果不再对应，需要重新聚类
+            self.clusters = clusters if clusters is not None and len(clusters) == len(self.df) else None
+        if previous.get("lint") != signature["lint"]:
+            # 质检结果可能来自夜间任务（python -m utils.lint），文件变化时重新读取
+            self.lint = None
+            if signature["lint"]:
+                from utils.lint import LintReport
+
+                self.lint = LintReport.from_json(self._read_json(self.paths["lint"], signature["lint"][1]))
+        self._signature = signature
+        return [kind for kind in signature if previous.get(kind) != signature[kind]]
+
+    def search_index(self):
+        # query 文本的 n-gram 索引在第一次检索时构建
+        from utils.search_index import QueryIndex, SearchIndex
+
+        if self._query_index is None:
+            self._query_index = QueryIndex(self.df['query'])
+        return SearchIndex(self._query_index, self.manager, self.clusters, self.lint)
+
+    def data_key(self):
+        # 数据版本：SQLite 数据库随标注保存而变化，按行数判断；文件项目按数据文件 mtime
+        return self.paths["data"], len(self.df) if self.backend else self._signature["data"][1]
+
+    def lint_context(self):
+        from utils.lint import lint_context
+
+        return lint_context(self.mapper.vocab, self.label_map, self.data_key())
+
+    def run_lint(self, full=False, workers=1):
+        # 增量质检并保存状态，下次（包括 python -m utils.lint）只重查变化的行
+        from utils.lint import run_lint
+
+        previous = None if full else self.lint
+        self.lint = run_lint(self.df['query'].tolist(), self.manager, self.mapper.vocab, self.label_map,
+                             self.lint_context(), previous, workers=workers)
+        atomic_write_json(self.paths["lint"], self.lint.to_json())
+        self.mark_written("lint")
+        return self.lint
+
+    def mark_written(self, kind, revision=None):
+        # 自己写入引起的变化不需要再拾取：只刷新写入的那一项签名，其他项仍留给下次 refresh 比较
+        if kind == "config":
+            # SQLite 词表/映射的修订号紧接在已知修订号之后，才说明期间没有其他进程修改
+            if revision == self._signature.get("config", 0) + 1:
+                self._signature["config"] = revision
+        else:
+            self._signature[kind] = project_signature({kind: self.paths[kind]})[kind]
+
+    def save(self):
+        # 在写锁内记下标注签名；锁释放后其他进程的追加仍会在下次 refresh 时拾取
+        self.manager.save(on_written=lambda: self.mark_written("annotations"))
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.close()
+
+
+class AnnotationService:
+    # 与界面无关的项目/标注/词表操作，脚本、导入任务和 HTTP 接口共用
+    # 打开的项目（含 SQLite 连接和已加载的标注）放在 LRU 池中复用，不在每个请求里重新打开
+    def __init__(self, project_dir="data/projects", vocab_cache_dir=None, max_open=8):
+        self.project_dir = project_dir
+        self.vocab_cache_dir = vocab_cache_dir or os.path.join(project_dir, ".vocab_cache")
+        self.max_open = max_open
+        self._projects = OrderedDict()
+        self._lock = threading.Lock()
+
+    def list_projects(self):
+        os.makedirs(self.project_dir, exist_ok=True)
+        return list_projects(self.project_dir)
+
+    def open(self, name):
+        with self._lock:
+            handle = self._projects.get(name)
+            if handle is not None:
+                self._projects.move_to_end(name)
+        if handle is None:
+            handle = ProjectHandle(self.project_dir, name, self.vocab_cache_dir)
+            with self._lock:
+                # 并发打开同一项目时保留先放入池中的
+                handle = self._projects.setdefault(name, handle)
+                self._projects.move_to_end(name)
+                evicted = []
+                while len(self._projects) > self.max_open:
+                    evicted.append(self._projects.popitem(last=False)[1])
+            for old in evicted:
+                with old.lock:
+                    old.save()
+                    old.close()
+        with handle.lock:
+            handle.refresh()
+        return handle
+
+    def close(self):
+        with self._lock:
+            handles, self._projects = list(self._projects.values()), OrderedDict()
+        for handle in handles:
+            with handle.lock:
+                handle.save()
+                handle.close()
+
+    def _check_row(self, handle, idx):
+        if not 0 <= idx < len(handle.df):
+            raise IndexError(f"行号超出范围: {idx}")
+
+    def _row(self, handle, idx):
+        # 返回副本，序列化时不受其他请求修改的影响
+        manager = handle.manager
+        return {
+            "row": idx,
+            "query": handle.df.iloc[idx]['query'],
+            "status": STATUS_NAMES[manager.get_row_status(idx)],
+            "annotations": copy.deepcopy(manager.get_annotations(idx)),
+            "suggestions": copy.deepcopy(manager.get_suggestions(idx)),
+        }
+
+    def get_row(self, name, idx):
+        handle = self.open(name)
+        with handle.lock:
+            self._check_row(handle, idx)
+            return self._row(handle, idx)
+
+    def get_rows(self, name, offset=0, limit=100):
+        handle = self.open(name)
+        with handle.lock:
+            end = min(offset + limit, len(handle.df))
+            return [self._row(handle, idx) for idx in range(max(offset, 0), end)]
+
+    def add_span(self, name, idx, span):
+        handle = self.open(name)
+        with handle.lock:
+            self._check_row(handle, idx)
+            span = dict(span)
+            span.setdefault('mapped_value', {})
+            if not handle.manager.add_annotation(idx, span):
+                return False
+            handle.save()
+            return True
+
+    def update_span(self, name, idx, span_idx, span):
+        # span 中未给出的字段沿用原值，只改 mapped_value 时只需传 {"mapped_value": ...}
+        handle = self.open(name)
+        with handle.lock:
+            self._check_row(handle, idx)
+            row = handle.manager.get_annotations(idx)
+            if not 0 <= span_idx < len(row):
+                raise IndexError(f"标注序号超出范围: {span_idx}")
+            if not handle.manager.update_annotation(idx, span_idx, dict(row[span_idx], **span)):
+                return False
+            handle.save()
+            return True
+
+    def map_span(self, name, idx, span_idx, mapped_value):
+        return self.update_span(name, idx, span_idx, {"mapped_value": mapped_value})
+
+    def remove_span(self, name, idx, span_idx):
+        handle = self.open(name)
+        with handle.lock:
+            self._check_row(handle, idx)
+            if not 0 <= span_idx < len(handle.manager.get_annotations(idx)):
+                raise IndexError(f"标注序号超出范围: {span_idx}")
+            handle.manager.remove_annotation(idx, span_idx)
+            handle.save()
+
+    def write_rows(self, name, rows, replace=True):
+        # 批量写入 {行号: [span]}：replace=True 时整行替换，否则追加到已有标注
+        # 全部行处理完后只保存一次（一次加锁、一次追加写入）；返回 {"updated": [...], "rejected": [...]}
+        handle = self.open(name)
+        updated, rejected = [], []
+        with handle.lock:
+            manager = handle.manager
+            for idx, spans in rows.items():
+                idx = int(idx)
+                if not 0 <= idx < len(handle.df):
+                    rejected.append(idx)
+                    continue
+                spans = [dict(span, mapped_value=span.get('mapped_value') or {}) for span in spans]
+                ok = manager.replace_annotations(idx, spans) if replace else manager.add_annotations(idx, spans)
+                (updated if ok else rejected).append(idx)
+            if updated:
+                handle.save()
+        return {"updated": updated, "rejected": rejected}
+
+    def search(self, name, query, offset=0, limit=100):
+        # 检索式语法见 utils.search_index；返回命中总数和 [offset, offset + limit) 范围内的行号
+        handle = self.open(name)
+        with handle.lock:
+            from utils.search_index import FilteredView
+
+            rows = handle.search_index().search(query)
+            view = FilteredView(rows if rows is not None else range(len(handle.df)))
+            return {"total": len(view), "rows": view.rows[max(offset, 0):max(offset, 0) + limit].tolist()}
+
+    def cluster_members(self, name, idx):
+        # idx 所在近重复簇的代表和全部成员行号；项目未聚类时返回 None
+        handle = self.open(name)
+        with handle.lock:
+            self._check_row(handle, idx)
+            if handle.clusters is None:
+                return None
+            return {"representative": handle.clusters.representative(idx),
+                    "members": handle.clusters.members(idx).tolist()}
+
+    def project_cluster(self, name, idx, overwrite=False):
+        # 把 idx 行的标注对齐后投射到同簇其他行，返回写入的行号
+        handle = self.open(name)
+        with handle.lock:
+            self._check_row(handle, idx)
+            if handle.clusters is None:
+                raise ValueError("项目尚未聚类，请先运行 python -m utils.cluster")
+            targets = [(int(m), handle.df.iloc[int(m)]['query']) for m in handle.clusters.members(idx)]
+            written = handle.manager.project_annotations(idx, handle.df.iloc[idx]['query'], targets, overwrite=overwrite)
+            if written:
+                handle.save()
+            return written
+
+    def lint(self, name, full=False):
+        # 质检并返回汇总：重查行数、有问题的行数、各检查项的问题数
+        handle = self.open(name)
+        with handle.lock:
+            report = handle.run_lint(full=full)
+            return {"checked": report.checked, "rows": len(report.rows()), "counts": dict(report.counts())}
+
+    def row_issues(self, name, idx):
+        # 上次质检时 idx 行的问题；项目从未质检时返回 None
+        handle = self.open(name)
+        with handle.lock:
+            self._check_row(handle, idx)
+            return None if handle.lint is None else handle.lint.issues(idx)
+
+    def propagate_mapping(self, name, text, label, mapped_value, overwrite=False):
+        handle = self.open(name)
+        with handle.lock:
+            updated = handle.manager.propagate_mapping(text, label, mapped_value, overwrite=overwrite)
+            if updated:
+                handle.save()
+            return updated
+
+    def suggest_mapping(self, name, text, label):
+        handle = self.open(name)
+        with handle.lock:
+            return handle.manager.suggest_mapping(text, label)
+
+    def find_mappings(self, name, text, category, top_k=20):
+        handle = self.open(name)
+        with handle.lock:
+            return handle.mapper.find_mappings(text, category, top_k=top_k)
+
+    def add_vocab_term(self, name, category, term):
+        handle = self.open(name)
+        with handle.lock:
+            if not handle.mapper.add_candidate(category, term):
+                return False
+            if handle.backend is not None:
+                handle.mark_written("config", handle.backend.add_vocab_term(category, term))
+            else:
+                add_vocab_term(handle.paths["vocab"], category, term, self.vocab_cache_dir)
+                handle.mark_written("vocab")
+            return True
+
+    def save_label_map(self, name, label_map):
+        handle = self.open(name)
+        with handle.lock:
+            handle.label_map = label_map
+            if handle.backend is not None:
+                handle.mark_written("config", handle.backend.save_label_map(label_map))
+            else:
+                atomic_write_json(handle.paths["label_map"], label_map)
+                handle.mark_written("label_map")
+
+    def stats(self, name):
+        handle = self.open(name)
+        with handle.lock:
+            stats = handle.manager.stats
+            return {
+                "rows": len(handle.df),
+                "spans": stats.total,
+                "mapped": stats.mapped,
+                "progress": stats.progress(),
+                "status": {STATUS_NAMES[status]: stats.status_counts[status] for status in STATUS_NAMES},
+                "labels": {label: n for label, n in stats.label_counts.items() if n > 0},
+            }
+
+    def export(self, name, fmt, path):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        handle = self.open(name)
+        with handle.lock:
+            return export_to_file(path, fmt, handle.df, handle.manager)
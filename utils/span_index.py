@@ -0,0 +1,110 @@
+import json
+from collections import Counter
+
+from utils.stats import is_mapped
+
+
+def mapping_signature(mapped_value):
+    # 映射的规范形式（去掉空类别、键排序），用作频次统计和比较的键
+    if not isinstance(mapped_value, dict):
+        return "{}"
+    return json.dumps({cat: values for cat, values in mapped_value.items() if values},
+                      ensure_ascii=False, sort_keys=True)
+
+
+def _count(postings, key, idx, sign):
+    # 倒排表中 key 在行 idx 上的计数加减 sign，计数归零时删除；返回 key 下的行数
+    rows = postings.setdefault(key, {})
+    count = rows.get(idx, 0) + sign
+    if count > 0:
+        rows[idx] = count
+    else:
+        rows.pop(idx, None)
+        if not rows:
+            del postings[key]
+            return 0
+    return len(rows)
+
+
+class SpanIndex:
+    # 倒排索引：(span 文本, 标签) -> {行号: 该行中出现次数}，以及同一写法各种已有映射的出现次数
+    # 与 AnnotationStats 一样经由 AnnotationManager 的 span 增删钩子增量维护
+    def __init__(self):
+        self.rows = {}
+        self.mappings = {}
+        # 文本 -> 出现过的标签，按文本检索时合并各标签的行
+        self.labels_by_text = {}
+        # 映射值倒排：(标签, 类别, 值) -> {行号: 次数}；值 -> 出现过的 (标签, 类别, 值)
+        self.mapped_rows = {}
+        self.mapped_keys = {}
+
+    def rebuild(self, annotations):
+        self.__init__()
+        for idx, row in annotations.items():
+            for span in row or []:
+                self.add(int(idx), span)
+
+    def _apply(self, idx, span, sign):
+        key = (span.get('text'), span.get('label'))
+        if _count(self.rows, key, idx, sign) == 1:
+            self.labels_by_text.setdefault(key[0], set()).add(key[1])
+        elif key not in self.rows:
+            labels = self.labels_by_text.get(key[0])
+            if labels is not None:
+                labels.discard(key[1])
+                if not labels:
+                    del self.labels_by_text[key[0]]
+        if is_mapped(span):
+            for category, values in span['mapped_value'].items():
+                for value in values if isinstance(values, list) else [values]:
+                    mapped_key = (key[1], category, str(value))
+                    _count(self.mapped_rows, mapped_key, idx, sign)
+                    keys = self.mapped_keys.setdefault(mapped_key[2], set())
+                    if mapped_key in self.mapped_rows:
+                        keys.add(mapped_key)
+                    else:
+                        keys.discard(mapped_key)
+                        if not keys:
+                            del self.mapped_keys[mapped_key[2]]
+            counter = self.mappings.setdefault(key, Counter())
+            signature = mapping_signature(span['mapped_value'])
+            counter[signature] += sign
+            if counter[signature] <= 0:
+                del counter[signature]
+                if not counter:
+                    del self.mappings[key]
+
+    def rows_with_text(self, text):
+        # 任意标签下文本为 text 的 span 所在的行
+        rows = set()
+        for label in self.labels_by_text.get(text, ()):
+            rows.update(self.rows[(text, label)])
+        return rows
+
+    def rows_with_mapping(self, value, category=None, label=None):
+        # 映射到 value 的 span 所在的行，可限定类别或标签
+        rows = set()
+        for key in self.mapped_keys.get(value, ()):
+            if (category is None or key[1] == category) and (label is None or key[0] == label):
+                rows.update(self.mapped_rows[key])
+        return rows
+
+    def add(self, idx, span):
+        self._apply(idx, span, 1)
+
+    def remove(self, idx, span):
+        self._apply(idx, span, -1)
+
+    def occurrences(self, text, label):
+        return sum(self.rows.get((text, label), {}).values())
+
+    def rows_of(self, text, label):
+        return sorted(self.rows.get((text, label), ()))
+
+    def suggest(self, text, label):
+        # 同一写法最常用的已有映射，返回 (mapped_value, 次数)；没有已映射的出现时返回 None
+        counter = self.mappings.get((text, label))
+        if not counter:
+            return None
+        signature, count = max(counter.items(), key=lambda item: (item[1], item[0]))
+        return json.loads(signature), count
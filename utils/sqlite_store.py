@@ -0,0 +1,439 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+from utils.stats import STATUS_DONE, STATUS_INCOMPLETE, STATUS_NOT_STARTED, is_mapped
+from utils.vocab_compiler import term_list
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS queries (
+    row_id INTEGER PRIMARY KEY,
+    query TEXT,
+    extra TEXT,
+    status INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_queries_status ON queries(status, row_id);
+CREATE TABLE IF NOT EXISTS spans (
+    row_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    start INTEGER,
+    "end" INTEGER,
+    label TEXT,
+    text TEXT,
+    extra TEXT,
+    PRIMARY KEY (row_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_spans_label ON spans(label, row_id);
+CREATE TABLE IF NOT EXISTS mappings (
+    row_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    value TEXT,
+    PRIMARY KEY (row_id, seq, category, position)
+);
+CREATE INDEX IF NOT EXISTS idx_mappings_value ON mappings(category, value);
+CREATE TABLE IF NOT EXISTS vocab (
+    category TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    term TEXT NOT NULL,
+    PRIMARY KEY (category, term)
+);
+"""
+
+SPAN_FIELDS = ('text', 'label', 'start', 'end', 'mapped_value')
+# 单条语句绑定参数的上限，低于旧版 SQLite 默认的 SQLITE_MAX_VARIABLE_NUMBER(999)
+MAX_BOUND_PARAMS = 900
+
+
+def row_status(spans):
+    if not spans:
+        return STATUS_NOT_STARTED
+    return STATUS_DONE if all(is_mapped(s) for s in spans) else STATUS_INCOMPLETE
+
+
+class SQLiteProject:
+    # 单文件 SQLite 项目（WAL 模式）：查询、span、映射、词表分表存储，支持按行读写与分页读取
+    # 标注读写接口与 AnnotationJournal 一致，可直接交给 AnnotationManager.attach_journal
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {r[1] for r in self._conn.execute("PRAGMA table_info(queries)")}
+        if "version" not in columns:
+            # 旧版本建的库没有行版本列
+            self._conn.execute("ALTER TABLE queries ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_queries_version ON queries(version)")
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)",
+                           (key, json.dumps(value, ensure_ascii=False)))
+
+    # ---- 查询数据 ----
+    def columns(self):
+        with self._lock:
+            return self._meta("columns", ["query"])
+
+    def count_queries(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+
+    def get_queries(self, offset, limit):
+        # 按行号区间分页读取，走主键范围扫描
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query, extra FROM queries WHERE row_id >= ? AND row_id < ? ORDER BY row_id",
+                (offset, offset + limit),
+            ).fetchall()
+            columns = self._meta("columns", ["query"])
+        records = []
+        for query, extra in rows:
+            record = json.loads(extra) if extra else {}
+            record['query'] = query
+            records.append(record)
+        return pd.DataFrame.from_records(records, columns=columns)
+
+    def column_values(self, column):
+        with self._lock:
+            if column == 'query':
+                return [r[0] for r in self._conn.execute("SELECT query FROM queries ORDER BY row_id")]
+            return [json.loads(r[0]).get(column) if r[0] else None
+                    for r in self._conn.execute("SELECT extra FROM queries ORDER BY row_id")]
+
+    def rows_with_status(self, status, limit=None):
+        with self._lock:
+            sql = "SELECT row_id FROM queries WHERE status=? ORDER BY row_id"
+            params = (status,)
+            if limit is not None:
+                sql += " LIMIT ?"
+                params += (limit,)
+            return [r[0] for r in self._conn.execute(sql, params)]
+
+    def import_dataframe(self, df, chunk_size=10000):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM queries")
+            for begin in range(0, len(df), chunk_size):
+                self._insert_queries(df.iloc[begin:begin + chunk_size], begin)
+
+    def append_queries(self, chunk, offset):
+        # 流式导入：按块追加，行号从 offset 开始；第一块同时记录列名
+        with self._lock, self._conn:
+            if offset == 0:
+                self._conn.execute("DELETE FROM queries")
+            self._insert_queries(chunk, offset)
+
+    def _insert_queries(self, chunk, offset):
+        columns = [c for c in chunk.columns if c != 'annotations']
+        if offset == 0:
+            self._set_meta("columns", columns)
+        extra_columns = [c for c in columns if c != 'query']
+        batch = []
+        for i, record in enumerate(chunk[columns].to_dict("records")):
+            extra = {c: record[c] for c in extra_columns}
+            batch.append((offset + i, record.get('query'),
+                          json.dumps(extra, ensure_ascii=False, default=str) if extra else None))
+        self._conn.executemany("INSERT INTO queries(row_id, query, extra) VALUES (?, ?, ?)", batch)
+
+    # ---- 标注（与 AnnotationJournal 相同的接口） ----
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        return self.load_rows(None)
+
+    def load_rows(self, row_ids):
+        # row_ids 为 None 时加载全部有标注的行
+        with self._lock:
+            if row_ids is None:
+                span_rows = self._conn.execute(
+                    'SELECT row_id, seq, start, "end", label, text, extra FROM spans ORDER BY row_id, seq').fetchall()
+                map_rows = self._conn.execute(
+                    "SELECT row_id, seq, category, value FROM mappings ORDER BY row_id, seq, category, position").fetchall()
+            else:
+                # 行号分批绑定，整体覆盖或批量传播后一次变更的行数可能远超参数上限
+                ids = sorted(int(i) for i in row_ids)
+                span_rows, map_rows = [], []
+                for i in range(0, len(ids), MAX_BOUND_PARAMS):
+                    batch = ids[i:i + MAX_BOUND_PARAMS]
+                    marks = ",".join("?" * len(batch))
+                    span_rows.extend(self._conn.execute(
+                        f'SELECT row_id, seq, start, "end", label, text, extra FROM spans WHERE row_id IN ({marks}) '
+                        f'ORDER BY row_id, seq', batch))
+                    map_rows.extend(self._conn.execute(
+                        f"SELECT row_id, seq, category, value FROM mappings WHERE row_id IN ({marks}) "
+                        f"ORDER BY row_id, seq, category, position", batch))
+        spans = {}
+        annotations = {} if row_ids is None else {int(i): [] for i in row_ids}
+        for row_id, seq, start, end, label, text, extra in span_rows:
+            span = {'text': text, 'label': label, 'start': start, 'end': end, 'mapped_value': {}}
+            if extra:
+                span.update(json.loads(extra))
+            spans[(row_id, seq)] = span
+            annotations.setdefault(row_id, []).append(span)
+        for row_id, seq, category, value in map_rows:
+            span = spans.get((row_id, seq))
+            if span is not None:
+                span['mapped_value'].setdefault(category, []).append(value)
+        return annotations
+
+    def _next_versions(self, count):
+        seq = self._meta("seq", 0)
+        self._set_meta("seq", seq + count)
+        return range(seq + 1, seq + count + 1)
+
+    def _write_rows(self, changes):
+        versions = {}
+        for (row_id, spans), version in zip(changes.items(), self._next_versions(len(changes))):
+            row_id = int(row_id)
+            self._conn.execute("DELETE FROM spans WHERE row_id=?", (row_id,))
+            self._conn.execute("DELETE FROM mappings WHERE row_id=?", (row_id,))
+            span_batch, map_batch = [], []
+            for seq, span in enumerate(spans or []):
+                extra = {k: v for k, v in span.items() if k not in SPAN_FIELDS}
+                mapped = span.get('mapped_value')
+                if not isinstance(mapped, dict):
+                    # 非标准格式的 mapped_value 原样存入 extra
+                    extra['mapped_value'] = mapped
+                    mapped = {}
+                span_batch.append((row_id, seq, span.get('start'), span.get('end'), span.get('label'),
+                                   span.get('text'), json.dumps(extra, ensure_ascii=False) if extra else None))
+                for category, values in mapped.items():
+                    values = values if isinstance(values, list) else [values]
+                    map_batch.extend((row_id, seq, category, pos, v) for pos, v in enumerate(values))
+            self._conn.executemany(
+                'INSERT INTO spans(row_id, seq, start, "end", label, text, extra) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                span_batch)
+            self._conn.executemany(
+                "INSERT INTO mappings(row_id, seq, category, position, value) VALUES (?, ?, ?, ?, ?)", map_batch)
+            self._conn.execute("UPDATE queries SET status=?, version=? WHERE row_id=?",
+                               (row_status(spans), version, row_id))
+            versions[row_id] = version
+        return versions
+
+    def append(self, changes):
+        # 单个事务内按行覆盖，只触及变更的行；返回 {行号: 新版本号}
+        if not changes:
+            return {}
+        with self._lock, self._conn:
+            return self._write_rows(changes)
+
+    @contextmanager
+    def locked(self):
+        # 同进程的会话共用连接，靠 RLock 串行；其他进程靠 BEGIN IMMEDIATE 持有写锁直到 append 提交
+        with self._lock:
+            if not self._conn.in_transaction:
+                self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self
+            finally:
+                if self._conn.in_transaction:
+                    self._conn.commit()
+
+    def load_versioned(self):
+        with self._lock:
+            versions = dict(self._conn.execute("SELECT row_id, version FROM queries WHERE version > 0"))
+            return self.load(), versions, self._meta("seq", 0)
+
+    def changes_since(self, cursor):
+        # 游标即已见到的最大版本号，按版本索引取出之后被改过的行
+        cursor = cursor or 0
+        with self._lock:
+            versions = dict(self._conn.execute(
+                "SELECT row_id, version FROM queries WHERE version > ?", (cursor,)))
+            changes = self.load_rows(versions) if versions else {}
+        return changes, versions, max(versions.values(), default=cursor)
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, annotations=None, versions=None):
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def reset(self, annotations):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM spans")
+            self._conn.execute("DELETE FROM mappings")
+            # 所有行统一升版本，其他会话会整体拾取这次覆盖
+            version = self._next_versions(1)[0]
+            self._conn.execute("UPDATE queries SET status=?, version=?", (STATUS_NOT_STARTED, version))
+            self._write_rows({k: v for k, v in annotations.items() if v})
+
+    # ---- 词表与标签映射 ----
+    def config_revision(self):
+        # 词表或标签映射每次修改都递增；数据库文件随标注保存而变化，不能据此判断词表是否变化
+        with self._lock:
+            return self._meta("config_rev", 0)
+
+    def _bump_config(self):
+        revision = self._meta("config_rev", 0) + 1
+        self._set_meta("config_rev", revision)
+        return revision
+
+    def load_vocab(self):
+        vocab = {}
+        with self._lock:
+            for category, term in self._conn.execute("SELECT category, term FROM vocab ORDER BY category, position"):
+                vocab.setdefault(category, []).append(term)
+        return vocab
+
+    def has_vocab(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM vocab LIMIT 1").fetchone() is not None
+
+    def save_vocab(self, vocab):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM vocab")
+            for category, terms in vocab.items():
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO vocab(category, position, term) VALUES (?, ?, ?)",
+                    [(category, pos, str(term)) for pos, term in enumerate(term_list(terms))])
+            return self._bump_config()
+
+    def add_vocab_term(self, category, term):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO vocab(category, position, term) "
+                "VALUES (?, (SELECT COALESCE(MAX(position), -1) + 1 FROM vocab WHERE category=?), ?)",
+                (category, category, term))
+            return self._bump_config()
+
+    def load_label_map(self):
+        with self._lock:
+            return self._meta("label_map")
+
+    def save_label_map(self, label_map):
+        with self._lock, self._conn:
+            self._set_meta("label_map", label_map)
+            return self._bump_config()
+
+
+class _ILoc:
+    def __init__(self, frame):
+        self._frame = frame
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self._frame))
+            page = self._frame.project.get_queries(start, max(stop - start, 0))
+            return page.iloc[::step] if step != 1 else page
+        if key < 0:
+            key += len(self._frame)
+        page_start, page = self._frame._page(key)
+        return page.iloc[key - page_start]
+
+
+class PagedFrame:
+    # 只读、按需分页的 DataFrame 替身：只缓存当前浏览窗口附近的若干页
+    def __init__(self, project, page_size=1000, max_pages=8):
+        self.project = project
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self._len = project.count_queries()
+        self._pages = OrderedDict()
+        self.iloc = _ILoc(self)
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def columns(self):
+        return pd.Index(self.project.columns())
+
+    def _page(self, idx):
+        page_no = idx // self.page_size
+        page = self._pages.get(page_no)
+        if page is None:
+            page = self.project.get_queries(page_no * self.page_size, self.page_size)
+            self._pages[page_no] = page
+            if len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page_no)
+        return page_no * self.page_size, page
+
+    def __getitem__(self, column):
+        # 整列读取（批处理场景，如预标注）
+        return pd.Series(self.project.column_values(column), name=column)
+
+
+def import_file_project(project_dir, name, db_path=None):
+    # 把现有的文件布局（数据/标注/词表/映射）导入为 <name>.db
+    from utils.project import project_paths, read_dataset, read_json
+    from utils.storage import AnnotationJournal
+
+    paths = project_paths(project_dir, name)
+    if paths["data"] is None or paths["data"].endswith(".db"):
+        raise FileNotFoundError(f"未找到项目数据文件: {name}")
+    db_path = db_path or f"{project_dir}/{name}.db"
+    project = SQLiteProject(db_path)
+    project.import_dataframe(read_dataset(paths["data"]))
+    project.reset(AnnotationJournal(paths["annotations"][0]).load())
+    if os.path.exists(paths["vocab"]):
+        project.save_vocab(read_json(paths["vocab"]))
+    if os.path.exists(paths["label_map"]):
+        project.save_label_map(read_json(paths["label_map"]))
+    project.compact()
+    return project
+
+
+def export_file_project(db_path, project_dir, name, chunk_size=10000):
+    # 把 SQLite 项目导出为文件布局
+    from utils.storage import AnnotationJournal, atomic_write_json
+
+    project = SQLiteProject(db_path)
+    total = project.count_queries()
+    data_path = f"{project_dir}/{name}.csv"
+    for begin in range(0, total, chunk_size):
+        project.get_queries(begin, chunk_size).to_csv(
+            data_path, mode="w" if begin == 0 else "a", header=begin == 0, index=False,
+            encoding="utf-8-sig" if begin == 0 else "utf-8")
+    annotations = project.load()
+    AnnotationJournal(f"{project_dir}/{name}_annotations.json").reset(
+        {i: annotations.get(i, []) for i in range(total)})
+    vocab = project.load_vocab()
+    if vocab:
+        atomic_write_json(f"{project_dir}/{name}_vocab.json", vocab)
+    label_map = project.load_label_map()
+    if label_map:
+        atomic_write_json(f"{project_dir}/{name}_label_map.json", label_map)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 项目与文件布局互相转换")
+    parser.add_argument("action", choices=["import", "export"], help="import: 文件 -> db；export: db -> 文件")
+    parser.add_argument("project", help="项目名称")
+    parser.add_argument("--project-dir", default="data/projects", help="项目目录")
+    parser.add_argument("--db", help="数据库路径，默认为 <项目目录>/<项目名>.db")
+    args = parser.parse_args()
+    db_path = args.db or f"{args.project_dir}/{args.project}.db"
+    if args.action == "import":
+        project = import_file_project(args.project_dir, args.project, db_path)
+        print(f"已导入 {project.count_queries()} 条数据到 {db_path}")
+    else:
+        export_file_project(db_path, args.project_dir, args.project)
+        print(f"已导出 {db_path} 到 {args.project_dir}")
+
+
+if __name__ == "__main__":
+    main()
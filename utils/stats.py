@@ -0,0 +1,95 @@
+from collections import Counter
+
+STATUS_NOT_STARTED = 0
+STATUS_INCOMPLETE = 1
+STATUS_DONE = 2
+
+STATUS_NAMES = {
+    STATUS_NOT_STARTED: "未开始标注",
+    STATUS_INCOMPLETE: "映射未完成",
+    STATUS_DONE: "标注完成",
+}
+
+
+def is_mapped(span):
+    # mapped_value 字典有内容即认为已完成映射
+    mapped = span.get("mapped_value")
+    return isinstance(mapped, dict) and any(mapped.values())
+
+
+class AnnotationStats:
+    # 标注统计的增量维护：每次增删改只更新受影响的计数，读取为 O(1)
+    def __init__(self, n_rows=0):
+        self.total = 0
+        self.mapped = 0
+        self.label_counts = Counter()
+        # 每个类别被映射到的 span 数
+        self.category_counts = Counter()
+        self._row_total = []
+        self._row_unmapped = []
+        # 每行状态，取值见 STATUS_*
+        self.row_status = bytearray()
+        self.status_counts = Counter()
+        self.resize(n_rows)
+
+    @property
+    def n_rows(self):
+        return len(self.row_status)
+
+    def resize(self, n_rows):
+        grow = n_rows - len(self.row_status)
+        if grow > 0:
+            self._row_total.extend([0] * grow)
+            self._row_unmapped.extend([0] * grow)
+            self.row_status.extend(bytes(grow))
+            self.status_counts[STATUS_NOT_STARTED] += grow
+
+    def rebuild(self, annotations, n_rows=0):
+        self.__init__(max(n_rows, max((int(k) for k in annotations), default=-1) + 1))
+        for idx, row in annotations.items():
+            for span in row or []:
+                self.add_span(int(idx), span)
+
+    def status(self, idx):
+        return self.row_status[idx] if 0 <= idx < len(self.row_status) else STATUS_NOT_STARTED
+
+    def _set_status(self, idx):
+        if self._row_total[idx] == 0:
+            status = STATUS_NOT_STARTED
+        elif self._row_unmapped[idx]:
+            status = STATUS_INCOMPLETE
+        else:
+            status = STATUS_DONE
+        old = self.row_status[idx]
+        if old != status:
+            self.status_counts[old] -= 1
+            self.status_counts[status] += 1
+            self.row_status[idx] = status
+            return old
+        return None
+
+    def _apply(self, idx, span, sign):
+        if idx >= len(self.row_status):
+            self.resize(idx + 1)
+        mapped = is_mapped(span)
+        self.total += sign
+        self.label_counts[span.get("label")] += sign
+        self._row_total[idx] += sign
+        if mapped:
+            self.mapped += sign
+            for cat, values in span["mapped_value"].items():
+                if values:
+                    self.category_counts[cat] += sign
+        else:
+            self._row_unmapped[idx] += sign
+        return self._set_status(idx)
+
+    def add_span(self, idx, span):
+        # 返回行状态变化前的旧状态，未变化返回 None
+        return self._apply(idx, span, 1)
+
+    def remove_span(self, idx, span):
+        return self._apply(idx, span, -1)
+
+    def progress(self):
+        return self.mapped / self.total if self.total else 0
@@ -0,0 +1,188 @@
+import random
+from array import array
+
+import numpy as np
+
+from utils.stats import STATUS_DONE, STATUS_INCOMPLETE, STATUS_NOT_STARTED
+
+
+class FenwickSet:
+    # 行号集合（0..n-1），基于树状数组，成员增删、排名、按序号取成员均为 O(log n)
+    def __init__(self, n=0, members=None):
+        self.members = bytearray(members) if members is not None else bytearray(n)
+        self._build()
+
+    def _build(self):
+        # 用前缀和向量化建树：tree[i] = prefix[i] - prefix[i - lowbit(i)]
+        n = len(self.members)
+        flags = np.frombuffer(bytes(self.members), dtype=np.uint8)
+        prefix = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(flags, out=prefix[1:])
+        pos = np.arange(1, n + 1, dtype=np.int64)
+        tree = np.zeros(n + 1, dtype=np.int32)
+        tree[1:] = prefix[pos] - prefix[pos - (pos & -pos)]
+        self.tree = array('i', tree.tobytes())
+        self.count = int(prefix[-1])
+        self._top = 1 << (n.bit_length() - 1) if n else 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, i):
+        return 0 <= i < len(self.members) and bool(self.members[i])
+
+    def resize(self, n):
+        if n > len(self.members):
+            self.members.extend(bytes(n - len(self.members)))
+            self._build()
+
+    def _update(self, i, delta):
+        tree, n = self.tree, len(self.members)
+        i += 1
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+
+    def add(self, i):
+        if i >= len(self.members):
+            self.resize(i + 1)
+        if not self.members[i]:
+            self.members[i] = 1
+            self.count += 1
+            self._update(i, 1)
+
+    def discard(self, i):
+        if 0 <= i < len(self.members) and self.members[i]:
+            self.members[i] = 0
+            self.count -= 1
+            self._update(i, -1)
+
+    def rank(self, i):
+        # 小于 i 的成员个数
+        tree, total = self.tree, 0
+        i = min(i, len(self.members))
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def select(self, k):
+        # 第 k 个成员（从 0 开始）
+        if not 0 <= k < self.count:
+            return None
+        tree, n, pos, step = self.tree, len(self.members), 0, self._top
+        while step:
+            nxt = pos + step
+            if nxt <= n and tree[nxt] <= k:
+                pos = nxt
+                k -= tree[nxt]
+            step >>= 1
+        return pos
+
+    def count_in(self, lo, hi):
+        # [lo, hi) 内的成员个数
+        return self.rank(hi) - self.rank(lo)
+
+    def next_after(self, i, wrap=True, lo=0, hi=None):
+        # 只在 [lo, hi) 内查找，wrap 时回绕到区间开头
+        hi_rank = self.count if hi is None else self.rank(hi)
+        k = max(self.rank(i + 1), self.rank(lo))
+        if k < hi_rank:
+            return self.select(k)
+        if not wrap:
+            return None
+        k = self.rank(lo)
+        return self.select(k) if k < hi_rank else None
+
+    def prev_before(self, i, wrap=True, lo=0, hi=None):
+        hi_rank = self.count if hi is None else self.rank(hi)
+        lo_rank = self.rank(lo)
+        k = min(self.rank(i), hi_rank)
+        if k > lo_rank:
+            return self.select(k - 1)
+        if not wrap:
+            return None
+        return self.select(hi_rank - 1) if hi_rank > lo_rank else None
+
+    def sample(self, k=1, rng=None):
+        rng = rng or random
+        picks = rng.sample(range(self.count), min(k, self.count))
+        return [self.select(p) for p in picks]
+
+
+class RowIndex:
+    # 按行状态、按标签维护的行集合，用于"跳到下一条未完成"等导航查询
+    def __init__(self, n_rows=0):
+        self.by_status = {}
+        # 标签 -> 每行该标签的 span 数；标签 -> 含该标签的行集合
+        self._label_counts = {}
+        self.by_label = {}
+        self.rebuild(bytearray(n_rows), {})
+
+    @property
+    def n_rows(self):
+        return len(self.by_status[STATUS_NOT_STARTED].members)
+
+    def rebuild(self, row_status, annotations):
+        row_status = bytes(row_status)
+        self.by_status = {}
+        for status in (STATUS_NOT_STARTED, STATUS_INCOMPLETE, STATUS_DONE):
+            table = bytes(1 if s == status else 0 for s in range(256))
+            self.by_status[status] = FenwickSet(members=row_status.translate(table))
+        n_rows = len(row_status)
+        self._label_counts = {}
+        members = {}
+        for idx, row in annotations.items():
+            idx = int(idx)
+            for span in row or []:
+                label = span.get('label')
+                counts = self._label_counts.get(label)
+                if counts is None:
+                    counts = self._label_counts[label] = array('i', bytes(4 * n_rows))
+                    members[label] = bytearray(n_rows)
+                counts[idx] += 1
+                members[label][idx] = 1
+        self.by_label = {label: FenwickSet(members=m) for label, m in members.items()}
+
+    def resize(self, n_rows):
+        old = self.n_rows
+        if n_rows <= old:
+            return
+        for fs in self.by_status.values():
+            fs.resize(n_rows)
+        # 新增的行都是未开始
+        not_started = self.by_status[STATUS_NOT_STARTED]
+        for idx in range(old, n_rows):
+            not_started.add(idx)
+        for label, counts in self._label_counts.items():
+            if n_rows > len(counts):
+                counts.extend(array('i', bytes(4 * (n_rows - len(counts)))))
+                self.by_label[label].resize(n_rows)
+
+    def set_status(self, idx, old, new):
+        self.by_status[old].discard(idx)
+        self.by_status[new].add(idx)
+
+    def add_label(self, idx, label):
+        counts = self._label_counts.get(label)
+        if counts is None:
+            counts = self._label_counts[label] = array('i', bytes(4 * max(self.n_rows, idx + 1)))
+            self.by_label[label] = FenwickSet(len(counts))
+        if idx >= len(counts):
+            counts.extend(array('i', bytes(4 * (idx + 1 - len(counts)))))
+        counts[idx] += 1
+        if counts[idx] == 1:
+            self.by_label[label].add(idx)
+
+    def remove_label(self, idx, label):
+        counts = self._label_counts.get(label)
+        if counts is None or idx >= len(counts) or counts[idx] <= 0:
+            return
+        counts[idx] -= 1
+        if counts[idx] == 0:
+            self.by_label[label].discard(idx)
+
+    def rows(self, status=None, label=None):
+        if label is not None:
+            return self.by_label.get(label) or FenwickSet()
+        return self.by_status[status]
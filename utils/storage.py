@@ -0,0 +1,250 @@
+import json
+import os
+
+from utils import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 快照中保存行版本号的键，与行号键区分
+VERSIONS_KEY = "_versions"
+
+
+def atomic_write_json(path, obj):
+    # 先写临时文件再原子重命名，写到一半崩溃也不会留下截断的文件
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+        metrics.count("bytes_written", f.tell())
+    os.replace(tmp_path, path)
+
+
+def atomic_write_bytes(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    metrics.count("bytes_written", len(data))
+    os.replace(tmp_path, path)
+
+
+class FileLock:
+    # 进程间互斥锁（独占锁文件），多个会话写同一项目时串行化"读最新 -> 合并 -> 追加"
+    # 不可重入，同一线程内不要嵌套获取
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a+")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+def update_json(path, update, default=None):
+    # 加锁读取最新内容、就地修改后原子写回，避免多个会话整体覆盖彼此的修改
+    with FileLock(f"{path}.lock"):
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                obj = json.load(f)
+        else:
+            obj = default if default is not None else {}
+        update(obj)
+        atomic_write_json(path, obj)
+    return obj
+
+
+class AnnotationJournal:
+    # 标注持久化：快照(<project>_annotations.json) + 追加日志(<project>_annotations.journal)
+    # 每次修改只追加变更行的记录，日志超过阈值后合并进快照
+    # 每条记录带行版本号（全局递增序号），多个会话据此按行合并、增量拾取彼此的修改
+    def __init__(self, snapshot_path, compact_threshold=4 * 1024 * 1024):
+        self.snapshot_path = snapshot_path
+        base = os.path.splitext(snapshot_path)[0]
+        self.journal_path = f"{base}.journal"
+        # 合并过程中被轮转出去的日志，合并完成后删除
+        self.rotated_path = f"{self.journal_path}.old"
+        self.lock_path = f"{base}.lock"
+        self.compact_threshold = compact_threshold
+        # 已见到的最大版本号，追加时在此基础上递增
+        self.seq = 0
+
+    def locked(self):
+        return FileLock(self.lock_path)
+
+    def exists(self):
+        return any(os.path.exists(p) for p in (self.snapshot_path, self.journal_path, self.rotated_path))
+
+    def load(self):
+        return self.load_versioned()[0]
+
+    def load_versioned(self):
+        # 回放顺序：快照 -> 轮转日志 -> 当前日志，每条记录是整行覆盖，版本号不小于已有版本才生效
+        # 返回 (标注, {行号: 版本}, 游标)，游标交给 changes_since 做增量读取
+        annotations, versions = {}, {}
+        snapshot_sig = self._snapshot_signature()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            versions = {int(k): v for k, v in snapshot.pop(VERSIONS_KEY, {}).items()}
+            annotations = {int(k): v for k, v in snapshot.items()}
+            self.seq = max(self.seq, max(versions.values(), default=0))
+        self._replay(self.rotated_path, annotations, versions)
+        journal_id, offset = None, 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                journal_id = os.fstat(f.fileno()).st_ino
+                offset = self._replay_lines(f.read(), self.journal_path, annotations, versions)
+        return annotations, versions, (snapshot_sig, journal_id, offset)
+
+    def changes_since(self, cursor):
+        # 只读取游标之后新追加的日志；快照被重写（合并）或日志被轮转时退回完整加载
+        if cursor is None or cursor[0] != self._snapshot_signature():
+            return self.load_versioned()
+        snapshot_sig, journal_id, offset = cursor
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return {}, {}, cursor
+        with f:
+            st = os.fstat(f.fileno())
+            if journal_id is None:
+                offset = 0
+            elif st.st_ino != journal_id or st.st_size < offset:
+                return self.load_versioned()
+            f.seek(offset)
+            changes, versions = {}, {}
+            offset += self._replay_lines(f.read(), self.journal_path, changes, versions)
+        return changes, versions, (snapshot_sig, st.st_ino, offset)
+
+    def _snapshot_signature(self):
+        try:
+            st = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _replay(self, path, annotations, versions):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                self._replay_lines(f.read(), path, annotations, versions)
+
+    def _replay_lines(self, data, path, annotations, versions):
+        # 只处理以换行结尾的完整记录，返回已消费的字节数；末尾写了一半的记录留待下次读取
+        end = data.rfind(b"\n") + 1
+        for line_no, line in enumerate(data[:end].decode("utf-8").splitlines()):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                idx = int(record["row"])
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                # 崩溃时可能留下写了一半的记录，直接丢弃；格式不对的记录同样跳过，不让每次同步都失败
+                print(f"[WARN] 标注日志 {path} 第{line_no + 1}行解析失败，已跳过: {e}")
+                continue
+            # 旧格式的记录没有版本号，按出现顺序递增
+            version = record.get("version") or self.seq + 1
+            self.seq = max(self.seq, version)
+            if version >= versions.get(idx, 0):
+                annotations[idx] = record["annotations"]
+                versions[idx] = version
+        return end
+
+    def append(self, changes):
+        # changes: {行号: 该行完整标注列表}，返回 {行号: 新版本号}
+        # 多会话写同一项目时应在 locked() 内先 changes_since 追上最新版本再追加
+        if not changes:
+            return {}
+        versions = {}
+        for idx in changes:
+            self.seq += 1
+            versions[idx] = self.seq
+        lines = "".join(
+            json.dumps({"row": idx, "annotations": anns, "version": versions[idx]}, ensure_ascii=False) + "\n"
+            for idx, anns in changes.items()
+        )
+        data = lines.encode("utf-8")
+        with open(self.journal_path, "ab+") as f:
+            self._trim_torn_tail(f)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if metrics.ENABLED:
+            metrics.count("bytes_written", len(data))
+        return versions
+
+    @staticmethod
+    def _trim_torn_tail(f, block_size=64 * 1024):
+        # 上次崩溃可能在末尾留下不带换行的半条记录，截断到最后一个换行，否则新记录会接在它后面无法解析
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        pos = size
+        while pos > 0:
+            start = max(0, pos - block_size)
+            f.seek(start)
+            chunk = f.read(pos - start)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                pos = start + newline + 1
+                break
+            pos = start
+        if pos < size:
+            print(f"[WARN] 标注日志 {f.name} 末尾有 {size - pos} 字节不完整的记录，已截断")
+            f.truncate(pos)
+
+    def journal_size(self):
+        try:
+            return os.path.getsize(self.journal_path)
+        except OSError:
+            return 0
+
+    def needs_compaction(self):
+        return self.journal_size() >= self.compact_threshold
+
+    def reset(self, annotations):
+        # 新建/覆盖项目时丢弃旧日志，直接写入全新快照
+        for path in (self.journal_path, self.rotated_path):
+            if os.path.exists(path):
+                os.remove(path)
+        atomic_write_json(self.snapshot_path, {str(k): v for k, v in annotations.items()})
+
+    def compact(self, annotations, versions=None):
+        # 先轮转日志再写快照：崩溃时轮转日志仍在，下次加载会继续回放
+        snapshot = {str(k): v for k, v in annotations.items()}
+        if versions:
+            snapshot[VERSIONS_KEY] = {str(k): v for k, v in versions.items()}
+        if os.path.exists(self.rotated_path):
+            # 上次合并中断，内存中已包含轮转日志的内容，先补写快照再轮转，避免覆盖丢失
+            atomic_write_json(self.snapshot_path, snapshot)
+            os.remove(self.rotated_path)
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, self.rotated_path)
+        atomic_write_json(self.snapshot_path, snapshot)
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+
+from utils.storage import FileLock, atomic_write_bytes
+from utils.vocab_index import CategoryIndex, normalize_term
+
+# 编译产物格式版本：规范化规则或索引结构变化时递增，旧产物自动失效
+COMPILED_FORMAT = 1
+# 缓存目录中保留的产物个数，超出时删除最旧的
+MAX_ARTIFACTS = 16
+
+
+def clean_term(term):
+    # 与 process.ipynb 中的清洗一致：转字符串、去掉 "0" 和空值、数字去掉 ".0" 后缀
+    term = str(term).strip()
+    if term in ("", "0"):
+        return None
+    if term.endswith(".0") and term[:-2].isdigit():
+        term = term[:-2]
+    return term
+
+
+def term_list(terms):
+    # 个别类别的值不是列表（如 "ai": "ai"），按单个词条处理，不能逐字符遍历
+    return terms if isinstance(terms, list) else [terms]
+
+
+class CompiledVocab:
+    # 编译后的词表：清洗、去重后的展示词条 + 每个类别已构建好的 CategoryIndex
+    def __init__(self, vocab, source_hash=None):
+        self.format = COMPILED_FORMAT
+        self.source_hash = source_hash
+        self.vocab = {}
+        self.indexes = {}
+        # 类别 -> 已收录的规范化形式，规范化后相同的词条只保留第一个
+        self._keys = {}
+        for category, terms in vocab.items():
+            terms = term_list(terms)
+            self.vocab[str(category)] = []
+            self._keys[str(category)] = set()
+            for term in terms:
+                self._append(str(category), term)
+        self.indexes = {category: CategoryIndex(terms) for category, terms in self.vocab.items()}
+
+    def _append(self, category, term):
+        term = clean_term(term)
+        if term is None:
+            return None
+        key = normalize_term(term)
+        keys = self._keys.setdefault(category, set())
+        if key in keys:
+            return None
+        keys.add(key)
+        self.vocab.setdefault(category, []).append(term)
+        return term
+
+    def add(self, category, term):
+        # 增量新增词条并更新索引，不重新编译；返回实际收录的词条（重复或无效时返回 None）
+        term = self._append(category, term)
+        if term is not None:
+            index = self.indexes.get(category)
+            if index is None:
+                self.indexes[category] = CategoryIndex([term])
+            else:
+                index.add(term)
+        return term
+
+    def stats(self):
+        return {category: len(terms) for category, terms in self.vocab.items()}
+
+
+def content_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def vocab_hash(vocab):
+    # 内存中的词表（如 SQLite 项目）按规范 JSON 计算哈希
+    return content_hash(json.dumps(vocab, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+
+
+def artifact_path(cache_dir, source_hash):
+    return os.path.join(cache_dir, f"vocab-v{COMPILED_FORMAT}-{source_hash}.pkl")
+
+
+def load_artifact(cache_dir, source_hash):
+    path = artifact_path(cache_dir, source_hash)
+    try:
+        with open(path, "rb") as f:
+            compiled = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if getattr(compiled, "format", None) != COMPILED_FORMAT:
+        return None
+    os.utime(path)
+    return compiled
+
+
+def save_artifact(cache_dir, compiled):
+    os.makedirs(cache_dir, exist_ok=True)
+    atomic_write_bytes(artifact_path(cache_dir, compiled.source_hash),
+                       pickle.dumps(compiled, protocol=pickle.HIGHEST_PROTOCOL))
+    # 按最近使用时间淘汰多余的产物
+    artifacts = sorted(
+        (os.path.join(cache_dir, f) for f in os.listdir(cache_dir) if f.startswith("vocab-") and f.endswith(".pkl")),
+        key=os.path.getmtime,
+    )
+    for path in artifacts[:-MAX_ARTIFACTS]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def default_cache_dir(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), ".vocab_cache")
+
+
+def compile_vocab(vocab, cache_dir=None, source_hash=None):
+    # 按内容哈希查找已编译产物，命中时只需反序列化；cache_dir 为 None 时不落盘
+    source_hash = source_hash or vocab_hash(vocab)
+    if cache_dir is not None:
+        compiled = load_artifact(cache_dir, source_hash)
+        if compiled is not None:
+            return compiled
+    compiled = CompiledVocab(vocab, source_hash)
+    if cache_dir is not None:
+        save_artifact(cache_dir, compiled)
+    return compiled
+
+
+def compile_vocab_file(path, cache_dir=None):
+    # 词表文件按原始字节计算哈希，缓存命中时连 JSON 都不用解析
+    cache_dir = cache_dir or default_cache_dir(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    source_hash = content_hash(data)
+    compiled = load_artifact(cache_dir, source_hash)
+    if compiled is None:
+        compiled = CompiledVocab(json.loads(data.decode("utf-8")), source_hash)
+        save_artifact(cache_dir, compiled)
+    return compiled
+
+
+def add_vocab_term(path, category, term, cache_dir=None):
+    # 加锁在磁盘上最新的词表中追加词条；旧内容已编译过时在其产物上增量添加，按新内容哈希另存
+    cache_dir = cache_dir or default_cache_dir(path)
+    with FileLock(f"{path}.lock"):
+        data = b"{}"
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+        vocab = json.loads(data.decode("utf-8"))
+        terms = vocab.get(category, [])
+        terms = term_list(terms)
+        if term in terms:
+            return False
+        vocab[category] = terms + [term]
+        new_data = json.dumps(vocab, ensure_ascii=False).encode("utf-8")
+        atomic_write_bytes(path, new_data)
+        compiled = load_artifact(cache_dir, content_hash(data))
+        if compiled is not None:
+            compiled.add(category, term)
+            compiled.source_hash = content_hash(new_data)
+            save_artifact(cache_dir, compiled)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编译词表：清洗、规范化、去重并构建检索索引")
+    parser.add_argument("vocab", help="词表 JSON 文件")
+    parser.add_argument("--cache-dir", help="编译产物目录，默认为词表所在目录下的 .vocab_cache")
+    args = parser.parse_args()
+
+    cache_dir = args.cache_dir or default_cache_dir(args.vocab)
+    t0 = time.perf_counter()
+    with open(args.vocab, "rb") as f:
+        raw = json.loads(f.read().decode("utf-8"))
+    compiled = compile_vocab_file(args.vocab, cache_dir)
+    elapsed = time.perf_counter() - t0
+    before = sum(len(v) if isinstance(v, list) else 1 for v in raw.values())
+    after = sum(compiled.stats().values())
+    print(f"词表 {args.vocab}: {before} 个词条 -> 清洗去重后 {after} 个，{len(compiled.vocab)} 个类别")
+    print(f"产物: {artifact_path(cache_dir, compiled.source_hash)}（{elapsed * 1000:.1f} ms）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+
+class AhoCorasick:
+    # 多模式串匹配自动机：一次扫描文本即可找出所有出现的词条
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        # 沿失败链最近一个有输出的状态，匹配时据此收集所有命中
+        self._dict_suffix = [0]
+        self.built = True
+
+    def add(self, pattern, value):
+        if not pattern:
+            return
+        state = 0
+        for ch in pattern:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = nxt
+        self.output[state].append((len(pattern), value))
+        self.built = False
+
+    def build(self):
+        # BFS 计算失败指针，并把失败链上的输出合并到当前状态
+        queue = []
+        for nxt in self.goto[0].values():
+            self.fail[nxt] = 0
+            queue.append(nxt)
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+        self._dict_suffix = [0] * len(self.goto)
+        for state in queue:
+            f = self.fail[state]
+            self._dict_suffix[state] = f if self.output[f] else self._dict_suffix[f]
+        self.built = True
+
+    def iter_matches(self, text):
+        # 产出 (start, end, value)
+        if not self.built:
+            self.build()
+        goto, fail, output, dict_suffix = self.goto, self.fail, self.output, self._dict_suffix
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            s = state if output[state] else dict_suffix[state]
+            while s:
+                for length, value in output[s]:
+                    yield i + 1 - length, i + 1, value
+                s = dict_suffix[s]
+
+
+_SPACE_RE = re.compile(r"\s+")
+# 容量写法：16G / 16 GB / 16.0gb -> 16gb，1T / 1TB -> 1tb；前后紧挨字母数字的（如 1130g7）不处理
+_CAPACITY_RE = re.compile(r"(?<![0-9a-z.])(\d+)(?:\.0)?\s*(gb|g|tb|t)(?![0-9a-z])")
+_TRAILING_ZERO_RE = re.compile(r"(?<![0-9.])(\d+)\.0(?![0-9])")
+
+
+def _capacity(match):
+    return match.group(1) + ("tb" if match.group(2)[0] == "t" else "gb")
+
+
+def normalize_term(text):
+    # 全角转半角（NFKC）、大小写折叠、空白归一、数字写法统一
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    text = _SPACE_RE.sub(" ", text).strip()
+    text = _CAPACITY_RE.sub(_capacity, text)
+    return _TRAILING_ZERO_RE.sub(r"\1", text)
+
+
+class CategoryIndex:
+    # 单个类别的候选词索引：
+    #   - Aho-Corasick：候选词包含在文本中
+    #   - 字符 n-gram 倒排：文本包含在候选词中、模糊匹配
+    REBUILD_PENDING = 64
+
+    def __init__(self, candidates=()):
+        self.candidates = []
+        self._norm = []
+        self._gram_count = []
+        # 原始词条去重；同一规范化形式可对应多个原始词条（如 Pro14 / pro14）
+        self._seen = {}
+        self._exact = defaultdict(list)
+        self._automaton = AhoCorasick()
+        # 新增但尚未编入自动机的候选词，数量超过阈值时再整体重建
+        self._pending = []
+        self._grams = defaultdict(list)
+        for c in candidates:
+            self.add(c, _defer=True)
+        self._rebuild_automaton()
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def __contains__(self, candidate):
+        return candidate in self._seen
+
+    @staticmethod
+    def _grams_of(norm):
+        if len(norm) < 2:
+            return {norm} if norm else set()
+        return {norm[i:i + 2] for i in range(len(norm) - 1)}
+
+    def add(self, candidate, _defer=False):
+        norm = normalize_term(candidate)
+        if not norm or candidate in self._seen:
+            return False
+        cid = len(self.candidates)
+        self.candidates.append(candidate)
+        self._norm.append(norm)
+        self._gram_count.append(len(self._grams_of(norm)))
+        self._seen[candidate] = cid
+        self._exact[norm].append(cid)
+        for ch in set(norm):
+            self._grams[ch].append(cid)
+        for gram in self._grams_of(norm):
+            if len(gram) == 2:
+                self._grams[gram].append(cid)
+        if not _defer:
+            self._pending.append(cid)
+            if len(self._pending) >= self.REBUILD_PENDING:
+                self._rebuild_automaton()
+        return True
+
+    def _rebuild_automaton(self):
+        automaton = AhoCorasick()
+        for cid, norm in enumerate(self._norm):
+            automaton.add(norm, cid)
+        automaton.build()
+        self._automaton = automaton
+        self._pending = []
+
+    def _contained_in(self, norm_text):
+        found = {cid for _, _, cid in self._automaton.iter_matches(norm_text)}
+        for cid in self._pending:
+            if self._norm[cid] in norm_text:
+                found.add(cid)
+        return found
+
+    def _containing(self, norm_text):
+        grams = self._grams_of(norm_text)
+        postings = sorted((self._grams.get(g, ()) for g in grams), key=len)
+        if not postings or not postings[0]:
+            return set()
+        result = set(postings[0])
+        for p in postings[1:]:
+            result.intersection_update(p)
+            if not result:
+                return result
+        return {cid for cid in result if norm_text in self._norm[cid]}
+
+    def _fuzzy(self, norm_text, min_score):
+        # 按共享 bigram 数计算 Dice 系数
+        grams = self._grams_of(norm_text)
+        if not grams:
+            return {}
+        shared = defaultdict(int)
+        for g in grams:
+            for cid in self._grams.get(g, ()):
+                shared[cid] += 1
+        scores = {}
+        for cid, n in shared.items():
+            score = 2 * n / (len(grams) + self._gram_count[cid])
+            if score >= min_score:
+                scores[cid] = score
+        return scores
+
+    def search(self, text, top_k=None, min_fuzzy=0.3):
+        # 返回 [(候选词, 得分)]，得分越高越相关
+        norm_text = normalize_term(text)
+        if not norm_text:
+            return []
+        scores = {}
+        for cid in self._exact.get(norm_text, ()):
+            scores[cid] = 3.0
+        for cid in self._contained_in(norm_text):
+            scores.setdefault(cid, 1.0 + len(self._norm[cid]) / len(norm_text))
+        for cid in self._containing(norm_text):
+            scores.setdefault(cid, 1.0 + len(norm_text) / len(self._norm[cid]))
+        for cid, score in self._fuzzy(norm_text, min_fuzzy).items():
+            scores.setdefault(cid, score)
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+        if top_k is not None:
+            ranked = ranked[:top_k]
+        return [(self.candidates[cid], score) for cid, score in ranked]